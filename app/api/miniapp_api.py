@@ -4,13 +4,37 @@
 from fastapi import APIRouter, HTTPException, Header
 from typing import Optional, List
 import hmac
+import asyncio
 import hashlib
 import json
+import logging
 from urllib.parse import parse_qs
-from datetime import datetime
 
 from app.services.sheets_service import sheets_service
-from app.utils.validators import safe_parse_price, validate_phone, normalize_phone
+from app.services.menu_store import menu_store
+from app.services.mood_catalog import mood_catalog
+from app.services.upsell_engine import upsell_engine
+from app.services.menu_search import menu_retriever, menu_suggester
+from app.services.order_repository import order_repository, build_order_row
+from app.services.sheets_mirror import sheets_mirror
+from app.utils.validators import safe_parse_price, validate_phone
+from app.utils.metrics import metrics
+from app.utils.circuit_breaker import gemini_breaker
+from app.services.gemini_service import get_gemini_service
+from app.utils.cache import ai_cache
+from app.services.intent_classifier import intent_classifier
+from app.utils.user_state_store import user_state
+from app.utils.redis_pool import redis_pool
+from app.utils.health import health_monitor
+
+# PostgreSQL (optional)
+try:
+    from app.database import get_pool_stats as get_db_pool_stats
+    DATABASE_AVAILABLE = True
+except ImportError:
+    DATABASE_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/v1", tags=["miniapp"])
 
@@ -58,8 +82,34 @@ def verify_telegram_webapp_data(init_data: str, bot_token: str) -> bool:
 
 @router.get("/health")
 async def health_check():
-    """Health check для Mini App API"""
-    return {"ok": True, "status": "alive", "service": "miniapp_api"}
+    """Health check для Mini App API (закешовані проби залежностей)"""
+    return {**health_monitor.readiness(), "service": "miniapp_api"}
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """Внутрішні метрики (квоти upstream, circuit breakers, лічильники, таймінги)"""
+    gemini_service = get_gemini_service()
+    return {
+        "ok": True,
+        "sheets_quota": sheets_service.get_quota_stats(),
+        "gemini": gemini_service.get_stats() if gemini_service else None,
+        "ai_cache": ai_cache.get_stats(),
+        "intents": intent_classifier.get_stats(),
+        "circuit_breakers": {
+            "sheets": sheets_service.get_breaker_stats(),
+            "gemini": gemini_breaker.get_stats()
+        },
+        "user_state": user_state.get_stats(),
+        "redis_pool": redis_pool.get_stats(),
+        "db_pool": get_db_pool_stats() if DATABASE_AVAILABLE else None,
+        "orders": await asyncio.to_thread(order_repository.get_stats),
+        "sheets_mirror": sheets_mirror.get_stats(),
+        "menu_store": menu_store.get_stats(),
+        "mood_catalog": mood_catalog.get_stats(),
+        "upsell": upsell_engine.get_stats(),
+        "metrics": metrics.snapshot()
+    }
 
 
 @router.get("/menu")
@@ -81,42 +131,17 @@ async def get_menu(
     - offset: пропустити N записів
     """
     try:
-        # Отримати з Google Sheets
-        all_items = sheets_service.get_menu()
-        
-        # Фільтрація
-        filtered = all_items
-        
-        if active:
-            filtered = [i for i in filtered if str(i.get('Активний', '')).upper() == 'TRUE']
+        # Нормалізований snapshot меню (оновлюється з Google Sheets)
+        filtered = menu_store.get_items(active_only=active)
         
         if restaurant:
-            filtered = [i for i in filtered if i.get('Ресторан') == restaurant]
+            filtered = [i for i in filtered if i['restaurant'] == restaurant]
         
         if category:
-            filtered = [i for i in filtered if i.get('Категорія') == category]
+            filtered = [i for i in filtered if i['category'] == category]
         
         # Pagination
-        paginated = filtered[offset:offset+limit]
-        
-        # Форматування відповіді
-        result = []
-        for item in paginated:
-            result.append({
-                "id": item.get('ID'),
-                "category": item.get('Категорія'),
-                "name": item.get('Страва'),
-                "description": item.get('Опис', ''),
-                "price": safe_parse_price(item.get('Ціна', 0)),
-                "restaurant": item.get('Ресторан'),
-                "time_delivery": int(item.get('Час_доставки_хв', 30)),
-                "photo_url": item.get('Фото_URL', ''),
-                "active": str(item.get('Активний', '')).upper() == 'TRUE',
-                "cook_time": int(item.get('Час_приготування_хв', 15)),
-                "allergens": item.get('Алергени', ''),
-                "rating": float(item.get('Рейтинг', 0)),
-                "mood_tags": [tag.strip() for tag in str(item.get('Mood_Tags', '')).split(',') if tag.strip()]
-            })
+        result = [dict(item) for item in filtered[offset:offset+limit]]
         
         return {
             "ok": True,
@@ -134,38 +159,36 @@ async def get_menu(
 @router.get("/menu/mood/{tag}")
 async def get_menu_by_mood(tag: str):
     """
-    Отримати товари по mood тегу
+    Отримати готову добірку товарів по mood тегу
     
     Приклади: calm, energy, party, romantic, movie, spicy
+    Добірки перераховуються при зміні меню (mood_catalog) - тут лише lookup
     """
     try:
-        all_items = sheets_service.get_menu()
-        
-        # Фільтрація по mood tags
-        filtered = []
-        for item in all_items:
-            if str(item.get('Активний', '')).upper() != 'TRUE':
-                continue
-            
-            mood_tags = str(item.get('Mood_Tags', '')).lower()
-            if tag.lower() in mood_tags:
-                filtered.append({
-                    "id": item.get('ID'),
-                    "category": item.get('Категорія'),
-                    "name": item.get('Страва'),
-                    "description": item.get('Опис', ''),
-                    "price": safe_parse_price(item.get('Ціна', 0)),
-                    "restaurant": item.get('Ресторан'),
-                    "photo_url": item.get('Фото_URL', ''),
-                    "rating": float(item.get('Рейтинг', 0)),
-                    "mood_tags": [t.strip() for t in str(item.get('Mood_Tags', '')).split(',') if t.strip()]
-                })
+        shortlist = mood_catalog.get(tag)
+        items = shortlist.items if shortlist else ()
+        
+        filtered = [
+            {
+                "id": item['id'],
+                "category": item['category'],
+                "name": item['name'],
+                "description": item['description'],
+                "price": item['price'],
+                "restaurant": item['restaurant'],
+                "photo_url": item['photo_url'],
+                "rating": item['rating'],
+                "mood_tags": item['mood_tags']
+            }
+            for item in items
+        ]
         
         return {
             "ok": True,
             "mood": tag,
             "data": filtered,
-            "count": len(filtered)
+            "count": len(filtered),
+            "pitch": shortlist.pitch if shortlist else None
         }
         
     except Exception as e:
@@ -173,6 +196,52 @@ async def get_menu_by_mood(tag: str):
         raise HTTPException(status_code=500, detail="Failed to fetch mood menu")
 
 
+@router.get("/search")
+async def search_menu(q: str, limit: int = 20):
+    """
+    Повнотекстовий пошук по меню
+    
+    Терпить відмінки ("піци"), опечатки ("тирамісу") і порядок слів;
+    результати від найкращого збігу (покриття запиту, BM25, рейтинг)
+    """
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Query is empty")
+    
+    try:
+        hits = menu_retriever.search(q, limit=max(1, min(limit, 100)))
+        
+        return {
+            "ok": True,
+            "query": q,
+            "data": [
+                {**hit.item, "score": hit.score, "coverage": round(hit.coverage, 2)}
+                for hit in hits
+            ],
+            "count": len(hits)
+        }
+        
+    except Exception as e:
+        logger.error(f"❌ Search error: {e}")
+        raise HTTPException(status_code=500, detail="Search failed")
+
+
+@router.get("/search/suggest")
+async def search_suggest(prefix: str, limit: int = 8):
+    """
+    Автодоповнення назв страв і ресторанів (для пошуку під час набору)
+    
+    Відсортований масив назв + bisect, перебудова при оновленні меню
+    """
+    suggestions = menu_suggester.suggest(prefix, limit=max(1, min(limit, 20)))
+    
+    return {
+        "ok": True,
+        "prefix": prefix,
+        "data": suggestions,
+        "count": len(suggestions)
+    }
+
+
 @router.get("/restaurants")
 async def get_restaurants(active: bool = True):
     """Отримати список партнерів (ресторанів)"""
@@ -235,30 +304,26 @@ async def create_order(order_data: dict):
         if not validate_phone(phone):
             raise HTTPException(status_code=400, detail="Invalid phone number")
         
-        # Генерувати ID замовлення
-        now = datetime.now()
-        order_id = f"ORD_{now.strftime('%Y%m%d_%H%M%S')}_{user['telegram_user_id']}"
-        
-        # Підготувати дані для Google Sheets
-        order_row = {
-            'ID_Замовлення': order_id,
-            'Telegram_User_ID': user['telegram_user_id'],
-            'Час_Замовлення': now.strftime('%Y-%m-%d %H:%M:%S'),
-            'Товари_JSON': json.dumps(items, ensure_ascii=False),
-            'Загальна_Сума': order_data.get('total', 0),
-            'Адреса': order_data.get('address', ''),
-            'Телефон': normalize_phone(phone),
-            'Спосіб_Оплати': order_data.get('payment_method', 'cash'),
-            'Статус': 'Новий',
-            'Канал': 'Mini App',
-            'Вартість_доставки': order_data.get('delivery_cost', 0),
-            'Тип_доставки': order_data.get('delivery_type', 'delivery'),
-            'Примітки': order_data.get('note', ''),
-            'Промокод': order_data.get('promo_code', '')
-        }
+        # Рядок замовлення (формат аркуша "Замовлення")
+        order_row = build_order_row(
+            user['telegram_user_id'],
+            items,
+            order_data.get('total', 0),
+            address=order_data.get('address', ''),
+            phone=phone,
+            payment_method=order_data.get('payment_method', 'cash'),
+            channel='Mini App',
+            delivery_cost=order_data.get('delivery_cost', 0),
+            delivery_type=order_data.get('delivery_type', 'delivery'),
+            note=order_data.get('note', ''),
+            promo_code=order_data.get('promo_code', '')
+        )
+        order_id = order_row['ID_Замовлення']
         
-        # Зберегти в Google Sheets
-        sheets_service.save_order(order_row)
+        # Зберегти (PostgreSQL + дзеркало в Sheets, або напряму в Sheets);
+        # репозиторій синхронний - поза event loop
+        if not await asyncio.to_thread(order_repository.save_order, order_row):
+            raise HTTPException(status_code=500, detail="Failed to save order")
         
         # ETA розрахунок (беремо максимальний час з товарів)
         eta_minutes = max([item.get('time_delivery', 30) for item in items], default=30)
@@ -282,7 +347,7 @@ async def create_order(order_data: dict):
 async def get_user_orders(telegram_user_id: int, limit: int = 10):
     """Отримати історію замовлень користувача"""
     try:
-        orders = sheets_service.get_user_orders(telegram_user_id, limit=limit)
+        orders = await asyncio.to_thread(order_repository.get_user_orders, telegram_user_id, limit)
         
         result = []
         for order in orders:
@@ -315,35 +380,34 @@ async def validate_promo(promo_data: dict):
         if not code:
             raise HTTPException(status_code=400, detail="Promo code is required")
         
-        # Отримати промокоди з Sheets
-        promos = sheets_service.get_promo_codes()
-        
-        for promo in promos:
-            if promo.get('Код', '').upper() == code:
-                # Перевірити статус
-                if promo.get('Статус') != 'Активний':
-                    return {"ok": False, "valid": False, "message": "Промокод неактивний"}
-                
-                # Перевірити ліміт
-                used = int(promo.get('Використано', 0))
-                limit = int(promo.get('Ліміт_використань', 999))
-                
-                if used >= limit:
-                    return {"ok": False, "valid": False, "message": "Промокод вичерпано"}
-                
-                # Перевірити дату
-                valid_until = promo.get('Дійсний_до', '')
-                if valid_until:
-                    # TODO: перевірка дати
-                    pass
-                
-                return {
-                    "ok": True,
-                    "valid": True,
-                    "code": code,
-                    "discount_pct": float(promo.get('Знижка_%', 0)),
-                    "message": f"Промокод застосовано! Знижка {promo.get('Знижка_%')}%"
-                }
+        # Пошук по первинному ключу в БД (або в аркуші "Промокоди" без БД)
+        promo = await asyncio.to_thread(order_repository.get_promo_code, code)
+        
+        if promo:
+            # Перевірити статус
+            if promo.get('Статус') != 'Активний':
+                return {"ok": False, "valid": False, "message": "Промокод неактивний"}
+            
+            # Перевірити ліміт
+            used = int(promo.get('Використано', 0))
+            limit = int(promo.get('Ліміт_використань', 999))
+            
+            if used >= limit:
+                return {"ok": False, "valid": False, "message": "Промокод вичерпано"}
+            
+            # Перевірити дату
+            valid_until = promo.get('Дійсний_до', '')
+            if valid_until:
+                # TODO: перевірка дати
+                pass
+            
+            return {
+                "ok": True,
+                "valid": True,
+                "code": code,
+                "discount_pct": float(promo.get('Знижка_%', 0)),
+                "message": f"Промокод застосовано! Знижка {promo.get('Знижка_%')}%"
+            }
         
         return {"ok": False, "valid": False, "message": "Промокод не знайдено"}
         
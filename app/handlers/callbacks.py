@@ -2,6 +2,7 @@
 🔘 Обробники callback кнопок
 FerrikBot v3.3 - ВИПРАВЛЕНА ВЕРСІЯ з підтримкою V2
 """
+import asyncio
 import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
@@ -12,6 +13,7 @@ from app.utils.cart_manager import (
     remove_from_cart,
     clear_user_cart,
     get_cart_summary,
+    get_cart_view,
     format_cart_message,
     is_cart_empty
 )
@@ -21,6 +23,8 @@ from app.utils.warm_greetings import (
     update_user_stats
 )
 from app.services.sheets_service import sheets_service
+from app.services.gemini_service import cancel_user_ai_request
+from app.services.order_repository import order_repository, build_order_row
 
 logger = logging.getLogger(__name__)
 
@@ -38,6 +42,9 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     logger.info(f"🔘 Callback '{data}' from {user.username or user.first_name}")
     
+    # Користувач пішов з AI діалогу - не чекаємо відповідь моделі даремно
+    cancel_user_ai_request(user_id)
+    
     # Answer callback
     try:
         await query.answer()
@@ -199,7 +206,7 @@ async def handle_menu_callback(query, context):
 async def handle_cart_callback(query, context):
     """Handle 'cart' button"""
     user_id = query.from_user.id
-    summary = get_cart_summary(user_id)
+    summary = await get_cart_summary(user_id, context)
     
     if summary['is_empty']:
         message = (
@@ -211,7 +218,7 @@ async def handle_cart_callback(query, context):
             [InlineKeyboardButton("◀️ Назад", callback_data="start")]
         ]
     else:
-        message = format_cart_message(user_id)
+        message = await format_cart_message(user_id, context)
         keyboard = [
             [InlineKeyboardButton("✅ Оформити замовлення", callback_data="checkout")],
             [
@@ -480,7 +487,8 @@ def get_sample_items_for_category(category: str) -> list:
 
 async def handle_add_item_callback(query, context, data):
     """Handle adding item to cart"""
-    item_id = int(data.replace("add_", ""))
+    raw_id = data.replace("add_", "")
+    item_id = int(raw_id) if raw_id.isdigit() else raw_id  # ID з menu_store - рядки
     user_id = query.from_user.id
     
     try:
@@ -520,7 +528,7 @@ async def handle_add_item_callback(query, context, data):
                 'partner_id': context.user_data.get('selected_partner_id', '')
             }
             
-            add_to_cart(user_id, cart_item)
+            await add_to_cart(user_id, cart_item)
             
             try:
                 await query.answer(
@@ -544,7 +552,7 @@ async def handle_remove_item_callback(query, context, data):
     item_id = int(data.replace("remove_", ""))
     user_id = query.from_user.id
     
-    remove_from_cart(user_id, item_id)
+    await remove_from_cart(user_id, item_id)
     
     try:
         await query.answer("🗑️ Товар видалено", show_alert=False)
@@ -557,7 +565,7 @@ async def handle_remove_item_callback(query, context, data):
 async def handle_cart_clear_callback(query, context):
     """Handle clearing cart"""
     user_id = query.from_user.id
-    clear_user_cart(user_id)
+    await clear_user_cart(user_id)
     
     try:
         await query.answer("🗑️ Кошик очищено", show_alert=False)
@@ -574,22 +582,16 @@ async def handle_checkout_callback(query, context):
     
     logger.info(f"🛒 Checkout initiated by {username} (ID: {user_id})")
     
-    # Get cart
-    summary = get_cart_summary(user_id)
+    # Get cart (one snapshot for the whole checkout screen)
+    view = await get_cart_view(user_id, context)
     
     # Check if empty
-    if summary['is_empty']:
+    if view.is_empty:
         await query.answer("❌ Кошик порожній!", show_alert=True)
         return
     
     # Check restaurants
-    restaurants = set()
-    for item in summary['items']:
-        restaurant = item.get('restaurant', '')
-        if restaurant:
-            restaurants.add(restaurant)
-    
-    if len(restaurants) > 1:
+    if len(view.restaurants) > 1:
         await query.answer(
             "❌ Товари повинні бути з одного закладу!",
             show_alert=True
@@ -606,11 +608,11 @@ async def handle_checkout_callback(query, context):
     else:
         # Інакше запитуємо телефон
         context.user_data['checkout_stage'] = 'awaiting_phone'
-        context.user_data['cart_snapshot'] = summary['items'].copy()
+        context.user_data['cart_snapshot'] = view.items.copy()
         
         message = (
             "📦 <b>Оформлення замовлення</b>\n\n"
-            f"{format_cart_message(user_id)}\n\n"
+            f"{await format_cart_message(user_id, context)}\n\n"
             "📞 Введіть ваш номер телефону:\n"
             "<i>Формат: +380XXXXXXXXX або 0XXXXXXXXX</i>\n\n"
             "Наприклад: +380501234567 або 0501234567"
@@ -633,21 +635,21 @@ async def handle_checkout_callback(query, context):
 async def show_order_confirmation(query, context, phone: str, address: str):
     """Показати екран підтвердження замовлення"""
     user_id = query.from_user.id
-    summary = get_cart_summary(user_id)
+    view = await get_cart_view(user_id, context)
     
     # Save snapshot
-    context.user_data['cart_snapshot'] = summary['items'].copy()
+    context.user_data['cart_snapshot'] = view.items.copy()
     context.user_data['phone'] = phone
     context.user_data['address'] = address
     
     # Calculate costs
-    delivery_cost = 0 if summary['total'] >= 300 else 50
-    total_with_delivery = summary['total'] + delivery_cost
+    delivery_cost = view.delivery_fee
+    total_with_delivery = view.grand_total
     
     # Get restaurant
     restaurant_name = "Ресторан"
-    if summary['items']:
-        restaurant_name = summary['items'][0].get('restaurant', 'Ресторан')
+    if view.restaurants:
+        restaurant_name = view.restaurants[0]
     
     # Format message
     message = (
@@ -657,7 +659,7 @@ async def show_order_confirmation(query, context, phone: str, address: str):
     
     # Add items
     message += "🛒 <b>Ваше замовлення:</b>\n"
-    for item in summary['items']:
+    for item in view.items:
         name = item['name']
         price = item['price']
         quantity = item.get('quantity', 1)
@@ -665,7 +667,7 @@ async def show_order_confirmation(query, context, phone: str, address: str):
         message += f"▪️ {name} × {quantity} = {subtotal} грн\n"
     
     message += "\n━━━━━━━━━━━━━━━━\n"
-    message += f"💰 Сума товарів: <b>{summary['total']} грн</b>\n"
+    message += f"💰 Сума товарів: <b>{view.total} грн</b>\n"
     message += f"🚚 Доставка: <b>{delivery_cost} грн</b>\n"
     
     if delivery_cost == 0:
@@ -717,7 +719,6 @@ async def handle_order_phone_callback(query, context):
 async def handle_confirm_order_callback(query, context):
     """Handle order confirmation - ПРАЦЮЄ!"""
     user_id = query.from_user.id
-    user = query.from_user
     
     try:
         await query.answer("⏳ Обробка замовлення...", show_alert=False)
@@ -739,28 +740,25 @@ async def handle_confirm_order_callback(query, context):
     if cart:
         restaurant_name = cart[0].get('restaurant', 'Ресторан')
     
-    # Save to Sheets
-    order_saved = False
-    order_id = user_id % 10000
+    # Save order (PostgreSQL + Sheets mirror, or Sheets directly)
+    order_row = build_order_row(
+        user_id,
+        cart,
+        total_with_delivery,
+        address=address,
+        phone=phone,
+        payment_method='Готівка',
+        channel='Telegram',
+        delivery_cost=delivery_cost,
+        delivery_type='Доставка'
+    )
+    order_id = order_row['ID_Замовлення']
     
-    if sheets_service.is_connected():
-        try:
-            order_data = {
-                'user_id': user_id,
-                'username': user.username or user.first_name,
-                'items': cart,
-                'total': total,
-                'address': address,
-                'phone': phone,
-                'payment_method': 'Готівка',
-                'delivery_cost': delivery_cost,
-                'delivery_type': 'Доставка'
-            }
-            
-            order_saved = sheets_service.add_order(order_data)
-            
-        except Exception as e:
-            logger.error(f"❌ Error saving order: {e}")
+    try:
+        order_saved = await asyncio.to_thread(order_repository.save_order, order_row)
+    except Exception as e:
+        logger.error(f"❌ Error saving order: {e}")
+        order_saved = False
     
     # Update stats
     try:
@@ -769,7 +767,7 @@ async def handle_confirm_order_callback(query, context):
         logger.error(f"Error updating stats: {e}")
     
     # Clear cart
-    clear_user_cart(user_id)
+    await clear_user_cart(user_id)
     
     # НЕ ОЧИЩАЄМО телефон та адресу - зберігаємо для наступних замовлень!
     context.user_data.pop('checkout_stage', None)
@@ -778,7 +776,7 @@ async def handle_confirm_order_callback(query, context):
     # Success message
     message = (
         "🎉 <b>ЗАМОВЛЕННЯ ПІДТВЕРДЖЕНО!</b>\n\n"
-        f"📦 <b>Номер замовлення: #{order_id}</b>\n\n"
+        f"📦 <b>Номер замовлення:</b> <code>{order_id}</code>\n\n"
         f"🏪 Заклад: {restaurant_name}\n"
         f"💰 Сума товарів: {total} грн\n"
         f"🚚 Доставка: {delivery_cost} грн\n"
@@ -7,13 +7,14 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler
 
 from app.utils.cart_manager import (
-    get_user_cart,
-    get_cart_total,
-    is_cart_empty,
+    get_cart_view,
+    calculate_delivery_fee,
     add_to_cart,
     remove_from_cart,
     clear_user_cart
 )
+from app.services.menu_store import menu_store
+from app.services.upsell_engine import upsell_engine
 
 logger = logging.getLogger(__name__)
 
@@ -44,7 +45,10 @@ async def show_cart_v2(message, user_id: int, context, edit: bool = False):
     - Емоційний тон
     """
     
-    if is_cart_empty(user_id):
+    # Один snapshot кошика на весь екран
+    view = await get_cart_view(user_id, context)
+    
+    if view.is_empty:
         text = (
             "🛒 **Твій кошик порожній**\n\n"
             "Обери щось смачне з меню! 😋"
@@ -62,13 +66,10 @@ async def show_cart_v2(message, user_id: int, context, edit: bool = False):
             await message.reply_text(text, parse_mode='Markdown', reply_markup=reply_markup)
         return
     
-    # Отримуємо товари з кошика
-    cart = get_user_cart(user_id)
-    total = get_cart_total(user_id)
-    
-    # Розраховуємо доставку
-    delivery_cost = calculate_delivery(total)
-    final_total = total + delivery_cost
+    cart = view.items
+    total = view.total
+    delivery_cost = view.delivery_fee
+    final_total = view.grand_total
     
     # Формуємо повідомлення
     text = "🛒 **Твій кошик:**\n\n"
@@ -105,7 +106,7 @@ async def show_cart_v2(message, user_id: int, context, edit: bool = False):
         
         for item in upsell_items[:2]:
             name = item.get('name', 'Товар')
-            price = item.get('price', 0)
+            price = f"{float(item.get('price', 0)):.0f}"
             text += f"• {name} — {price} грн\n"
         
         text += "\n_Додати щось? 🙂_"
@@ -128,7 +129,7 @@ async def show_cart_v2(message, user_id: int, context, edit: bool = False):
         for item in upsell_items[:2]:
             item_id = item.get('id', 0)
             name = item.get('name', 'Товар')
-            price = item.get('price', 0)
+            price = f"{float(item.get('price', 0)):.0f}"
             
             keyboard.append([
                 InlineKeyboardButton(
@@ -157,71 +158,23 @@ def calculate_delivery(total: float) -> int:
     - від 300 грн: безкоштовно
     - менше 300: 50 грн
     """
-    if total >= 300:
-        return 0
-    return 50
+    return calculate_delivery_fee(total)
 
 
 def get_upsell_suggestions(cart: list, context) -> list:
     """
     Отримати upsell пропозиції
     
-    Логіка:
-    1. Аналізуємо що в кошику
-    2. Шукаємо популярні комбінації
-    3. Пропонуємо топ-2 товари
-    
-    Приклад:
-    - Якщо є піца → пропонуємо Cola, Garlic bread
-    - Якщо є бургер → пропонуємо Fries, Milkshake
+    Логіка (upsell_engine):
+    1. Беремо товари, які найчастіше замовляли разом з вмістом кошика
+    2. Тільки доступні в меню і яких ще немає в кошику
+    3. Мало статистики → найпопулярніші товари
     """
-    
-    # Визначаємо категорії товарів у кошику
-    categories_in_cart = set()
-    for item in cart:
-        cat = item.get('category', '')
-        if cat:
-            categories_in_cart.add(cat.lower())
-    
-    # Словник upsell пропозицій
-    upsell_map = {
-        'pizza': [
-            {'id': 20, 'name': 'Coca-Cola 0.5л', 'price': 40, 'category': 'drinks'},
-            {'id': 30, 'name': 'Часниковий хліб', 'price': 50, 'category': 'snacks'},
-        ],
-        'піца': [
-            {'id': 20, 'name': 'Coca-Cola 0.5л', 'price': 40, 'category': 'drinks'},
-            {'id': 30, 'name': 'Часниковий хліб', 'price': 50, 'category': 'snacks'},
-        ],
-        'burgers': [
-            {'id': 31, 'name': 'Картопля фрі', 'price': 60, 'category': 'snacks'},
-            {'id': 32, 'name': 'Молочний коктейль', 'price': 70, 'category': 'drinks'},
-        ],
-        'бургери': [
-            {'id': 31, 'name': 'Картопля фрі', 'price': 60, 'category': 'snacks'},
-            {'id': 32, 'name': 'Молочний коктейль', 'price': 70, 'category': 'drinks'},
-        ],
-    }
-    
-    # Збираємо пропозиції
-    suggestions = []
-    
-    for cat in categories_in_cart:
-        if cat in upsell_map:
-            suggestions.extend(upsell_map[cat])
-    
-    # Якщо немає категорій - пропонуємо популярні напої
-    if not suggestions:
-        suggestions = [
-            {'id': 20, 'name': 'Coca-Cola 0.5л', 'price': 40, 'category': 'drinks'},
-            {'id': 21, 'name': 'Sprite 0.5л', 'price': 40, 'category': 'drinks'},
-        ]
-    
-    # Фільтруємо товари які вже є в кошику
-    cart_ids = {item.get('id') for item in cart}
-    suggestions = [s for s in suggestions if s.get('id') not in cart_ids]
-    
-    return suggestions[:2]
+    try:
+        return upsell_engine.suggest(cart, limit=2)
+    except Exception as e:
+        logger.error(f"❌ Upsell error: {e}")
+        return []
 
 
 async def clear_cart_v2_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -230,7 +183,7 @@ async def clear_cart_v2_callback(update: Update, context: ContextTypes.DEFAULT_T
     await query.answer("🗑️ Кошик очищено")
     
     user_id = query.from_user.id
-    clear_user_cart(user_id)
+    await clear_user_cart(user_id)
     
     await show_cart_v2(query.message, user_id, context, edit=True)
 
@@ -240,7 +193,7 @@ async def add_item_v2_callback(update: Update, context: ContextTypes.DEFAULT_TYP
     query = update.callback_query
     
     user_id = query.from_user.id
-    item_id = int(query.data.replace("v2_add_", ""))
+    item_id = query.data.replace("v2_add_", "")
     
     # Отримуємо товар
     item = get_item_by_id(item_id, context)
@@ -259,15 +212,19 @@ async def add_item_v2_callback(update: Update, context: ContextTypes.DEFAULT_TYP
         'quantity': 1
     }
     
-    add_to_cart(user_id, cart_item)
+    await add_to_cart(user_id, cart_item)
     
     await query.answer(f"✅ {item.get('name')} додано!", show_alert=False)
     
     logger.info(f"✅ Item {item_id} added to cart by user {user_id}")
 
 
-def get_item_by_id(item_id: int, context) -> dict:
+def get_item_by_id(item_id, context) -> dict:
     """Отримати товар по ID"""
+    item = menu_store.get_item(str(item_id))
+    if item and item['active']:
+        return item
+    
     sheets_service = context.bot_data.get('sheets_service')
     
     if sheets_service and sheets_service.is_connected():
@@ -291,7 +248,7 @@ def get_item_by_id(item_id: int, context) -> dict:
         32: {'id': 32, 'name': 'Молочний коктейль', 'price': 70, 'category': 'drinks'},
     }
     
-    return sample_items.get(item_id)
+    return sample_items.get(int(item_id)) if str(item_id).isdigit() else None
 
 
 # ============================================================================
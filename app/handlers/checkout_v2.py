@@ -2,12 +2,14 @@
 🧾 CHECKOUT V2 - Оформлення замовлення з Request Contact
 FerrikBot v3.3 - Новий UX
 """
+import asyncio
 import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, KeyboardButton, ReplyKeyboardMarkup, ReplyKeyboardRemove
 from telegram.ext import ContextTypes, CallbackQueryHandler
 
-from app.utils.cart_manager import get_user_cart, get_cart_total, clear_user_cart
+from app.utils.cart_manager import get_cart_view, clear_user_cart
 from app.utils.warm_greetings import update_user_stats
+from app.services.order_repository import order_repository, build_order_row
 
 logger = logging.getLogger(__name__)
 
@@ -30,7 +32,7 @@ async def checkout_v2_callback(update: Update, context: ContextTypes.DEFAULT_TYP
     logger.info(f"🧾 Checkout v2 initiated by {user.first_name}")
     
     # Перевіряємо кошик
-    cart = get_user_cart(user_id)
+    cart = (await get_cart_view(user_id, context)).items
     
     if not cart:
         await query.answer("❌ Кошик порожній!", show_alert=True)
@@ -222,7 +224,7 @@ async def confirm_order_v2_callback(update: Update, context: ContextTypes.DEFAUL
     Підтвердження замовлення (v2)
     
     Дії:
-    1. Зберегти в Google Sheets
+    1. Зберегти замовлення (order_repository)
     2. Оновити статистику користувача
     3. Очистити кошик
     4. Показати success екран
@@ -243,29 +245,25 @@ async def confirm_order_v2_callback(update: Update, context: ContextTypes.DEFAUL
     delivery = 0 if total >= 300 else 50
     final_total = total + delivery
     
-    # Зберігаємо в Sheets
-    order_saved = False
-    order_id = user_id % 10000
+    # Зберігаємо (PostgreSQL + дзеркало в Sheets, або напряму в Sheets)
+    order_row = build_order_row(
+        user_id,
+        cart,
+        final_total,
+        address=address,
+        phone=phone,
+        payment_method='Готівка',
+        channel='Telegram',
+        delivery_cost=delivery,
+        delivery_type='Доставка'
+    )
+    order_id = order_row['ID_Замовлення']
     
-    sheets_service = context.bot_data.get('sheets_service')
-    if sheets_service and sheets_service.is_connected():
-        try:
-            order_data = {
-                'user_id': user_id,
-                'username': user.username or user.first_name,
-                'items': cart,
-                'total': total,
-                'address': address,
-                'phone': phone,
-                'payment_method': 'Готівка',
-                'delivery_cost': delivery,
-                'delivery_type': 'Доставка'
-            }
-            
-            order_saved = sheets_service.add_order(order_data)
-            
-        except Exception as e:
-            logger.error(f"❌ Error saving order: {e}")
+    try:
+        order_saved = await asyncio.to_thread(order_repository.save_order, order_row)
+    except Exception as e:
+        logger.error(f"❌ Error saving order: {e}")
+        order_saved = False
     
     # Оновлюємо статистику
     try:
@@ -274,7 +272,7 @@ async def confirm_order_v2_callback(update: Update, context: ContextTypes.DEFAUL
         logger.error(f"Error updating stats: {e}")
     
     # Очищуємо кошик
-    clear_user_cart(user_id)
+    await clear_user_cart(user_id)
     
     # Очищуємо тільки checkout дані
     context.user_data.pop('cart_snapshot', None)
@@ -287,7 +285,7 @@ async def confirm_order_v2_callback(update: Update, context: ContextTypes.DEFAUL
     
     message = (
         "🎉 **ЗАМОВЛЕННЯ ПРИЙНЯТО!**\n\n"
-        f"📦 Номер замовлення: **#{order_id}**\n\n"
+        f"📦 Номер замовлення: `{order_id}`\n\n"
         "Готуємо та передамо кур'єру протягом 10 хв.\n\n"
         f"⏱ Очікуваний час: **25–35 хв**\n"
         f"💳 До оплати: **{final_total} грн** _(готівка)_\n\n"
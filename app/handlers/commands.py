@@ -11,8 +11,7 @@ from telegram.ext import ContextTypes
 from app.utils.cart_manager import (
     get_cart_summary,
     format_cart_message,
-    clear_user_cart,
-    is_cart_empty
+    clear_user_cart
 )
 from app.utils.warm_greetings import (
     get_greeting_for_user,
@@ -189,7 +188,7 @@ async def cart(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     try:
         # Get cart summary
-        summary = get_cart_summary(user_id)
+        summary = await get_cart_summary(user_id, context)
         
         if summary['is_empty']:
             message = (
@@ -201,7 +200,7 @@ async def cart(update: Update, context: ContextTypes.DEFAULT_TYPE):
             ]
         else:
             # Format cart message
-            message = format_cart_message(user_id)
+            message = await format_cart_message(user_id, context)
             
             # Create keyboard
             keyboard = [
@@ -242,8 +241,11 @@ async def order(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.info(f"👤 /order from {user.username or user.first_name}")
     
     try:
+        # Get cart summary (memoized for this update)
+        summary = await get_cart_summary(user_id, context)
+        
         # Check if cart is empty
-        if is_cart_empty(user_id):
+        if summary['is_empty']:
             await update.message.reply_text(
                 "⚠️ Ваш кошик порожній!\n\n"
                 "Додайте товари через /menu перед оформленням замовлення.",
@@ -253,12 +255,9 @@ async def order(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             return
         
-        # Get cart summary
-        summary = get_cart_summary(user_id)
-        
         message = (
             "📦 <b>Оформлення замовлення</b>\n\n"
-            f"{format_cart_message(user_id)}\n\n"
+            f"{await format_cart_message(user_id, context)}\n\n"
             "Для оформлення замовлення:\n"
             "1️⃣ Натисни кнопку 'Продовжити'\n"
             "2️⃣ Введи свій номер телефону\n"
@@ -7,12 +7,29 @@ import re
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
-from app.utils.cart_manager import clear_user_cart, get_cart_summary
+from app.utils.cart_manager import add_to_cart, clear_user_cart, get_cart_summary, get_user_cart
 from app.utils.warm_greetings import update_user_stats
 from app.handlers.callbacks import show_order_confirmation
+from app.services.menu_store import menu_store
+from app.services.menu_search import menu_retriever
+from app.services.gemini_service import get_gemini_service
+from app.services.intent_classifier import (
+    intent_classifier,
+    INTENT_ADD,
+    INTENT_SHOW,
+    INTENT_CATEGORY,
+    INTENT_GREETING,
+    INTENT_MENU,
+    INTENT_CART,
+    INTENT_PROFILE,
+    INTENT_HELP
+)
 
 logger = logging.getLogger(__name__)
 
+# Повідомлення до стількох слів спершу пробуємо як пошуковий запит (перед Gemini)
+SEARCH_MAX_WORDS = 3
+
 
 async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle all text messages"""
@@ -181,12 +198,28 @@ async def handle_promo_input(update: Update, context: ContextTypes.DEFAULT_TYPE,
 
 
 async def handle_general_message(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str):
-    """Handle general messages"""
-    text_lower = text.lower()
+    """Handle general messages (локальний розбір, Gemini - тільки для неоднозначних)"""
+    intent = intent_classifier.classify(text)
+    
+    if intent.name == INTENT_ADD:
+        await reply_items_added(update, intent.items)
+        return
+    
+    if intent.name == INTENT_SHOW:
+        await reply_items_found(update, intent.items)
+        return
+    
+    if intent.name == INTENT_CATEGORY:
+        await update.message.reply_text(
+            f"🍴 Відкриваю «{intent.category}»...",
+            reply_markup=InlineKeyboardMarkup([
+                [InlineKeyboardButton(f"🍴 {intent.category}", callback_data=f"category_{intent.category}")]
+            ])
+        )
+        return
     
     # Greetings
-    greetings = ['привіт', 'здрастуй', 'вітаю', 'добрий день', 'hello', 'hi']
-    if any(greeting in text_lower for greeting in greetings):
+    if intent.name == INTENT_GREETING:
         await update.message.reply_text(
             "👋 Привіт! Я FerrikBot.\n\n"
             "Використовуй /menu щоб переглянути меню або /help для довідки.",
@@ -200,8 +233,7 @@ async def handle_general_message(update: Update, context: ContextTypes.DEFAULT_T
         return
     
     # Menu keywords
-    menu_keywords = ['меню', 'menu', 'їжа', 'замовити', 'піца', 'бургер']
-    if any(keyword in text_lower for keyword in menu_keywords):
+    if intent.name == INTENT_MENU:
         await update.message.reply_text(
             "🍕 Відкриваю меню...",
             reply_markup=InlineKeyboardMarkup([
@@ -211,8 +243,7 @@ async def handle_general_message(update: Update, context: ContextTypes.DEFAULT_T
         return
     
     # Cart keywords
-    cart_keywords = ['кошик', 'корзина', 'cart', 'basket']
-    if any(keyword in text_lower for keyword in cart_keywords):
+    if intent.name == INTENT_CART:
         await update.message.reply_text(
             "🛒 Відкриваю кошик...",
             reply_markup=InlineKeyboardMarkup([
@@ -222,8 +253,7 @@ async def handle_general_message(update: Update, context: ContextTypes.DEFAULT_T
         return
     
     # Profile keywords - ДОДАНО
-    profile_keywords = ['профіль', 'profile', 'мої дані', 'my profile']
-    if any(keyword in text_lower for keyword in profile_keywords):
+    if intent.name == INTENT_PROFILE:
         await update.message.reply_text(
             "👤 Відкриваю профіль...",
             reply_markup=InlineKeyboardMarkup([
@@ -233,8 +263,7 @@ async def handle_general_message(update: Update, context: ContextTypes.DEFAULT_T
         return
     
     # Help keywords
-    help_keywords = ['допомога', 'help', 'довідка', 'як', 'що робити']
-    if any(keyword in text_lower for keyword in help_keywords):
+    if intent.name == INTENT_HELP:
         await update.message.reply_text(
             "❓ Відкриваю довідку...",
             reply_markup=InlineKeyboardMarkup([
@@ -243,6 +272,17 @@ async def handle_general_message(update: Update, context: ContextTypes.DEFAULT_T
         )
         return
     
+    # Коротке повідомлення, що збігається зі стравами ("піци", "тірамісу") - пошук по меню
+    if len(text.split()) <= SEARCH_MAX_WORDS:
+        hits = [hit for hit in menu_retriever.search(text, limit=5) if hit.coverage == 1.0]
+        if hits:
+            await reply_items_found(update, [(hit.item, 1) for hit in hits])
+            return
+    
+    # Неоднозначне повідомлення - питаємо Gemini
+    if await handle_ai_message(update, text):
+        return
+    
     # Default
     await update.message.reply_text(
         "🤔 Не впевнений що ти маєш на увазі.\n\n"
@@ -264,4 +304,77 @@ async def handle_general_message(update: Update, context: ContextTypes.DEFAULT_T
     )
 
 
+async def reply_items_added(update: Update, items: list):
+    """Додати розпізнані страви в кошик і підтвердити"""
+    user_id = update.effective_user.id
+    
+    lines = []
+    for item, quantity in items:
+        if await add_to_cart(user_id, {**item, 'quantity': quantity}):
+            lines.append(f"▪️ {item['name']} × {quantity} - {item['price'] * quantity:.0f} грн")
+    
+    if not lines:
+        await update.message.reply_text("⚠️ Не вдалося додати в кошик. Спробуйте через /menu")
+        return
+    
+    await update.message.reply_text(
+        "✅ Додано в кошик:\n" + "\n".join(lines),
+        reply_markup=InlineKeyboardMarkup([
+            [
+                InlineKeyboardButton("🛒 Кошик", callback_data="cart"),
+                InlineKeyboardButton("🍕 Меню", callback_data="menu")
+            ]
+        ])
+    )
+
+
+async def reply_items_found(update: Update, items: list):
+    """Показати розпізнані страви з кнопками додавання"""
+    keyboard = [
+        [InlineKeyboardButton(f"➕ {item['name']} ({item['price']:.0f} грн)", callback_data=f"v2_add_{item['id']}")]
+        for item, _ in items
+    ]
+    keyboard.append([InlineKeyboardButton("🍕 Меню", callback_data="menu")])
+    
+    await update.message.reply_text(
+        "🔎 Знайшов у меню:",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+
+async def handle_ai_message(update: Update, text: str) -> bool:
+    """
+    Розбір неоднозначного повідомлення через Gemini
+    
+    Returns:
+        True якщо відповідь надіслано (False - Gemini недоступний)
+    """
+    gemini = get_gemini_service()
+    if gemini is None:
+        return False
+    
+    user_id = update.effective_user.id
+    menu_items = menu_store.get_items()
+    cart = await get_user_cart(user_id)
+    
+    result = await gemini.process_order_request(user_id, text, menu_items, cart)
+    if result.get('action') == 'cancelled':
+        return True
+    
+    if result.get('action') == 'add_to_cart' and result.get('items'):
+        for item in result['items']:
+            await add_to_cart(user_id, item)
+    
+    await update.message.reply_text(
+        result.get('message') or "🤔 Не впевнений що ти маєш на увазі. Спробуй /menu",
+        reply_markup=InlineKeyboardMarkup([
+            [
+                InlineKeyboardButton("🍕 Меню", callback_data="menu"),
+                InlineKeyboardButton("🛒 Кошик", callback_data="cart")
+            ]
+        ])
+    )
+    return True
+
+
 __all__ = ['handle_text_message']
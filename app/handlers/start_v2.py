@@ -80,7 +80,7 @@ async def start_v2_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     ])
     
     # Якщо є товари в кошику - показуємо
-    cart_count = get_cart_count(user_id, context)
+    cart_count = await get_cart_count(user_id, context)
     if cart_count > 0:
         keyboard.append([
             InlineKeyboardButton(
@@ -120,11 +120,11 @@ def get_top_categories(context: ContextTypes.DEFAULT_TYPE) -> list:
     return ['Піца', 'Бургери', 'Салати', 'Суші', 'Кава', 'Десерти']
 
 
-def get_cart_count(user_id: int, context: ContextTypes.DEFAULT_TYPE) -> int:
+async def get_cart_count(user_id: int, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Отримати кількість товарів у кошику"""
     try:
         from app.utils.cart_manager import get_cart_item_count
-        return get_cart_item_count(user_id)
+        return await get_cart_item_count(user_id)
     except:
         return 0
 
@@ -277,7 +277,7 @@ async def back_to_start_callback(update: Update, context: ContextTypes.DEFAULT_T
         InlineKeyboardButton("❓ Допомога", callback_data="v2_help")
     ])
     
-    cart_count = get_cart_count(user.id, context)
+    cart_count = await get_cart_count(user.id, context)
     if cart_count > 0:
         keyboard.append([
             InlineKeyboardButton(
@@ -8,6 +8,12 @@ from datetime import datetime
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler
 
+from app.services.menu_store import menu_store
+from app.services.menu_search import menu_retriever
+from app.services.mood_catalog import mood_catalog, MOODS
+from app.services.gemini_service import get_gemini_service
+from app.utils.message_stream import MessageStreamer
+
 logger = logging.getLogger(__name__)
 
 
@@ -102,7 +108,7 @@ async def start_v2_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     ]
     
     # Якщо є товари в кошику
-    cart_count = get_cart_count(user_id, context)
+    cart_count = await get_cart_count(user_id, context)
     if cart_count > 0:
         keyboard.append([
             InlineKeyboardButton(
@@ -139,6 +145,25 @@ async def start_v2_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # MOOD-BASED CALLBACKS
 # ============================================================================
 
+def _escape_markdown(text: str) -> str:
+    """Екранування для parse_mode='Markdown' (назви страв з Sheets)"""
+    for char in ('_', '*', '`', '['):
+        text = text.replace(char, '\\' + char)
+    return text
+
+
+def mood_top_dishes(tag: str, limit: int = 3) -> str:
+    """Блок "зараз найкраще" з готової добірки настрою (lookup, без обчислень)"""
+    shortlist = mood_catalog.get(tag)
+    if not shortlist or not shortlist.items:
+        return ""
+    lines = [
+        f"• {_escape_markdown(item['name'])} - {item['price']:.0f} грн"
+        for item in shortlist.items[:limit]
+    ]
+    return "\n\n⭐ *Зараз найкраще:*\n" + "\n".join(lines)
+
+
 async def mood_calm_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Спокійний вечір"""
     query = update.callback_query
@@ -154,6 +179,7 @@ async def mood_calm_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
         "☕ Теплі напої\n\n"
         "Обери категорію або я підберу сам?"
     )
+    message += mood_top_dishes('calm')
     
     keyboard = [
         [
@@ -194,6 +220,7 @@ async def mood_energy_callback(update: Update, context: ContextTypes.DEFAULT_TYP
         "🥤 Energy drinks — бодро!\n\n"
         "Поїхали? 🚀"
     )
+    message += mood_top_dishes('energy')
     
     keyboard = [
         [
@@ -236,6 +263,7 @@ async def mood_party_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
         "   _549 грн замість 650 грн_\n\n"
         "Або зібрати свій набір?"
     )
+    message += mood_top_dishes('party')
     
     keyboard = [
         [
@@ -277,6 +305,7 @@ async def mood_romantic_callback(update: Update, context: ContextTypes.DEFAULT_T
         "🥂 Романтична вечеря\n\n"
         "Вибирай або дозволь мені зібрати ідеальну комбінацію ✨"
     )
+    message += mood_top_dishes('romantic')
     
     keyboard = [
         [
@@ -318,6 +347,7 @@ async def mood_movie_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
         "🌮 Начос + соуси\n\n"
         "Що замовляємо?"
     )
+    message += mood_top_dishes('movie')
     
     keyboard = [
         [
@@ -358,6 +388,7 @@ async def mood_spicy_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
         "🍜 Гострі супи\n\n"
         "⚠️ Попередження: дійсно гостро! 🔥"
     )
+    message += mood_top_dishes('spicy')
     
     keyboard = [
         [
@@ -421,6 +452,77 @@ async def ai_suggest_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
     )
 
 
+# Кнопка "підбери мені" → (настрій з mood_catalog, бюджет на страву)
+AI_MOOD_SUGGESTIONS = {
+    'v2_ai_calm_suggest': ('calm', None),
+    'v2_ai_energy_set': ('energy', None),
+    'v2_ai_party_custom': ('party', None),
+    'v2_ai_romantic': ('romantic', None),
+    'v2_ai_movie': ('movie', None),
+    'v2_ai_budget_150': (None, 150),
+    'v2_ai_budget_300': (None, 300),
+    'v2_ai_budget_500': (None, 500),
+    'v2_ai_budget_unlimited': (None, None),
+}
+BUDGET_MOOD = "смачно, найпопулярніше в меню"
+
+
+async def ai_mood_suggest_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    AI добірка під настрій - відповідь стрімиться в повідомлення
+    
+    Користувач бачить перші рядки через ~секунду замість очікування
+    повної генерації; редагування обмежені MessageStreamer.
+    """
+    query = update.callback_query
+    await query.answer("🤖 Підбираю...")
+    
+    user_id = query.from_user.id
+    tag, max_price = AI_MOOD_SUGGESTIONS[query.data]
+    mood = MOODS[tag] if tag else BUDGET_MOOD
+    
+    keyboard = InlineKeyboardMarkup([
+        [
+            InlineKeyboardButton("📋 Меню", callback_data="v2_classic_menu"),
+            InlineKeyboardButton("🛒 Кошик", callback_data="v2_view_cart")
+        ],
+        [
+            InlineKeyboardButton("◀️ Назад", callback_data="v2_back_to_start")
+        ]
+    ])
+    
+    # Настрій: готова добірка (і текст, якщо фоновий LLM прохід вже був)
+    shortlist = mood_catalog.get(tag) if tag else None
+    if shortlist and shortlist.pitch:
+        await query.edit_message_text(shortlist.pitch, reply_markup=keyboard)
+        return
+    
+    menu_items = list(shortlist.items) if shortlist and shortlist.items else menu_store.get_items()
+    service = get_gemini_service()
+    
+    if service is None or not menu_items:
+        # Без AI - найрелевантніші страви з локального індексу
+        if max_price is not None:
+            menu_items = [item for item in menu_items if item['price'] <= max_price]
+        items = menu_items[:3] if shortlist else menu_retriever.top_k(mood, menu_items, 3)
+        lines = [f"• {item['name']} - {item['price']} грн" for item in items]
+        text = "⭐ Ось що раджу:\n\n" + "\n".join(lines) if lines else "😔 Меню зараз недоступне. Спробуй пізніше."
+        await query.edit_message_text(text, reply_markup=keyboard)
+        return
+    
+    await query.edit_message_text("🤖 Думаю, що тобі підійде...")
+    
+    streamer = MessageStreamer(query.edit_message_text)
+    text = await service.stream_mood_suggestion(
+        mood, menu_items, streamer.update, user_id=user_id, max_price=max_price
+    )
+    if not text:
+        return  # Скасовано новим запитом користувача
+    
+    await streamer.finish(text, reply_markup=keyboard)
+    logger.info(f"🤖 Streamed mood suggestion for {user_id} ({streamer.edits} edits)")
+
+
 # ============================================================================
 # ШВИДКЕ ПОВТОРНЕ ЗАМОВЛЕННЯ
 # ============================================================================
@@ -463,11 +565,11 @@ async def repeat_last_callback(update: Update, context: ContextTypes.DEFAULT_TYP
 # HELPERS
 # ============================================================================
 
-def get_cart_count(user_id: int, context: ContextTypes.DEFAULT_TYPE) -> int:
+async def get_cart_count(user_id: int, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Отримати кількість товарів у кошику"""
     try:
         from app.utils.cart_manager import get_cart_item_count
-        return get_cart_item_count(user_id)
+        return await get_cart_item_count(user_id)
     except:
         return 0
 
@@ -513,7 +615,7 @@ async def back_to_start_callback(update: Update, context: ContextTypes.DEFAULT_T
         ],
     ]
     
-    cart_count = get_cart_count(user.id, context)
+    cart_count = await get_cart_count(user.id, context)
     if cart_count > 0:
         keyboard.append([
             InlineKeyboardButton(
@@ -548,6 +650,10 @@ def register_start_v2_wow_handlers(application):
     
     # AI callbacks
     application.add_handler(CallbackQueryHandler(ai_suggest_callback, pattern="^v2_ai_suggest$"))
+    application.add_handler(CallbackQueryHandler(
+        ai_mood_suggest_callback,
+        pattern="^(" + "|".join(AI_MOOD_SUGGESTIONS) + ")$"
+    ))
     
     # Repeat callbacks
     application.add_handler(CallbackQueryHandler(repeat_last_callback, pattern="^v2_repeat_last$"))
@@ -0,0 +1,109 @@
+"""
+🧩 MODELS - SQLAlchemy моделі PostgreSQL
+Замовлення, рядки замовлень, користувачі та промокоди
+
+PostgreSQL - основне сховище; аркуш "Замовлення" в Google Sheets
+оновлюється з БД (app.services.sheets_mirror) для операторів.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import (
+    BigInteger, Column, Date, DateTime, Float, ForeignKey,
+    Index, Integer, Numeric, String, Text
+)
+from sqlalchemy.orm import relationship
+
+from app.database import Base
+
+
+class User(Base):
+    """Користувач бота + агрегати замовлень (оновлюються разом із замовленням)"""
+    __tablename__ = "users"
+
+    telegram_user_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    username = Column(String(255), nullable=True)
+    phone = Column(String(32), nullable=True)
+    address = Column(Text, nullable=True)
+    order_count = Column(Integer, nullable=False, default=0)
+    total_spent = Column(Numeric(12, 2), nullable=False, default=0)
+    first_order_at = Column(DateTime, nullable=True)
+    last_order_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class Order(Base):
+    """Замовлення (колонки відповідають аркушу "Замовлення")"""
+    __tablename__ = "orders"
+
+    order_id = Column(String(64), primary_key=True)             # ID_Замовлення
+    telegram_user_id = Column(BigInteger, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    total = Column(Numeric(12, 2), nullable=False, default=0)
+    delivery_cost = Column(Numeric(10, 2), nullable=False, default=0)
+    discount = Column(Numeric(10, 2), nullable=False, default=0)
+    address = Column(Text, nullable=True)
+    phone = Column(String(32), nullable=True)
+    payment_method = Column(String(32), nullable=True)
+    status = Column(String(32), nullable=False, default='Новий')
+    channel = Column(String(32), nullable=True)
+    delivery_type = Column(String(32), nullable=True)
+    note = Column(Text, nullable=True)
+    promo_code = Column(String(64), nullable=True)
+    restaurant = Column(String(255), nullable=True)
+    # NULL - ще не віддзеркалено в Google Sheets
+    mirrored_at = Column(DateTime, nullable=True)
+
+    lines = relationship(
+        "OrderLine",
+        back_populates="order",
+        cascade="all, delete-orphan",
+        order_by="OrderLine.id",
+        lazy="selectin"
+    )
+
+    __table_args__ = (
+        # Історія замовлень користувача (останні спочатку)
+        Index("ix_orders_user_created", "telegram_user_id", "created_at"),
+        Index("ix_orders_promo_code", "promo_code"),
+        Index("ix_orders_restaurant_created", "restaurant", "created_at"),
+        # Черга дзеркалювання: тільки невіддзеркалені рядки
+        Index(
+            "ix_orders_pending_mirror", "created_at",
+            postgresql_where=mirrored_at.is_(None)
+        ),
+    )
+
+
+class OrderLine(Base):
+    """Рядок замовлення (ціна та назва на момент замовлення)"""
+    __tablename__ = "order_lines"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    order_id = Column(String(64), ForeignKey("orders.order_id", ondelete="CASCADE"), nullable=False, index=True)
+    item_id = Column(String(64), nullable=True)
+    name = Column(String(255), nullable=False, default='')
+    price = Column(Numeric(10, 2), nullable=False, default=0)
+    quantity = Column(Integer, nullable=False, default=1)
+    restaurant = Column(String(255), nullable=True)
+
+    order = relationship("Order", back_populates="lines")
+
+    __table_args__ = (
+        Index("ix_order_lines_item", "item_id"),
+    )
+
+
+class PromoCode(Base):
+    """Промокод (синхронізується з аркуша "Промокоди")"""
+    __tablename__ = "promo_codes"
+
+    code = Column(String(64), primary_key=True)                # Код (UPPER)
+    partner_id = Column(String(64), nullable=True)
+    discount_pct = Column(Float, nullable=False, default=0)
+    usage_limit = Column(Integer, nullable=False, default=999)
+    used = Column(Integer, nullable=False, default=0)
+    valid_until = Column(Date, nullable=True)
+    status = Column(String(32), nullable=False, default='Активний')
+    created_by = Column(String(64), nullable=True)
+    synced_at = Column(DateTime, nullable=False, default=datetime.utcnow)
@@ -2,18 +2,197 @@
 🤖 GEMINI SERVICE - Google AI Integration
 Повний файл, готовий до використання на GitHub
 """
+import os
+import re
 import json
+import asyncio
+import hashlib
 import logging
 import time
-from typing import List, Dict, Any, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
 try:
     import google.generativeai as genai
 except ImportError:
     genai = None
 
+from app.utils.circuit_breaker import gemini_breaker, CircuitOpenError
+from app.utils.metrics import metrics
+from app.utils.cache import ai_cache, cart_signature, menu_signature
+from app.services.menu_search import menu_retriever
+
 logger = logging.getLogger(__name__)
 
+# ============================================================================
+# ЛІМІТИ
+# ============================================================================
+
+# Таймаут одного виклику моделі (AppConfig.ai_timeout)
+GEMINI_TIMEOUT = float(os.getenv('AI_TIMEOUT', '30'))
+# Максимум одночасних викликів Gemini на процес
+GEMINI_MAX_CONCURRENCY = int(os.getenv('GEMINI_MAX_CONCURRENCY', '4'))
+# Скільки запит може чекати вільного слоту, перш ніж отримати відмову
+GEMINI_QUEUE_TIMEOUT = float(os.getenv('GEMINI_QUEUE_TIMEOUT', '5'))
+# Скільки найрелевантніших товарів меню потрапляє в промпт
+PROMPT_MENU_ITEMS = int(os.getenv('GEMINI_PROMPT_ITEMS', '12'))
+
+
+# Отримує накопичений текст відповіді під час стрімінгу
+PartialCallback = Callable[[str], Awaitable[Any]]
+
+
+class GeminiBusyError(Exception):
+    """Всі слоти Gemini зайняті довше за GEMINI_QUEUE_TIMEOUT"""
+
+
+class _SharedCall:
+    """
+    Один виклик моделі, на який чекають кілька однакових запитів
+    
+    Для стрімінгу накопичений текст розсилається всім підписникам,
+    а той, хто приєднався пізніше, одразу отримує вже згенероване.
+    Розсилка не блокує стрім: у кожного підписника своя задача доставки,
+    яка завжди відправляє найсвіжіший текст (проміжні версії пропускаються).
+    """
+    
+    __slots__ = ('task', 'waiters', 'listeners', 'text', 'deliveries')
+    
+    def __init__(self):
+        self.task: Optional[asyncio.Future] = None
+        self.waiters = 0
+        self.listeners: List[PartialCallback] = []
+        self.text = ""
+        self.deliveries: Dict[PartialCallback, asyncio.Task] = {}
+    
+    async def publish(self, text: str):
+        """on_partial для моделі: тільки запускає доставку, не чекає Telegram"""
+        self.text = text
+        for listener in list(self.listeners):
+            self.deliver(listener)
+    
+    def deliver(self, listener: PartialCallback):
+        delivery = self.deliveries.get(listener)
+        if delivery is None or delivery.done():
+            self.deliveries[listener] = asyncio.ensure_future(self._deliver(listener))
+    
+    async def _deliver(self, listener: PartialCallback):
+        sent = None
+        while listener in self.listeners and self.text and self.text != sent:
+            sent = self.text
+            try:
+                await listener(sent)
+            except Exception as e:
+                logger.warning(f"⚠️ Partial listener failed: {e}")
+                return
+    
+    def unsubscribe(self, listener: PartialCallback):
+        """Підписник пішов: проміжна доставка не має перезаписати фінальний текст"""
+        self.listeners.remove(listener)
+        delivery = self.deliveries.pop(listener, None)
+        if delivery is not None and not delivery.done():
+            delivery.cancel()
+
+
+# ============================================================================
+# JSON З ВІДПОВІДІ МОДЕЛІ
+# ============================================================================
+
+_JSON_DECODER = json.JSONDecoder()
+_TRAILING_COMMA_RE = re.compile(r',\s*([}\]])')
+_PY_LITERAL_RE = re.compile(r'(?<=[:\[,\s])(True|False|None)(?=\s*[,}\]])')
+_PY_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+_SMART_QUOTES = str.maketrans({'“': '"', '”': '"', '„': '"'})
+# Скільки '{' перебирати, перш ніж визнати, що JSON у відповіді немає
+_JSON_MAX_CANDIDATES = 8
+
+
+def _balanced_object(text: str, start: int) -> str:
+    """
+    Зріз від '{' до парної '}' (дужки в рядках не рахуються)
+    
+    Обірвану відповідь (ліміт токенів) домикає: закриває рядок і дужки.
+    """
+    closers = []
+    in_string = escaped = False
+    for pos in range(start, len(text)):
+        char = text[pos]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == '{':
+            closers.append('}')
+        elif char == '[':
+            closers.append(']')
+        elif char in '}]' and closers and closers[-1] == char:
+            closers.pop()
+            if not closers:
+                return text[start:pos + 1]
+    
+    return text[start:] + ('"' if in_string else '') + ''.join(reversed(closers))
+
+
+def _repair_json(candidate: str) -> Optional[Dict[str, Any]]:
+    """Типові огріхи моделі: коми перед дужкою, True/None, типографські лапки"""
+    repaired = _TRAILING_COMMA_RE.sub(r'\1', candidate)
+    repaired = _PY_LITERAL_RE.sub(lambda match: _PY_LITERALS[match.group(1)], repaired)
+    for attempt in (repaired, repaired.translate(_SMART_QUOTES)):
+        try:
+            value = json.loads(attempt)
+        except ValueError:
+            continue
+        if isinstance(value, dict):
+            return value
+    return None
+
+
+def extract_json_object(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Перший JSON об'єкт у відповіді моделі
+    
+    Терпить markdown fences, текст до/після JSON, обрізаний кінець і дрібні
+    синтаксичні помилки. Швидкий шлях - raw_decode прямо з позиції '{'
+    (без копій рядка); ремонт - тільки якщо він не вдався.
+    
+    Returns:
+        dict або None, якщо об'єкта немає
+    """
+    if not text:
+        return None
+    
+    start = text.find('{')
+    for _ in range(_JSON_MAX_CANDIDATES):
+        if start == -1:
+            break
+        try:
+            value, _end = _JSON_DECODER.raw_decode(text, start)
+            if isinstance(value, dict):
+                return value
+        except ValueError:
+            value = _repair_json(_balanced_object(text, start))
+            if value is not None:
+                metrics.inc('ai_json_repaired')
+                return value
+        start = text.find('{', start + 1)
+    
+    metrics.inc('ai_json_unparsed')
+    return None
+
+
+def _quantity(value: Any) -> int:
+    """"2", 2.0, "2 шт" → 2 (мінімум 1)"""
+    match = re.search(r'\d+', str(value)) if not isinstance(value, (int, float)) else None
+    try:
+        quantity = int(match.group()) if match else int(value)
+    except (TypeError, ValueError):
+        quantity = 1
+    return max(1, quantity)
+
 
 class GeminiService:
     """
@@ -38,6 +217,12 @@ class GeminiService:
         self.model_name = model_name
         self.model = None
         self.last_request_time = {}  # Для rate limiting
+        self.timeout = GEMINI_TIMEOUT
+        self._semaphore = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+        self._in_flight = 0
+        self._user_tasks: Dict[int, asyncio.Task] = {}  # Поточний AI запит користувача
+        self._shared_calls: Dict[Tuple[str, bool], _SharedCall] = {}  # (хеш промпту, стрімінг) → виклик
+        self.coalesced = 0
         
         logger.info(f"🤖 Initializing Gemini Service: {model_name}")
         
@@ -74,6 +259,172 @@ class GeminiService:
             logger.error(f"❌ Failed to initialize Gemini: {e}")
             raise
     
+    # ========================================================================
+    # ВИКЛИК МОДЕЛІ
+    # ========================================================================
+    
+    async def _stream_model(self, prompt: str, on_partial: PartialCallback) -> str:
+        """Стрімінг відповіді: on_partial отримує накопичений текст після кожного чанку"""
+        if not hasattr(self.model, 'generate_content_async'):
+            # Без async API - одна порція після повної генерації
+            response = await asyncio.to_thread(self.model.generate_content, prompt)
+            await on_partial(response.text)
+            return response.text
+        
+        started_at = time.perf_counter()
+        text = ""
+        response = await self.model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            try:
+                piece = chunk.text
+            except ValueError:
+                continue  # Чанк без тексту (safety / finish_reason)
+            if not piece:
+                continue
+            if not text:
+                metrics.observe('gemini_first_chunk_seconds', time.perf_counter() - started_at)
+            text += piece
+            await on_partial(text)
+        return text
+    
+    async def _call_model(self, prompt: str, on_partial: Optional[PartialCallback] = None):
+        """
+        Один виклик моделі з таймаутом (таймаут рахується як збій breaker)
+        
+        З on_partial - стрімінг, повертає текст; без - об'єкт відповіді.
+        """
+        if on_partial is not None:
+            call = self._stream_model(prompt, on_partial)
+        elif hasattr(self.model, 'generate_content_async'):
+            call = self.model.generate_content_async(prompt)
+        else:
+            call = asyncio.to_thread(self.model.generate_content, prompt)
+        
+        try:
+            return await asyncio.wait_for(call, self.timeout)
+        except asyncio.TimeoutError:
+            metrics.inc('gemini_timeouts')
+            raise
+    
+    async def _generate(self, prompt: str, on_partial: Optional[PartialCallback] = None):
+        """
+        Виклик Gemini: семафор (in-flight ліміт) → circuit breaker → таймаут
+        
+        Не блокує event loop: інші користувачі воркера обслуговуються,
+        поки модель відповідає.
+        
+        Raises:
+            GeminiBusyError: немає вільного слоту за GEMINI_QUEUE_TIMEOUT
+            CircuitOpenError: якщо Gemini деградований (без очікування таймауту)
+            asyncio.TimeoutError: модель не відповіла за self.timeout
+        """
+        queued_at = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), GEMINI_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            metrics.inc('gemini_queue_rejected')
+            raise GeminiBusyError(f"{GEMINI_MAX_CONCURRENCY} Gemini calls already in flight")
+        
+        started_at = time.perf_counter()
+        metrics.observe('gemini_queue_seconds', started_at - queued_at)
+        self._in_flight += 1
+        metrics.set_gauge('gemini_in_flight', self._in_flight)
+        
+        try:
+            return await gemini_breaker.call_async(self._call_model, prompt, on_partial)
+        finally:
+            self._in_flight -= 1
+            metrics.set_gauge('gemini_in_flight', self._in_flight)
+            metrics.observe('gemini_request_seconds', time.perf_counter() - started_at)
+            self._semaphore.release()
+    
+    async def _generate_shared(self, prompt: str, on_partial: Optional[PartialCallback] = None):
+        """
+        _generate з дедуплікацією: однакові промпти, що виконуються одночасно
+        (популярна кнопка настрою), чекають один upstream виклик
+        
+        Виклик скасовується, тільки коли на нього не чекає жоден запит.
+        """
+        key = (hashlib.sha256(prompt.encode('utf-8')).hexdigest(), on_partial is not None)
+        shared = self._shared_calls.get(key)
+        
+        if shared is None:
+            shared = _SharedCall()
+            shared.task = asyncio.ensure_future(
+                self._generate(prompt, shared.publish if on_partial is not None else None)
+            )
+            self._shared_calls[key] = shared
+            shared.task.add_done_callback(lambda _task: self._forget_shared(key, shared))
+        else:
+            self.coalesced += 1
+            metrics.inc('gemini_coalesced', streaming=str(on_partial is not None).lower())
+        
+        shared.waiters += 1
+        if on_partial is not None:
+            shared.listeners.append(on_partial)
+            shared.deliver(on_partial)  # Наздогнати вже згенероване
+        try:
+            return await asyncio.shield(shared.task)
+        finally:
+            shared.waiters -= 1
+            if on_partial is not None:
+                shared.unsubscribe(on_partial)
+            if shared.waiters == 0 and not shared.task.done():
+                # Всі, хто чекав, пішли - відповідь нікому не потрібна
+                self._forget_shared(key, shared)
+                shared.task.cancel()
+    
+    def _forget_shared(self, key: Tuple[str, bool], shared: _SharedCall):
+        if self._shared_calls.get(key) is shared:
+            del self._shared_calls[key]
+    
+    async def _generate_for_user(self, user_id: Optional[int], prompt: str,
+                                 on_partial: Optional[PartialCallback] = None):
+        """
+        Виклик моделі як окремий task користувача
+        
+        Новий запит користувача скасовує попередній, а cancel_user_request
+        (користувач пішов з екрану) - поточний. Якщо скасовано сам handler,
+        скасування так само доходить до виклику моделі.
+        """
+        if user_id is None:
+            return await self._generate_shared(prompt, on_partial)
+        
+        self.cancel_user_request(user_id)
+        task = asyncio.ensure_future(self._generate_shared(prompt, on_partial))
+        self._user_tasks[user_id] = task
+        try:
+            return await task
+        finally:
+            if self._user_tasks.get(user_id) is task:
+                del self._user_tasks[user_id]
+    
+    def cancel_user_request(self, user_id: int) -> bool:
+        """Скасувати AI запит користувача, що виконується (True якщо був)"""
+        task = self._user_tasks.pop(user_id, None)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        metrics.inc('gemini_cancelled')
+        logger.info(f"🛑 AI request cancelled for user {user_id}")
+        return True
+    
+    @staticmethod
+    def _was_superseded() -> bool:
+        """Скасовано тільки AI task користувача, а не сам handler"""
+        current = asyncio.current_task()
+        return current is None or not current.cancelling()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'in_flight': self._in_flight,
+            'max_concurrency': GEMINI_MAX_CONCURRENCY,
+            'timeout': self.timeout,
+            'user_requests': len(self._user_tasks),
+            'shared_calls': len(self._shared_calls),
+            'coalesced': self.coalesced
+        }
+    
     # ========================================================================
     # RATE LIMITING
     # ========================================================================
@@ -117,7 +468,7 @@ class GeminiService:
     # ОБРОБКА ЗАМОВЛЕНЬ
     # ========================================================================
     
-    def process_order_request(
+    async def process_order_request(
         self,
         user_id: int,
         user_message: str,
@@ -142,6 +493,19 @@ class GeminiService:
             }
         """
         
+        # 0️⃣ ВІДБІР: тільки релевантні запиту страви (BM25), а не все меню
+        prompt_items = menu_retriever.top_k(user_message, menu_items, PROMPT_MENU_ITEMS)
+        
+        # КЕШ: той самий намір при тому ж кошику й меню - без виклику моделі
+        # Тільки точний збіг: схожа фраза ("не хочу ...", інша кількість) змінила б кошик
+        cache_context = ('order', cart_signature(user_cart), menu_signature(prompt_items))
+        cached_text = ai_cache.get(user_message, cache_context, fuzzy=False)
+        if cached_text is not None:
+            result = self._parse_ai_response(cached_text, menu_items)
+            if result.get('success'):
+                logger.info(f"💾 AI cache hit for user {user_id}: action={result.get('action')}")
+                return result
+        
         # 1️⃣ ПЕРЕВІРКА RATE LIMITING
         allowed, wait_time = self._check_rate_limit(user_id)
         
@@ -154,19 +518,35 @@ class GeminiService:
             }
         
         # 2️⃣ ПОБУДОВА ПРОМПТУ
-        prompt = self._build_order_prompt(user_message, menu_items, user_cart)
+        prompt = self._build_order_prompt(user_message, prompt_items, user_cart)
         
         try:
             # 3️⃣ ЗАПИТ ДО GEMINI
             logger.info(f"🤖 Sending AI request for user {user_id}")
-            response = self.model.generate_content(prompt)
+            response = await self._generate_for_user(user_id, prompt)
             
             # 4️⃣ ПАРСИНГ ВІДПОВІДІ
             result = self._parse_ai_response(response.text, menu_items)
+            if result.get('success'):
+                ai_cache.set(user_message, response.text, cache_context)
             
             logger.info(f"✅ AI response received: action={result.get('action')}")
             return result
         
+        except (CircuitOpenError, GeminiBusyError, asyncio.TimeoutError) as e:
+            logger.warning(f"🔌 Gemini unavailable ({type(e).__name__}) - local fallback for user {user_id}")
+            return self._fallback_order_result(user_message, menu_items)
+        
+        except asyncio.CancelledError:
+            if not self._was_superseded():
+                raise
+            return {
+                'action': 'cancelled',
+                'items': [],
+                'message': '',
+                'success': False
+            }
+        
         except Exception as e:
             logger.error(f"❌ Gemini API error: {e}")
             return {
@@ -175,21 +555,39 @@ class GeminiService:
                 'success': False
             }
     
+    def _fallback_order_result(
+        self,
+        user_message: str,
+        menu_items: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Детермінована відповідь без AI (Gemini недоступний)"""
+        found = self.search_items(user_message, menu_items, max_results=3)
+        
+        if found:
+            return {
+                'action': 'recommend',
+                'items': found,
+                'message': "🤖 AI тимчасово недоступний, але ось що я знайшов у меню:",
+                'success': True
+            }
+        
+        return {
+            'action': 'show_menu',
+            'items': [],
+            'message': "🤖 AI тимчасово недоступний. Перегляньте меню: /menu",
+            'success': False
+        }
+    
     def _build_order_prompt(
         self,
         user_message: str,
         menu_items: List[Dict[str, Any]],
         user_cart: List[Dict[str, Any]] = None
     ) -> str:
-        """Побудова промпту для AI"""
+        """Побудова промпту для AI (menu_items - вже відібрані для запиту)"""
         
         # Форматування меню
-        menu_text = "ДОСТУПНЕ МЕНЮ:\n"
-        for item in menu_items[:20]:  # Обмежуємо для краї токенів
-            name = item.get('name', 'Unknown')
-            category = item.get('category', 'Other')
-            price = item.get('price', 0)
-            menu_text += f"- {name} ({category}) - {price} грн\n"
+        menu_text = "ДОСТУПНЕ МЕНЮ:\n" + self._format_menu_for_prompt(menu_items)
         
         # Форматування кошика (якщо є)
         cart_text = "ПОТОЧНИЙ КОШИК:\n"
@@ -243,64 +641,12 @@ class GeminiService:
         ai_text: str,
         menu_items: List[Dict[str, Any]]
     ) -> Dict[str, Any]:
-        """Парсинг JSON відповіді від AI"""
+        """Парсинг JSON відповіді від AI (з ремонтом типових огріхів моделі)"""
         
-        try:
-            # Очищення від markdown
-            clean_text = ai_text.strip()
-            if clean_text.startswith('```json'):
-                clean_text = clean_text[7:]
-            if clean_text.startswith('```'):
-                clean_text = clean_text[3:]
-            if clean_text.endswith('```'):
-                clean_text = clean_text[:-3]
-            
-            clean_text = clean_text.strip()
-            
-            # Парсинг JSON
-            result = json.loads(clean_text)
-            
-            # ВАЛІДАЦІЯ ТОВАРІВ
-            if result.get('action') == 'add_to_cart' and result.get('items'):
-                validated_items = []
-                
-                for item in result['items']:
-                    item_id = item.get('id')
-                    item_name = item.get('name', '').lower()
-                    
-                    # Шукаємо товар в меню
-                    found_item = None
-                    for menu_item in menu_items:
-                        if (str(menu_item.get('id')) == str(item_id) or 
-                            menu_item.get('name', '').lower() == item_name or
-                            item_name in menu_item.get('name', '').lower()):
-                            found_item = menu_item
-                            break
-                    
-                    if found_item:
-                        validated_items.append({
-                            'id': found_item['id'],
-                            'name': found_item['name'],
-                            'price': found_item.get('price', 0),
-                            'quantity': int(item.get('quantity', 1))
-                        })
-                
-                result['items'] = validated_items
-            
-            # Перевірка обов'язкових полів
-            if 'action' not in result:
-                result['action'] = 'info'
-            if 'message' not in result:
-                result['message'] = 'Виконано'
-            if 'items' not in result:
-                result['items'] = []
-            
-            result['success'] = True
-            
-            return result
+        result = extract_json_object(ai_text)
         
-        except json.JSONDecodeError as e:
-            logger.error(f"❌ Failed to parse AI JSON: {e}\nText: {ai_text[:200]}")
+        if result is None:
+            logger.warning(f"⚠️ No JSON in AI response: {ai_text[:200]!r}")
             
             return {
                 'action': 'info',
@@ -309,14 +655,33 @@ class GeminiService:
                 'success': False
             }
         
-        except Exception as e:
-            logger.error(f"❌ Error parsing AI response: {e}")
-            return {
-                'action': 'error',
-                'message': '❌ Помилка обробки. Спробуйте пізніше',
-                'items': [],
-                'success': False
-            }
+        # ВАЛІДАЦІЯ ТОВАРІВ: за індексом меню (id / назва), без сканування
+        references = result.get('items')
+        if not isinstance(references, list):
+            references = []
+        
+        validated_items = []
+        if result.get('action') == 'add_to_cart' and references:
+            found = menu_retriever.resolve(references, menu_items)
+            for reference, found_item in zip(references, found):
+                if found_item is None:
+                    continue
+                validated_items.append({
+                    'id': found_item['id'],
+                    'name': found_item['name'],
+                    'price': found_item.get('price', 0),
+                    'quantity': _quantity(reference.get('quantity', 1))
+                })
+            references = validated_items
+        
+        # Перевірка обов'язкових полів
+        return {
+            **result,
+            'action': result.get('action') or 'info',
+            'message': str(result.get('message') or 'Виконано'),
+            'items': references,
+            'success': True
+        }
     
     # ========================================================================
     # ПОШУК ТА РЕКОМЕНДАЦІЇ
@@ -340,27 +705,15 @@ class GeminiService:
             Список знайдених товарів
         """
         
-        query_lower = query.lower()
-        results = []
-        
-        for item in menu_items:
-            name = item.get('name', '').lower()
-            category = item.get('category', '').lower()
-            description = item.get('description', '').lower()
-            
-            # Просте збігання
-            if (query_lower in name or 
-                query_lower in category or 
-                query_lower in description):
-                results.append(item)
-        
-        return results[:max_results]
+        # Індекс меню: відмінки, опечатки, ранжування за релевантністю
+        return menu_retriever.top_k(query, menu_items, max_results, fill=False)
     
-    def get_recommendations(
+    async def get_recommendations(
         self,
         user_mood: Optional[str] = None,
         menu_items: List[Dict[str, Any]] = None,
-        max_recommendations: int = 3
+        max_recommendations: int = 3,
+        user_id: Optional[int] = None
     ) -> Dict[str, Any]:
         """
         Отримати рекомендації на основі настрою
@@ -369,6 +722,7 @@ class GeminiService:
             user_mood: Настрій користувача (happy, sad, busy, lazy)
             menu_items: Меню для рекомендацій
             max_recommendations: Кількість рекомендацій
+            user_id: Користувач (для скасування при навігації)
         
         Returns:
             Рекомендації з повідомленням
@@ -381,7 +735,12 @@ class GeminiService:
             'lazy': "рекомендуй готові, легкі блюда",
         }
         
-        prompt_end = mood_prompts.get(user_mood, "рекомендуй популярні страви")
+        if user_mood in mood_prompts:
+            prompt_end = mood_prompts[user_mood]
+        elif user_mood:
+            prompt_end = f"Настрій клієнта: {user_mood}. Рекомендуй страви, що йому підходять"
+        else:
+            prompt_end = "рекомендуй популярні страви"
         
         if not menu_items:
             return {
@@ -391,10 +750,11 @@ class GeminiService:
             }
         
         try:
+            prompt_items = menu_retriever.top_k(f"{user_mood or ''} {prompt_end}", menu_items, PROMPT_MENU_ITEMS)
             prompt = f"""Ти асистент ресторану. {prompt_end}
 
 Меню:
-{self._format_menu_for_prompt(menu_items[:15])}
+{self._format_menu_for_prompt(prompt_items)}
 
 Рекомендуй {max_recommendations} страви в форматі JSON:
 {{
@@ -405,16 +765,22 @@ class GeminiService:
 }}
 """
             
-            response = self.model.generate_content(prompt)
-            result = json.loads(response.text.strip('```json\n').strip('```'))
+            cache_context = ('recommend', max_recommendations, menu_signature(prompt_items))
+            response_text = ai_cache.get(user_mood or 'popular', cache_context)
+            if response_text is None:
+                response = await self._generate_for_user(user_id, prompt)
+                response_text = response.text
+            
+            result = extract_json_object(response_text)
+            references = result.get('items') if result else None
+            if not isinstance(references, list):
+                logger.warning(f"⚠️ No recommendations JSON from AI: {response_text[:200]!r}")
+                return self._fallback_recommendations(prompt_items, max_recommendations)
             
-            # Валідація
-            validated = []
-            for rec in result.get('items', []):
-                for item in menu_items:
-                    if str(item.get('id')) == str(rec.get('id')):
-                        validated.append(item)
-                        break
+            ai_cache.set(user_mood or 'popular', response_text, cache_context)
+            
+            # Валідація за індексом меню
+            validated = [item for item in menu_retriever.resolve(references, menu_items) if item]
             
             return {
                 'success': True,
@@ -422,6 +788,15 @@ class GeminiService:
                 'items': validated[:max_recommendations]
             }
         
+        except (CircuitOpenError, GeminiBusyError, asyncio.TimeoutError) as e:
+            logger.warning(f"🔌 Gemini unavailable ({type(e).__name__}) - top-rated fallback")
+            return self._fallback_recommendations(menu_items, max_recommendations)
+        
+        except asyncio.CancelledError:
+            if not self._was_superseded():
+                raise
+            return {'success': False, 'message': '', 'items': []}
+        
         except Exception as e:
             logger.error(f"❌ Recommendations error: {e}")
             return {
@@ -430,14 +805,88 @@ class GeminiService:
                 'items': []
             }
     
+    def _fallback_recommendations(
+        self,
+        menu_items: List[Dict[str, Any]],
+        max_recommendations: int
+    ) -> Dict[str, Any]:
+        """Детерміновані рекомендації без AI - найвищий рейтинг"""
+        def rating(item):
+            try:
+                return float(item.get('rating', 0) or 0)
+            except (TypeError, ValueError):
+                return 0.0
+        
+        top_items = sorted(menu_items, key=rating, reverse=True)
+        
+        return {
+            'success': True,
+            'message': 'Ось наші найпопулярніші страви ⭐',
+            'items': top_items[:max_recommendations],
+            'fallback': True
+        }
+    
+    async def stream_mood_suggestion(
+        self,
+        mood: str,
+        menu_items: List[Dict[str, Any]],
+        on_partial: PartialCallback,
+        user_id: Optional[int] = None,
+        max_price: Optional[float] = None
+    ) -> str:
+        """
+        Текстова добірка під настрій, що стрімиться в чат
+        
+        Args:
+            mood: Опис настрою/ситуації ("спокійний вечір, тепла їжа")
+            menu_items: Меню
+            on_partial: Callback з накопиченим текстом (MessageStreamer.update)
+            user_id: Користувач (для скасування при навігації)
+            max_price: Бюджет на одну страву
+        
+        Returns:
+            Повний текст (або детермінована добірка, якщо AI недоступний)
+        """
+        if max_price is not None:
+            menu_items = [item for item in menu_items if float(item.get('price', 0) or 0) <= max_price]
+        if not menu_items:
+            return "😔 Не знайшов страв під ці побажання. Спробуй /menu"
+        
+        prompt_items = menu_retriever.top_k(mood, menu_items, PROMPT_MENU_ITEMS)
+        budget = f" Бюджет - до {max_price:.0f} грн за страву." if max_price is not None else ""
+        prompt = f"""Ти теплий і дружній асистент сервісу доставки їжі.
+Настрій клієнта: {mood}.{budget}
+
+Меню:
+{self._format_menu_for_prompt(prompt_items)}
+
+Запропонуй 2-3 страви ТІЛЬКИ з меню вище: назва, ціна і одне речення, чому підходить.
+Пиши українською, коротко, без JSON і без ідентифікаторів у квадратних дужках.
+"""
+        
+        try:
+            return await self._generate_for_user(user_id, prompt, on_partial)
+        except (CircuitOpenError, GeminiBusyError, asyncio.TimeoutError) as e:
+            logger.warning(f"🔌 Gemini unavailable ({type(e).__name__}) - top-rated fallback")
+        except asyncio.CancelledError:
+            if not self._was_superseded():
+                raise
+            return ""
+        except Exception as e:
+            logger.error(f"❌ Mood suggestion error: {e}")
+        
+        fallback = self._fallback_recommendations(prompt_items, 3)
+        lines = [f"• {item.get('name')} - {item.get('price')} грн" for item in fallback['items']]
+        return fallback['message'] + "\n\n" + "\n".join(lines)
+    
     def _format_menu_for_prompt(self, menu_items: List[Dict[str, Any]]) -> str:
-        """Форматування меню для промпту"""
+        """Форматування меню для промпту (id - щоб модель повертала точні товари)"""
         text = ""
         for item in menu_items:
             name = item.get('name', '')
             price = item.get('price', 0)
             category = item.get('category', '')
-            text += f"- {name} ({category}) - {price} грн\n"
+            text += f"- [{item.get('id', '')}] {name} ({category}) - {price} грн\n"
         return text
     
     # ========================================================================
@@ -454,30 +903,81 @@ class GeminiService:
             logger.error(f"❌ Gemini API test failed: {e}")
             return False
     
-    def generate_response(self, prompt: str) -> str:
+    async def generate_response(
+        self,
+        prompt: str,
+        user_id: Optional[int] = None,
+        on_partial: Optional[PartialCallback] = None
+    ) -> str:
         """
         Генерація загальної відповіді
         
         Args:
             prompt: Промпт для AI
+            user_id: Користувач (для скасування при навігації)
+            on_partial: Стрімінг - викликається з накопиченим текстом
+                        по мірі генерації (напр. MessageStreamer.update)
         
         Returns:
-            Відповідь від AI
+            Повна відповідь від AI
         """
         try:
-            response = self.model.generate_content(prompt)
-            return response.text
+            response = await self._generate_for_user(user_id, prompt, on_partial)
+            return response if on_partial is not None else response.text
+        except (CircuitOpenError, GeminiBusyError, asyncio.TimeoutError) as e:
+            logger.warning(f"🔌 Gemini unavailable ({type(e).__name__}) - static response")
+            return "🤖 AI-помічник тимчасово недоступний. Спробуйте /menu або повторіть пізніше."
+        except asyncio.CancelledError:
+            if not self._was_superseded():
+                raise
+            return ""
         except Exception as e:
             logger.error(f"❌ Error generating response: {e}")
             return "Вибачте, виникла помилка при генерації відповіді."
 
 
+# ============================================================================
+# ГЛОБАЛЬНИЙ INSTANCE
+# ============================================================================
+
+_gemini_service: Optional[GeminiService] = None
+_gemini_init_failed = False
+
+
+def get_gemini_service() -> Optional[GeminiService]:
+    """
+    Спільний GeminiService на процес (один семафор для всіх handlers)
+    
+    Returns:
+        GeminiService або None, якщо ключ не задано / бібліотека не встановлена
+    """
+    global _gemini_service, _gemini_init_failed
+    
+    if _gemini_service is None and not _gemini_init_failed:
+        try:
+            _gemini_service = GeminiService(
+                os.getenv("GEMINI_API_KEY"),
+                os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+            )
+        except Exception as e:
+            _gemini_init_failed = True
+            logger.warning(f"⚠️ Gemini disabled: {e}")
+    
+    return _gemini_service
+
+
+def cancel_user_ai_request(user_id: int) -> bool:
+    """Скасувати AI запит користувача (навігація в інший розділ)"""
+    if _gemini_service is None:
+        return False
+    return _gemini_service.cancel_user_request(user_id)
+
+
 # ============================================================================
 # ТЕСТУВАННЯ (для розробки)
 # ============================================================================
 
 if __name__ == "__main__":
-    import os
     from dotenv import load_dotenv
     
     load_dotenv()
@@ -512,11 +1012,11 @@ if __name__ == "__main__":
     
     # Тест 2: Order processing
     print("\n2️⃣ Testing order processing...")
-    result = service.process_order_request(
+    result = asyncio.run(service.process_order_request(
         user_id=123,
         user_message="Хочу піцу Маргарита",
         menu_items=menu
-    )
+    ))
     print(f"Action: {result.get('action')}")
     print(f"Message: {result.get('message')}")
     print(f"Items: {len(result.get('items', []))} found")
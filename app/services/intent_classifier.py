@@ -0,0 +1,329 @@
+"""
+🧭 INTENT CLASSIFIER - Локальне розпізнавання наміру та сутностей
+Очевидні запити ("додай 2 Маргарита", "покажи піцу", "кошик") розбираються
+без Gemini; в модель йдуть тільки неоднозначні повідомлення
+
+- Ключові слова: один скомпільований regex (одна проходка по тексту)
+- Страви та категорії: індекс по словах назв з menu_store
+  (перебудовується listener'ом при зміні версії меню)
+- Відмінки: слово збігається з назвою за спільним префіксом
+  ("маргариту" ≈ "маргарита", "піцу" ≈ "піца")
+"""
+
+import re
+import time
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.services.menu_store import menu_store
+from app.utils.cache import normalize_message
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# НАМІРИ
+# ============================================================================
+
+INTENT_GREETING = 'greeting'
+INTENT_MENU = 'menu'
+INTENT_CART = 'cart'
+INTENT_PROFILE = 'profile'
+INTENT_HELP = 'help'
+INTENT_ADD = 'add_to_cart'      # Страва(и) + дієслово/кількість
+INTENT_SHOW = 'show_items'      # Страва(и) без наміру додати
+INTENT_CATEGORY = 'show_category'
+INTENT_ESCALATE = 'escalate'    # Неоднозначно - вирішує Gemini
+
+# Префікси слів (порядок груп = пріоритет при кількох збігах)
+_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    INTENT_CART: ('кошик', 'корзин', 'cart', 'basket'),
+    INTENT_PROFILE: ('профіл', 'profile', 'мої дані', 'my profile'),
+    INTENT_HELP: ('допомог', 'допомож', 'довідк', 'help', 'що робити'),
+    INTENT_MENU: ('меню', 'menu', 'каталог', 'їжа', 'їжу', 'замовити'),
+    INTENT_GREETING: ('привіт', 'здрастуй', 'вітаю', 'добрий день', 'добрий вечір', 'доброго ранку',
+                      'hello', 'hi', 'hey'),
+    # Модифікатори (самі по собі наміру не дають)
+    'add': ('додай', 'додати', 'додайте', 'хочу', 'візьму', 'замовлю', 'замовляю', 'дай', 'дайте',
+            'буду', 'add', 'want', 'buy'),
+    'show': ('покажи', 'покажіть', 'показати', 'які є', 'що є', 'show', 'list'),
+    # Заперечення та видалення: локально не розбираємо ("не хочу маргариту")
+    'negate': ('не', 'ні', 'без', 'no', 'not', 'without'),
+    'remove': ('прибери', 'приберіть', 'видали', 'видаліть', 'забери', 'заберіть', 'remove', 'delete'),
+}
+_INTENT_PRIORITY = (INTENT_CART, INTENT_PROFILE, INTENT_HELP, INTENT_MENU, INTENT_GREETING)
+
+_NUMBER_WORDS = {
+    'один': 1, 'одну': 1, 'одна': 1, 'одне': 1,
+    'два': 2, 'дві': 2, 'двоє': 2, 'пару': 2,
+    'три': 3, 'троє': 3, 'чотири': 4, 'пять': 5, 'шість': 6,
+    'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5,
+}
+_QTY_RE = re.compile(r'^(?:x|х)?(\d{1,2})(?:x|х|шт)?$')
+
+# Слова, що не несуть сенсу для розбору
+_STOPWORDS = frozenset((
+    'будь', 'ласка', 'мені', 'нам', 'я', 'ми', 'і', 'й', 'та', 'а', 'з', 'із', 'в', 'у', 'на',
+    'ще', 'що', 'шт', 'штуки', 'штук', 'порції', 'порцію', 'будьласка', 'please', 'the', 'a', 'an',
+    'some', 'me', 'i', 'and', 'of', 'pls', 'x', 'х'
+))
+
+# Максимум різних страв, які розбираємо локально (більше - неоднозначно)
+MAX_LOCAL_ITEMS = 3
+# Стільки "незрозумілих" слів без страви/категорії - вже питання до Gemini
+MAX_UNEXPLAINED_WORDS = 2
+
+
+def _compile_keywords() -> 're.Pattern':
+    """
+    Всі ключові слова → один regex з іменованою групою на намір
+
+    Короткі слова ("hi", "дай") - тільки цілим словом, довші - з
+    закінченням до 3 літер ("кошик" → "кошику", "привіт" → "привітик").
+    """
+    groups = []
+    for intent, words in _KEYWORDS.items():
+        alternatives = '|'.join(
+            re.escape(word) + (r'(?!\w)' if len(word) <= 3 else r'\w{0,3}(?!\w)')
+            for word in sorted(words, key=len, reverse=True)
+        )
+        groups.append(f"(?P<{intent}>(?<!\\w)(?:{alternatives}))")
+    return re.compile('|'.join(groups))
+
+
+_KEYWORD_RE = _compile_keywords()
+
+
+def _words_match(word: str, name_word: str) -> bool:
+    """Слово повідомлення ≈ слово назви з урахуванням відмінкового закінчення"""
+    if word == name_word:
+        return True
+    common = 0
+    for a, b in zip(word, name_word):
+        if a != b:
+            break
+        common += 1
+    return common >= max(3, min(len(word), len(name_word)) - 2)
+
+
+@dataclass(slots=True)
+class Intent:
+    """Результат розбору повідомлення"""
+    name: str
+    items: List[Tuple[Dict[str, Any], int]] = field(default_factory=list)  # (товар, кількість)
+    category: Optional[str] = None
+
+    @property
+    def escalate(self) -> bool:
+        return self.name == INTENT_ESCALATE
+
+
+class _NameIndex:
+    """Слова назв → об'єкти (товари або категорії)"""
+
+    def __init__(self):
+        self.names: Dict[str, Tuple[frozenset, Any]] = {}  # ключ → (слова назви, об'єкт)
+        self._by_prefix: Dict[str, Set[str]] = {}          # 3 літери → слова словника
+        self._keys_by_word: Dict[str, Set[str]] = {}       # слово → ключі назв
+        # Слова, без яких назву все одно впізнати ("піца" у "Піца Маргарита")
+        self.generic: Set[str] = set()
+
+    def add(self, key: str, name: str, value: Any):
+        words = frozenset(word for word in normalize_message(name).split()
+                          if len(word) >= 3 and word not in _STOPWORDS)
+        if not words:
+            return
+        self.names[key] = (words, value)
+        for word in words:
+            self._by_prefix.setdefault(word[:3], set()).add(word)
+            self._keys_by_word.setdefault(word, set()).add(key)
+
+    def mark_generic(self, words: Set[str]):
+        """Загальні слова: категорії, слова з кількох назв, короткі ("рол", "фрі")"""
+        self.generic = {
+            word for word, keys in self._keys_by_word.items()
+            if len(keys) > 1 or len(word) <= 3
+        } | words
+
+    def match(self, words: List[str]) -> Dict[str, Set[int]]:
+        """
+        Назви, впізнані в повідомленні
+
+        Назва впізнана, якщо є хоча б одне її характерне слово, а пропущені
+        слова - загальні ("маргариту" → "Піца Маргарита"), або якщо є всі
+        її слова ("піца" → "Піца").
+
+        Returns:
+            {ключ назви: позиції слів повідомлення, що її утворили}
+        """
+        covered: Dict[str, Dict[str, int]] = {}
+        for position, word in enumerate(words):
+            if len(word) < 3:
+                continue
+            for name_word in self._by_prefix.get(word[:3], ()):
+                if _words_match(word, name_word):
+                    for key in self._keys_by_word[name_word]:
+                        covered.setdefault(key, {}).setdefault(name_word, position)
+
+        matches = {}
+        for key, found in covered.items():
+            name_words = self.names[key][0]
+            missing = name_words.difference(found)
+            if not missing or (missing <= self.generic and not self.generic.issuperset(found)):
+                matches[key] = set(found.values())
+        return matches
+
+    def is_generic(self, key: str) -> bool:
+        return self.names[key][0] <= self.generic
+
+
+class IntentClassifier:
+    """Ключові слова + страви/категорії з меню → Intent"""
+
+    def __init__(self, store=menu_store):
+        self.store = store
+        self._items = _NameIndex()
+        self._categories = _NameIndex()
+        self._version = -1
+        self.total = 0
+        self.escalated = 0
+        store.add_listener(self._rebuild)
+
+    def _rebuild(self, store):
+        items, categories = _NameIndex(), _NameIndex()
+        for item in store.get_items():
+            items.add(item['id'], item['name'], item)
+            if item['category']:
+                categories.add(item['category'].lower(), item['category'], item['category'])
+        category_words = {word for words, _ in categories.names.values() for word in words}
+        items.mark_generic(category_words)
+        self._items, self._categories = items, categories
+        self._version = store.version
+        logger.info(f"🧭 Intent index rebuilt: {len(items.names)} items, {len(categories.names)} categories")
+
+    def _ensure_index(self):
+        items = self.store.get_items()  # Нова версія → _rebuild через listener у фоні
+        if self._version < 0 or (items and not self._items.names):
+            self._rebuild(self.store)
+
+    # ========================================================================
+    # РОЗБІР
+    # ========================================================================
+
+    def classify(self, text: str) -> Intent:
+        """Розібрати повідомлення (мікросекунди; без мережі)"""
+        start = time.perf_counter()
+        intent = self._classify(text)
+
+        self.total += 1
+        if intent.escalate:
+            self.escalated += 1
+            metrics.inc('intent_escalated')
+        else:
+            metrics.inc('intent_local', intent=intent.name)
+        metrics.set_gauge('intent_escalation_rate', round(self.escalated / self.total, 3))
+        metrics.observe('intent_classify_seconds', time.perf_counter() - start)
+        return intent
+
+    def _classify(self, text: str) -> Intent:
+        normalized = normalize_message(text)
+        words = normalized.split()
+        if not words:
+            return Intent(INTENT_ESCALATE)
+
+        self._ensure_index()
+        explained: Set[int] = set()
+
+        # 1. Ключові слова (одна проходка regex)
+        found: Set[str] = set()
+        for match in _KEYWORD_RE.finditer(normalized):
+            found.add(match.lastgroup)
+            first = normalized.count(' ', 0, match.start())
+            explained.update(range(first, first + match.group().count(' ') + 1))
+
+        # Кошик змінюється без підтвердження - тут помилка дорожча за виклик Gemini
+        if 'negate' in found or 'remove' in found:
+            return Intent(INTENT_ESCALATE)
+
+        # 2. Кількості
+        quantities: Dict[int, int] = {}
+        for position, word in enumerate(words):
+            qty_match = _QTY_RE.match(word)
+            qty = int(qty_match.group(1)) if qty_match else _NUMBER_WORDS.get(word)
+            if qty:
+                quantities[position] = qty
+                explained.add(position)
+
+        # 3. Страви та категорії
+        item_matches = self._most_specific(self._items.match(words), self._items)
+        category_matches = self._categories.match(words)
+        for positions in list(item_matches.values()) + list(category_matches.values()):
+            explained.update(positions)
+
+        explained.update(i for i, word in enumerate(words) if word in _STOPWORDS)
+        unexplained = len(words) - len(explained)
+
+        # "покажи піцу": товар "Піца" теж збігся, але мова про категорію
+        if category_matches and all(self._items.is_generic(key) for key in item_matches):
+            item_matches = {}
+
+        if item_matches:
+            if len(item_matches) > MAX_LOCAL_ITEMS or unexplained >= MAX_UNEXPLAINED_WORDS:
+                return Intent(INTENT_ESCALATE)
+
+            items = [
+                (self._items.names[key][1], self._quantity_for(min(positions), quantities))
+                for key, positions in sorted(item_matches.items(), key=lambda kv: min(kv[1]))
+            ]
+            if 'add' in found or quantities:
+                # Додаємо тільки якщо зрозуміле кожне слово
+                return Intent(INTENT_ADD, items=items) if not unexplained else Intent(INTENT_ESCALATE)
+            return Intent(INTENT_SHOW, items=items)
+
+        if category_matches and unexplained <= MAX_UNEXPLAINED_WORDS:
+            key = min(category_matches, key=lambda k: min(category_matches[k]))
+            return Intent(INTENT_CATEGORY, category=self._categories.names[key][1])
+
+        if unexplained >= MAX_UNEXPLAINED_WORDS:
+            return Intent(INTENT_ESCALATE)
+
+        for name in _INTENT_PRIORITY:
+            if name in found:
+                return Intent(name)
+
+        return Intent(INTENT_ESCALATE)
+
+    @staticmethod
+    def _most_specific(matches: Dict[str, Set[int]], index: _NameIndex) -> Dict[str, Set[int]]:
+        """"Піца Маргарита" перемагає "Піца", якщо збіглися обидві"""
+        return {
+            key: positions for key, positions in matches.items()
+            if not any(
+                other != key and index.names[key][0] < index.names[other][0]
+                for other in matches
+            )
+        }
+
+    @staticmethod
+    def _quantity_for(position: int, quantities: Dict[int, int]) -> int:
+        """Кількість перед назвою ("2 маргарити") або одразу після ("маргарита x2")"""
+        for candidate in (position - 1, position - 2, position + 1):
+            if candidate in quantities:
+                return quantities[candidate]
+        return 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'classified': self.total,
+            'escalated': self.escalated,
+            'escalation_rate': round(self.escalated / self.total, 3) if self.total else 0.0,
+            'menu_version': self._version
+        }
+
+
+# ============================================================================
+# ГЛОБАЛЬНИЙ INSTANCE
+# ============================================================================
+
+intent_classifier = IntentClassifier()
@@ -0,0 +1,511 @@
+"""
+🔎 MENU SEARCH - Локальний лексичний індекс меню
+Повнотекстовий пошук (бот, /api/v1/search) і відбір релевантних страв
+для промптів Gemini (top-K замість "перших 20")
+
+- Токени: нормалізація (регістр, пунктуація, апострофи) + легкий
+  стемер українських закінчень ("піци", "піцу" → "піц")
+- Ранжування: BM25 по полях name / category / mood_tags / description
+  з вагами полів
+- Опечатки та невідомі форми: слово запиту без точного збігу
+  замінюється найближчими словами словника за триграмами
+- Індекс над menu_store перебудовується listener'ом при зміні версії меню
+- resolve: товар з відповіді моделі за id / назвою через індекс (без сканів меню)
+- MenuSuggester: автодоповнення назв страв і ресторанів (bisect по префіксу)
+"""
+
+import math
+import time
+import heapq
+import bisect
+import itertools
+import logging
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from app.services.menu_store import menu_store
+from app.utils.cache import normalize_message, menu_signature
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# ТОКЕНІЗАЦІЯ
+# ============================================================================
+
+# Закінчення від довших до коротших; основа лишається не коротшою за 3 літери
+_ENDINGS = tuple(sorted((
+    'ами', 'ями', 'ові', 'еві', 'єві', 'ого', 'ому', 'ими', 'іми', 'ий', 'ій', 'ої', 'ою', 'ею',
+    'ам', 'ям', 'ах', 'ях', 'ом', 'ем', 'єм', 'ів', 'їв', 'ей', 'ти',
+    'а', 'я', 'у', 'ю', 'і', 'ї', 'и', 'е', 'є', 'о', 'ь', 'й',
+), key=len, reverse=True))
+
+_STOPWORDS = frozenset((
+    'і', 'й', 'та', 'а', 'з', 'із', 'зі', 'в', 'у', 'на', 'до', 'для', 'без', 'по', 'що', 'щось',
+    'хочу', 'мені', 'будь', 'ласка', 'дуже', 'який', 'яка', 'яке', 'які', 'є',
+    'the', 'a', 'an', 'and', 'or', 'with', 'of', 'for', 'i', 'want', 'some',
+))
+
+
+def stem(word: str) -> str:
+    """Легкий стемер: відрізати одне найдовше закінчення"""
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(text: Any) -> List[str]:
+    """Текст → основи слів (без стоп-слів)"""
+    return [
+        stem(word) for word in normalize_message(str(text or '')).split()
+        if word not in _STOPWORDS and (len(word) > 1 or word.isdigit())
+    ]
+
+
+def trigrams(word: str) -> Set[str]:
+    padded = f" {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# ============================================================================
+# ІНДЕКС
+# ============================================================================
+
+# Ваги полів (назва важить найбільше)
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'category': 2.0,
+    'mood_tags': 1.5,
+    'description': 1.0,
+    'restaurant': 0.5,
+}
+
+# Пошук: вага рейтингу (5★ = +RATING_BOOST) і бонус за назву, що починається з запиту
+RATING_BOOST = 0.2
+NAME_PREFIX_BOOST = 1.5
+SEARCH_LIMIT = 20
+SEARCH_CACHE_SIZE = 512
+_COVERAGE_STEP = 1e6
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Мінімальна схожість триграм для заміни невідомого слова запиту
+FUZZY_MIN_SIMILARITY = 0.35
+FUZZY_MAX_EXPANSIONS = 3
+
+
+def _rating(item: Dict[str, Any]) -> float:
+    try:
+        return float(item.get('rating', 0) or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class MenuIndex:
+    """BM25 (з вагами полів) + триграмний словник над списком страв"""
+
+    def __init__(self, items: Iterable[Dict[str, Any]]):
+        self.items: List[Dict[str, Any]] = list(items)
+        self.positions: Dict[str, int] = {}
+        self.names: Dict[str, int] = {}                   # нормалізована назва → doc
+        self.rating_boosts: List[float] = []              # 1 + RATING_BOOST * rating / 5
+        self.inactive: Set[int] = set()
+        self._name_terms: List[FrozenSet[str]] = []
+        self._postings: Dict[str, Dict[int, float]] = {}  # term → {doc: BM25 внесок}
+        self._lengths: List[float] = []
+        self._trigrams: Dict[str, Set[str]] = {}          # триграма → терміни
+
+        for doc, item in enumerate(self.items):
+            self.positions[str(item.get('id'))] = doc
+            name = normalize_message(str(item.get('name') or ''))
+            self.names.setdefault(name, doc)
+            self.rating_boosts.append(1 + RATING_BOOST * _rating(item) / 5)
+            if not item.get('active', True):
+                self.inactive.add(doc)
+            self._name_terms.append(frozenset(tokenize(item.get('name'))))
+            frequencies: Counter = Counter()
+            for field, weight in FIELD_WEIGHTS.items():
+                value = item.get(field)
+                if isinstance(value, (list, tuple)):
+                    value = ' '.join(map(str, value))
+                for term in tokenize(value):
+                    frequencies[term] += weight
+            self._lengths.append(sum(frequencies.values()))
+            for term, frequency in frequencies.items():
+                self._postings.setdefault(term, {})[doc] = frequency
+
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+        self._idf = {
+            term: math.log(1 + (len(self.items) - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self._postings.items()
+        }
+        # Внесок BM25 (term, doc) не залежить від запиту - рахуємо один раз
+        for term, docs in self._postings.items():
+            idf = self._idf[term]
+            for doc, frequency in docs.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[doc] / self._avg_length)
+                docs[doc] = idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        for term in self._postings:
+            for gram in trigrams(term):
+                self._trigrams.setdefault(gram, set()).add(term)
+
+        # Відсортовані назви - пошук за префіксом через bisect
+        self._sorted_names: List[Tuple[str, int]] = sorted((name, doc) for name, doc in self.names.items())
+
+    def name_prefix_docs(self, prefix: str) -> List[int]:
+        """Страви, назва яких починається з prefix (нормалізованого)"""
+        if not prefix:
+            return []
+        start = bisect.bisect_left(self._sorted_names, (prefix,))
+        docs = []
+        for name, doc in itertools.islice(self._sorted_names, start, None):
+            if not name.startswith(prefix):
+                break
+            docs.append(doc)
+        return docs
+
+    def _expand(self, term: str) -> List[Tuple[str, float]]:
+        """Термін запиту → [(термін словника, вага)] (точний або триграмні сусіди)"""
+        if term in self._postings:
+            return [(term, 1.0)]
+
+        grams = trigrams(term)
+        overlap: Counter = Counter()
+        for gram in grams:
+            for candidate in self._trigrams.get(gram, ()):
+                overlap[candidate] += 1
+
+        expansions = []
+        for candidate, shared in overlap.most_common(FUZZY_MAX_EXPANSIONS * 4):
+            similarity = shared / (len(grams) + len(trigrams(candidate)) - shared)
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                expansions.append((candidate, similarity))
+        expansions.sort(key=lambda pair: pair[1], reverse=True)
+        return expansions[:FUZZY_MAX_EXPANSIONS]
+
+    def match(self, query: str, allowed: Optional[Set[int]] = None) -> Tuple[Dict[int, float], Dict[int, int], int]:
+        """
+        BM25 + покриття запиту
+
+        Returns:
+            (бали документів, скільки слів запиту знайдено в документі, слів у запиті)
+        """
+        terms = set(tokenize(query))
+        scores: Dict[int, float] = {}
+        matched: Dict[int, int] = {}
+        for term in terms:
+            hit: Set[int] = set()
+            for vocab_term, term_weight in self._expand(term):
+                postings = self._postings[vocab_term]
+                if allowed is not None:
+                    postings = {doc: gain for doc, gain in postings.items() if doc in allowed}
+                for doc, gain in postings.items():
+                    scores[doc] = scores.get(doc, 0.0) + term_weight * gain
+                hit.update(postings)
+            for doc in hit:
+                matched[doc] = matched.get(doc, 0) + 1
+        return scores, matched, len(terms)
+
+    def score(self, query: str, allowed: Optional[Set[int]] = None) -> Dict[int, float]:
+        """BM25 бали документів для запиту (тільки документи з allowed, якщо задано)"""
+        return self.match(query, allowed)[0]
+
+
+    def resolve(self, item_id: Any = None, name: Any = None,
+                allowed: Optional[Set[int]] = None) -> Optional[int]:
+        """
+        Страва, яку назвала модель: id → точна назва → назва, що містить
+        всі слова згаданої (найкращий BM25 серед таких)
+        """
+        doc = self.positions.get(str(item_id)) if item_id not in (None, '') else None
+        if doc is not None and (allowed is None or doc in allowed):
+            return doc
+
+        if not name:
+            return None
+        doc = self.names.get(normalize_message(str(name)))
+        if doc is not None and (allowed is None or doc in allowed):
+            return doc
+
+        terms = set(tokenize(name))
+        if not terms:
+            return None
+        scores = self.score(name, allowed)
+        for doc in sorted(scores, key=scores.get, reverse=True):
+            if terms <= self._name_terms[doc]:
+                return doc
+        return None
+
+
+@dataclass(slots=True)
+class SearchHit:
+    """Результат пошуку по меню"""
+    item: Dict[str, Any]
+    score: float
+    coverage: float  # Частка слів запиту, знайдених у страві (1.0 - всі)
+
+
+class MenuRetriever:
+    """
+    Top-K релевантних страв для промпту
+
+    Для знімка menu_store індекс спільний і перебудовується при зміні
+    версії; для довільного списку страв будується (і кешується) окремо.
+    """
+
+    def __init__(self, store=menu_store):
+        self.store = store
+        self._index: Optional[MenuIndex] = None
+        self._version = -1
+        self._adhoc: Tuple[Optional[int], Optional[MenuIndex]] = (None, None)
+        self._results: OrderedDict = OrderedDict()  # (запит, limit, active_only) → hits
+        store.add_listener(self._rebuild)
+
+    def _rebuild(self, store):
+        self._index = MenuIndex(store.get_items(active_only=False))
+        self._version = store.version
+        self._results = OrderedDict()
+        logger.info(f"🔎 Menu search index v{store.version}: {len(self._index.items)} items, "
+                    f"{len(self._index._postings)} terms")
+
+    def get_index(self) -> MenuIndex:
+        """Індекс поточного знімка menu_store"""
+        self.store.ensure_fresh()  # Нова версія → listener у фоновому потоці
+        if self._index is None:
+            self._rebuild(self.store)
+        return self._index
+
+    def _index_for(self, menu_items: List[Dict[str, Any]]) -> Tuple[MenuIndex, Optional[Set[int]]]:
+        index = self.get_index()
+        allowed = set()
+        for item in menu_items:
+            doc = index.positions.get(str(item.get('id')))
+            if doc is None or index.items[doc] is not item:
+                break
+            allowed.add(doc)
+        else:
+            return index, allowed
+
+        # Список не з menu_store (тести, семпли, старий знімок) - власний індекс
+        signature = menu_signature(menu_items)
+        if self._adhoc[0] != signature:
+            self._adhoc = (signature, MenuIndex(menu_items))
+        return self._adhoc[1], None
+
+    def resolve(self, references: List[Dict[str, Any]],
+                menu_items: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Товари з menu_items за посиланнями моделі [{"id": ..., "name": ...}]
+
+        Returns:
+            Для кожного посилання - товар меню або None
+        """
+        if not references or not menu_items:
+            return [None] * len(references or [])
+        index, allowed = self._index_for(menu_items)
+        resolved = []
+        for reference in references:
+            if not isinstance(reference, dict):
+                resolved.append(None)
+                continue
+            doc = index.resolve(reference.get('id'), reference.get('name'), allowed)
+            resolved.append(index.items[doc] if doc is not None else None)
+        return resolved
+
+    def search(self, query: str, limit: int = SEARCH_LIMIT, active_only: bool = True) -> List[SearchHit]:
+        """
+        Повнотекстовий пошук по меню
+
+        Ранжування: спершу покриття запиту (знайдено всі слова), далі
+        BM25 з бонусом за рейтинг і за назву, що починається з запиту.
+
+        Args:
+            query: Текст запиту ("піци", "маргарита", "тірамісу")
+            limit: Максимум результатів
+            active_only: Тільки доступні страви
+
+        Returns:
+            Знайдені страви від найкращого збігу
+        """
+        started_at = time.perf_counter()
+        index = self.get_index()
+
+        # Популярні запити (і набір тексту по літерах) повторюються - LRU
+        key = (normalize_message(query), limit, active_only)
+        results = self._results
+        cached = results.get(key)
+        if cached is not None:
+            results.move_to_end(key)
+            metrics.inc('menu_search_cache_hits')
+            return list(cached)
+
+        scores, matched, terms = index.match(query)
+
+        boosts = index.rating_boosts
+        quality = {doc: score * boosts[doc] for doc, score in scores.items()}
+        for doc in index.name_prefix_docs(key[0]):
+            if doc in quality:
+                quality[doc] *= NAME_PREFIX_BOOST
+        if active_only:
+            for doc in index.inactive:
+                quality.pop(doc, None)
+
+        # Покриття важливіше за бал: (знайдено слів, якість) в одному float
+        rank = {doc: matched[doc] * _COVERAGE_STEP + value for doc, value in quality.items()}
+        hits = [
+            SearchHit(index.items[doc], round(quality[doc], 4), matched[doc] / terms)
+            for doc in heapq.nlargest(limit, rank, key=rank.get)
+        ]
+
+        results[key] = hits
+        if len(results) > SEARCH_CACHE_SIZE:
+            results.popitem(last=False)
+        metrics.observe('menu_search_seconds', time.perf_counter() - started_at)
+        return list(hits)
+
+    def top_k(self, query: str, menu_items: List[Dict[str, Any]], k: int,
+              fill: bool = True) -> List[Dict[str, Any]]:
+        """
+        Найрелевантніші для запиту страви з menu_items
+
+        Args:
+            query: Повідомлення користувача
+            menu_items: Страви, з яких вибирати
+            k: Скільки повернути
+            fill: Доповнити найкраще оціненими, якщо збігів менше за k
+
+        Returns:
+            До k страв: спочатку за BM25, далі (fill) за рейтингом
+        """
+        if fill and len(menu_items) <= k:
+            return list(menu_items)
+
+        index, allowed = self._index_for(menu_items)
+        scores = index.score(query, allowed)
+        ranked = sorted(scores, key=lambda doc: (scores[doc], _rating(index.items[doc])), reverse=True)
+        selected = [index.items[doc] for doc in ranked[:k]]
+
+        if fill and len(selected) < k:
+            chosen = {str(item.get('id')) for item in selected}
+            rest = sorted(
+                (item for item in menu_items if str(item.get('id')) not in chosen),
+                key=_rating, reverse=True
+            )
+            selected.extend(rest[:k - len(selected)])
+
+        return selected
+
+
+# ============================================================================
+# АВТОДОПОВНЕННЯ
+# ============================================================================
+
+SUGGEST_LIMIT = 8
+# Префікси до цієї довжини мають готовий top-N (діапазони для "п" - тисячі ключів)
+SUGGEST_PRECOMPUTED_PREFIX = 2
+
+
+class MenuSuggester:
+    """
+    Підказки за префіксом: відсортований масив ключів + bisect
+
+    Ключі - повна назва страви/ресторану і кожне її слово, тож "марг"
+    знаходить "Піца Маргарита". Порядок: збіг з початку назви, потім вага
+    (рейтинг страви / кількість страв ресторану). Масив перебудовується
+    при зміні версії меню.
+    """
+
+    def __init__(self, store=menu_store):
+        self.store = store
+        self._keys: List[str] = []
+        self._entries: List[Tuple[float, int]] = []        # паралельно _keys: (ранг, suggestion)
+        self._suggestions: List[Dict[str, Any]] = []
+        self._short: Dict[str, List[int]] = {}            # короткий префікс → готовий top
+        self._version = -1
+        store.add_listener(self._rebuild)
+
+    def _rebuild(self, store):
+        started_at = time.perf_counter()
+        suggestions: List[Dict[str, Any]] = []
+        weights: List[float] = []
+        restaurants: Counter = Counter()
+
+        dishes_by_name: Dict[str, int] = {}
+        for item in store.get_items():
+            if item['restaurant']:
+                restaurants[item['restaurant']] += 1
+            if not item['name']:
+                continue
+            # Однакові назви в різних ресторанах - одна підказка (з найвищим рейтингом)
+            name = normalize_message(item['name'])
+            position = dishes_by_name.get(name)
+            if position is None:
+                dishes_by_name[name] = len(suggestions)
+                suggestions.append({'type': 'dish', 'text': item['name'], 'id': item['id']})
+                weights.append(_rating(item))
+            elif _rating(item) > weights[position]:
+                suggestions[position] = {'type': 'dish', 'text': item['name'], 'id': item['id']}
+                weights[position] = _rating(item)
+
+        for restaurant, dishes in restaurants.items():
+            suggestions.append({'type': 'restaurant', 'text': restaurant, 'id': restaurant})
+            weights.append(min(5.0, 3.0 + dishes / 10))  # Поряд з рейтингом страв
+
+        rows = []
+        for position, suggestion in enumerate(suggestions):
+            name = normalize_message(suggestion['text'])
+            rows.append((name, 10 + weights[position], position))  # Збіг з початку назви - вище
+            for word in set(name.split()[1:]):
+                rows.append((word, weights[position], position))
+        rows.sort()
+
+        self._keys = [row[0] for row in rows]
+        self._entries = [(row[1], row[2]) for row in rows]
+        self._suggestions = suggestions
+        self._short = {}
+        prefixes = {key[:length] for key in self._keys for length in range(1, SUGGEST_PRECOMPUTED_PREFIX + 1)}
+        for prefix in prefixes:
+            self._short[prefix] = self._top(prefix, SUGGEST_LIMIT * 2)
+        self._version = store.version
+
+        logger.info(f"🔤 Menu suggest v{store.version}: {len(rows)} keys, {len(suggestions)} names "
+                    f"in {(time.perf_counter() - started_at) * 1000:.1f}ms")
+
+    def _top(self, prefix: str, limit: int) -> List[int]:
+        start = bisect.bisect_left(self._keys, prefix)
+        end = bisect.bisect_left(self._keys, prefix + '\uffff', start)
+        best: Dict[int, float] = {}
+        for rank, position in itertools.islice(self._entries, start, end):
+            if rank > best.get(position, -1.0):
+                best[position] = rank
+        return heapq.nlargest(limit, best, key=best.get)
+
+    def suggest(self, prefix: str, limit: int = SUGGEST_LIMIT) -> List[Dict[str, Any]]:
+        """
+        Підказки для префікса ("піц", "марг", "піца мар")
+
+        Returns:
+            До limit записів {'type': 'dish' | 'restaurant', 'text', 'id'}
+        """
+        self.store.ensure_fresh()  # Нова версія → listener у фоновому потоці
+        if self._version < 0:
+            self._rebuild(self.store)
+
+        prefix = normalize_message(prefix)
+        if not prefix:
+            return []
+        if len(prefix) <= SUGGEST_PRECOMPUTED_PREFIX and limit <= SUGGEST_LIMIT * 2:
+            positions = self._short.get(prefix, [])[:limit]
+        else:
+            positions = self._top(prefix, limit)
+        return [self._suggestions[position] for position in positions]
+
+
+# ============================================================================
+# ГЛОБАЛЬНІ INSTANCES
+# ============================================================================
+
+menu_retriever = MenuRetriever()
+menu_suggester = MenuSuggester()
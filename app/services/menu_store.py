@@ -0,0 +1,215 @@
+"""
+📚 MENU STORE - Нормалізований snapshot меню в пам'яті
+Один спільний індекс товарів для кошика, API та пошуку
+"""
+import os
+import time
+import threading
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from app.utils.validators import safe_parse_price
+
+logger = logging.getLogger(__name__)
+
+MENU_REFRESH_SECONDS = int(os.getenv('MENU_REFRESH_SECONDS', '300'))
+
+
+def _to_int(value: Any, default: int) -> int:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+def _to_float(value: Any, default: float = 0.0) -> float:
+    try:
+        return float(str(value).replace(',', '.'))
+    except (TypeError, ValueError):
+        return default
+
+
+def normalize_menu_item(row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Рядок аркуша "Меню" → нормалізований товар
+
+    Ключі: id, category, name, description, price, restaurant,
+    time_delivery, photo_url, active, cook_time, allergens, rating, mood_tags
+    """
+    return {
+        'id': str(row.get('ID', '')),
+        'category': row.get('Категорія', ''),
+        'name': row.get('Страва', ''),
+        'description': row.get('Опис', ''),
+        'price': safe_parse_price(row.get('Ціна', 0)),
+        'restaurant': row.get('Ресторан', ''),
+        'time_delivery': _to_int(row.get('Час_доставки_хв'), 30),
+        'photo_url': row.get('Фото_URL', ''),
+        'active': str(row.get('Активний', '')).upper() == 'TRUE',
+        'cook_time': _to_int(row.get('Час_приготування_хв'), 15),
+        'allergens': row.get('Алергени', ''),
+        'rating': _to_float(row.get('Рейтинг', 0)),
+        'mood_tags': [tag.strip() for tag in str(row.get('Mood_Tags', '')).split(',') if tag.strip()]
+    }
+
+
+class MenuStore:
+    """
+    Snapshot меню з індексом по ID
+
+    - Завантажується з SheetsService (Sheets має власний snapshot-fallback);
+      читачі тільки читають поточний snapshot: застарілий (старший за
+      MENU_REFRESH_SECONDS) оновлюється у фоновому потоці і підміняється
+      цілком, синхронно - лише перше завантаження порожнього store
+    - version збільшується тільки коли вміст меню змінився
+    - Listeners викликаються після зміни версії (у потоці оновлення) - для
+      похідних індексів (пошук, рекомендації), які треба перебудувати
+    """
+
+    def __init__(self, loader: Optional[Callable[[], List[Dict]]] = None,
+                 refresh_seconds: int = MENU_REFRESH_SECONDS):
+        """
+        Args:
+            loader: Джерело сирих рядків меню (за замовчуванням sheets_service.get_menu)
+            refresh_seconds: Період оновлення snapshot
+        """
+        self._loader = loader
+        self.refresh_seconds = refresh_seconds
+
+        self._lock = threading.Lock()
+        self._refreshing = threading.Event()  # Фонове оновлення вже запущене
+        self._schedule_lock = threading.Lock()  # Не _lock: той тримається під час завантаження
+        self._items: List[Dict[str, Any]] = []
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self._signature = None
+        self._loaded_at = 0.0
+        self.version = 0
+
+        self._listeners: List[Callable[['MenuStore'], None]] = []
+
+    # ========================================================================
+    # ЗАВАНТАЖЕННЯ
+    # ========================================================================
+
+    def _load_rows(self) -> List[Dict]:
+        if self._loader is not None:
+            return self._loader()
+
+        from app.services.sheets_service import sheets_service
+        return sheets_service.get_menu()
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Оновити snapshot, якщо він застарів (синхронно: завантаження + listeners;
+        для фонового потоку, старту та адмін-команд - читачі викликають ensure_fresh)
+
+        Returns:
+            True якщо версія меню змінилась
+        """
+        if not force and self._loaded_at and time.monotonic() - self._loaded_at < self.refresh_seconds:
+            return False
+
+        with self._lock:
+            # Інший потік міг оновити, поки ми чекали lock
+            if not force and self._loaded_at and time.monotonic() - self._loaded_at < self.refresh_seconds:
+                return False
+
+            try:
+                rows = self._load_rows()
+            except Exception as e:
+                logger.error(f"❌ Menu store refresh failed: {e}")
+                self._loaded_at = time.monotonic()
+                return False
+
+            items = [normalize_menu_item(row) for row in rows]
+            signature = hash(tuple(
+                (item['id'], item['name'], item['price'], item['active'], item['category'],
+                 item['restaurant'], item['rating'], tuple(item['mood_tags']), item['description'])
+                for item in items
+            ))
+
+            self._loaded_at = time.monotonic()
+            if signature == self._signature:
+                return False
+
+            self._items = items
+            self._by_id = {item['id']: item for item in items}
+            self._signature = signature
+            self.version += 1
+            listeners = list(self._listeners)
+
+        logger.info(f"📚 Menu store v{self.version}: {len(items)} items")
+
+        for listener in listeners:
+            try:
+                listener(self)
+            except Exception as e:
+                logger.error(f"❌ Menu store listener error: {e}")
+
+        return True
+
+    def _is_stale(self) -> bool:
+        return time.monotonic() - self._loaded_at >= self.refresh_seconds
+
+    def ensure_fresh(self):
+        """
+        Не блокує: застарілий snapshot оновлюється у фоні (один потік на раз),
+        до завершення читачі бачать попередній. Синхронно - тільки коли
+        меню ще жодного разу не завантажувалось
+        """
+        if not self._loaded_at:
+            self.refresh()
+            return
+        if not self._is_stale() or self._refreshing.is_set():
+            return
+
+        with self._schedule_lock:
+            if self._refreshing.is_set():
+                return
+            self._refreshing.set()
+
+        threading.Thread(target=self._refresh_in_background, name='menu-refresh', daemon=True).start()
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.error(f"❌ Menu store background refresh failed: {e}")
+        finally:
+            self._refreshing.clear()
+
+    def add_listener(self, listener: Callable[['MenuStore'], None]):
+        """Підписатися на зміну версії меню"""
+        self._listeners.append(listener)
+
+    # ========================================================================
+    # ДОСТУП
+    # ========================================================================
+
+    def get_items(self, active_only: bool = True) -> List[Dict[str, Any]]:
+        """Всі товари (нормалізовані; не змінювати - спільний snapshot)"""
+        self.ensure_fresh()
+        items = self._items
+        if active_only:
+            return [item for item in items if item['active']]
+        return items
+
+    def get_item(self, item_id: Any) -> Optional[Dict[str, Any]]:
+        """Товар по ID (O(1))"""
+        self.ensure_fresh()
+        return self._by_id.get(str(item_id))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика snapshot"""
+        return {
+            'version': self.version,
+            'items': len(self._items),
+            'age_seconds': round(time.monotonic() - self._loaded_at, 1) if self._loaded_at else None
+        }
+
+
+# ============================================================================
+# ГЛОБАЛЬНИЙ INSTANCE
+# ============================================================================
+
+menu_store = MenuStore()
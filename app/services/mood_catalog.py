@@ -0,0 +1,197 @@
+"""
+🎭 MOOD CATALOG - Готові добірки страв під настрій
+Кнопки настрою в боті та /api/v1/menu/mood/{tag} - це просто lookup
+
+- Перебудова тільки при зміні версії меню (listener menu_store)
+- Ранжування: явний mood-тег страви, далі BM25 по опису настрою,
+  всередині - рейтинг; тільки активні страви з ціною
+- Опційний LLM прохід у фоні: Gemini обирає найкраще з добірки
+  і пише короткий текст, який кнопка "підбери мені" віддає миттєво
+"""
+
+import os
+import time
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.menu_store import menu_store
+from app.services.menu_search import menu_retriever
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+MOOD_SHORTLIST_SIZE = int(os.getenv('MOOD_SHORTLIST_SIZE', '8'))
+# LLM прохід після зміни меню (один виклик Gemini на настрій)
+MOOD_LLM_PASS = os.getenv('MOOD_LLM_PASS', 'true').lower() in ('1', 'true', 'yes')
+
+# Настрої бота: тег → опис (для BM25 і промпту)
+MOODS = {
+    'calm': "спокійний вечір вдома, тепла затишна їжа, супи, паста",
+    'energy': "треба швидко зарядитись енергією, ситно: бургери, піца, мексиканська",
+    'party': "вечірка з друзями, страви на компанію, піца, закуски, напої",
+    'romantic': "романтична вечеря на двох, паста, суші, десерт",
+    'movie': "перегляд фільму, перекус, піца, бургери, начос, снеки",
+    'spicy': "гостре, пікантне, спайсі, чилі, мексиканська кухня",
+}
+
+
+@dataclass(slots=True, frozen=True)
+class MoodShortlist:
+    """Добірка для одного настрою (знімок версії меню)"""
+    tag: str
+    items: Tuple[Dict[str, Any], ...]
+    menu_version: int
+    pitch: Optional[str] = None  # Текст від LLM проходу
+
+
+def _rating(item: Dict[str, Any]) -> float:
+    return float(item.get('rating') or 0)
+
+
+def _fingerprint(items) -> frozenset:
+    return frozenset((item['id'], item['name'], item['price']) for item in items)
+
+
+class MoodCatalog:
+    """Добірки для всіх настроїв (MOODS + теги, що є в меню)"""
+
+    def __init__(self, store=menu_store, size: int = MOOD_SHORTLIST_SIZE):
+        self.store = store
+        self.size = size
+        self._shortlists: Dict[str, MoodShortlist] = {}
+        self._version = -1
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._llm_task: Optional[asyncio.Task] = None
+        store.add_listener(self._on_menu_change)
+
+    # ========================================================================
+    # ПОБУДОВА
+    # ========================================================================
+
+    def _rank(self, tag: str, items: List[Dict[str, Any]],
+              item_tags: Dict[str, frozenset]) -> Tuple[Dict[str, Any], ...]:
+        tagged = sorted((item for item in items if tag in item_tags[item['id']]), key=_rating, reverse=True)
+        if len(tagged) >= self.size or tag not in MOODS:
+            return tuple(tagged[:self.size])
+
+        # Тегованих мало - доповнити релевантними опису настрою
+        chosen = {item['id'] for item in tagged}
+        rest = [item for item in items if item['id'] not in chosen]
+        related = menu_retriever.top_k(MOODS[tag], rest, self.size - len(tagged), fill=False)
+        return tuple(tagged + related)
+
+    def rebuild(self):
+        """Перерахувати всі добірки з поточного знімка меню"""
+        started_at = time.perf_counter()
+        version = self.store.version
+        items = [item for item in self.store.get_items() if item['price'] > 0]
+
+        item_tags = {item['id']: frozenset(tag.lower() for tag in item['mood_tags']) for item in items}
+        tags = set(MOODS).union(*item_tags.values())
+
+        previous = self._shortlists
+        shortlists = {}
+        for tag in tags:
+            ranked = self._rank(tag, items, item_tags)
+            pitch = None
+            old = previous.get(tag)
+            if old and old.pitch and _fingerprint(old.items) == _fingerprint(ranked):
+                # Добірка та сама - порядок і текст LLM ще актуальні
+                order = {item['id']: position for position, item in enumerate(old.items)}
+                ranked = tuple(sorted(ranked, key=lambda item: order[item['id']]))
+                pitch = old.pitch
+            shortlists[tag] = MoodShortlist(tag, ranked, version, pitch)
+
+        self._shortlists = shortlists  # Атомарна заміна - читачі бачать цілий знімок
+        self._version = version
+        metrics.observe('mood_catalog_rebuild_seconds', time.perf_counter() - started_at)
+        logger.info(f"🎭 Mood catalog v{version}: {len(shortlists)} moods "
+                    f"in {(time.perf_counter() - started_at) * 1000:.1f}ms")
+
+    def _on_menu_change(self, store):
+        self.rebuild()
+        if self._loop is not None and MOOD_LLM_PASS:
+            # Listener може бути викликаний з будь-якого потоку
+            self._loop.call_soon_threadsafe(self._schedule_llm_pass)
+
+    # ========================================================================
+    # LLM ПРОХІД
+    # ========================================================================
+
+    def _schedule_llm_pass(self):
+        if self._llm_task and not self._llm_task.done():
+            self._llm_task.cancel()  # Меню знову змінилось - старий прохід неактуальний
+        self._llm_task = asyncio.ensure_future(self._llm_pass())
+
+    async def _llm_pass(self):
+        from app.services.gemini_service import get_gemini_service
+
+        service = get_gemini_service()
+        if service is None:
+            return
+
+        started_at = time.perf_counter()
+        updated = 0
+        for tag in MOODS:
+            shortlist = self._shortlists.get(tag)
+            if not shortlist or not shortlist.items or shortlist.pitch:
+                continue
+
+            try:
+                result = await service.get_recommendations(
+                    MOODS[tag], list(shortlist.items), max_recommendations=3
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ Mood LLM pass failed for '{tag}': {e}")
+                continue
+            if not result.get('success') or result.get('fallback') or not result.get('items'):
+                continue
+
+            # Обрані моделлю - на початок добірки
+            picked = [item['id'] for item in result['items']]
+            items = tuple(result['items']) + tuple(item for item in shortlist.items if item['id'] not in picked)
+            lines = [f"• {item['name']} - {item['price']:.0f} грн" for item in result['items']]
+            pitch = f"{result.get('message') or '⭐ Ось що раджу:'}\n\n" + "\n".join(lines)
+
+            current = self._shortlists.get(tag)
+            if current is shortlist:  # Знімок не перебудували, поки чекали модель
+                self._shortlists = {**self._shortlists, tag: MoodShortlist(tag, items, shortlist.menu_version, pitch)}
+                updated += 1
+
+        metrics.inc('mood_catalog_llm_updates', updated)
+        logger.info(f"🎭 Mood LLM pass: {updated} moods in {time.perf_counter() - started_at:.1f}s")
+
+    def start(self):
+        """Увімкнути LLM прохід (в event loop додатку) і побудувати добірки"""
+        self._loop = asyncio.get_running_loop()
+        if self._version != self.store.version or not self._shortlists:
+            self.rebuild()
+        if MOOD_LLM_PASS:
+            self._schedule_llm_pass()
+
+    # ========================================================================
+    # ДОСТУП
+    # ========================================================================
+
+    def get(self, tag: str) -> Optional[MoodShortlist]:
+        """Добірка для настрою (None - такого тегу в меню немає)"""
+        self.store.ensure_fresh()  # Нова версія → listener у фоновому потоці
+        if self._version < 0:
+            self.rebuild()
+        return self._shortlists.get(tag.lower())
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'menu_version': self._version,
+            'moods': len(self._shortlists),
+            'with_pitch': sum(1 for shortlist in self._shortlists.values() if shortlist.pitch)
+        }
+
+
+# ============================================================================
+# ГЛОБАЛЬНИЙ INSTANCE
+# ============================================================================
+
+mood_catalog = MoodCatalog()
@@ -0,0 +1,667 @@
+"""
+🗃️ ORDER REPOSITORY - Замовлення, користувачі та промокоди
+PostgreSQL - основне сховище (індексовані запити, транзакції),
+Google Sheets - дзеркало замовлень для операторів (app.services.sheets_mirror)
+
+Без БД (DATABASE_URL не задано або драйвер не встановлено) методи
+працюють напряму через SheetsService, як раніше.
+"""
+
+import os
+import json
+import time
+import threading
+import logging
+from datetime import datetime, date
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.services.sheets_service import sheets_service
+from app.utils.validators import safe_parse_price, normalize_phone
+from app.utils.metrics import metrics
+
+# PostgreSQL (optional)
+try:
+    from sqlalchemy import select, update, insert, func
+    from sqlalchemy.dialects.postgresql import insert as pg_insert
+    from app.database import SessionLocal, DATABASE_CONFIGURED, init_db
+    from app.models import User, Order, OrderLine, PromoCode
+    DATABASE_AVAILABLE = True
+except ImportError:
+    DATABASE_AVAILABLE = False
+    DATABASE_CONFIGURED = False
+
+logger = logging.getLogger(__name__)
+
+PROMO_SYNC_SECONDS = int(os.getenv('PROMO_SYNC_SECONDS', '300'))
+BACKFILL_PAGE_SIZE = int(os.getenv('BACKFILL_PAGE_SIZE', '500'))
+
+ORDER_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+_LEGACY_TIME_FORMATS = ('%d.%m.%Y %H:%M:%S', '%d.%m.%Y %H:%M', '%d.%m.%Y')
+
+
+# ============================================================================
+# КОНВЕРТАЦІЯ: рядок аркуша "Замовлення" <-> таблиці orders / order_lines
+# ============================================================================
+
+def parse_order_time(value: Any) -> Optional[datetime]:
+    """Час_Замовлення (ISO або dd.mm.yyyy) → datetime"""
+    if isinstance(value, datetime):
+        return value
+
+    text = str(value or '').strip()
+    if not text:
+        return None
+
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        pass
+
+    for fmt in _LEGACY_TIME_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def _to_int(value: Any, default: int = 0) -> int:
+    try:
+        return int(float(str(value).strip().replace(',', '.')))
+    except (TypeError, ValueError):
+        return default
+
+
+def parse_order_items(raw: Any) -> List[Dict[str, Any]]:
+    """Товари_JSON → список товарів (порожній при битому JSON)"""
+    if isinstance(raw, list):
+        items = raw
+    else:
+        try:
+            items = json.loads(raw or '[]')
+        except (TypeError, ValueError):
+            return []
+    return [item for item in items if isinstance(item, dict)] if isinstance(items, list) else []
+
+
+def order_values_from_sheet_row(row: Dict[str, Any]) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Рядок аркуша "Замовлення" → (значення orders, значення order_lines)
+
+    Товари_JSON розбирається один раз; значення придатні для bulk insert.
+    """
+    order_id = str(row.get('ID_Замовлення', '')).strip()
+    items = parse_order_items(row.get('Товари_JSON'))
+
+    restaurant = next((item.get('restaurant') for item in items if item.get('restaurant')), None)
+
+    order = {
+        'order_id': order_id,
+        'telegram_user_id': _to_int(row.get('Telegram_User_ID')),
+        'created_at': parse_order_time(row.get('Час_Замовлення')) or datetime.now(),
+        'total': safe_parse_price(row.get('Загальна_Сума')),
+        'delivery_cost': safe_parse_price(row.get('Вартість_доставки')),
+        'discount': safe_parse_price(row.get('Застосована_знижка')),
+        'address': row.get('Адреса') or None,
+        'phone': str(row.get('Телефон') or '') or None,
+        'payment_method': row.get('Спосіб_Оплати') or None,
+        'status': row.get('Статус') or 'Новий',
+        'channel': row.get('Канал') or None,
+        'delivery_type': row.get('Тип_доставки') or None,
+        'note': row.get('Примітки') or None,
+        'promo_code': str(row.get('Промокод') or '').strip().upper() or None,
+        'restaurant': restaurant or row.get('ID_партнера') or None,
+    }
+
+    lines = [
+        {
+            'order_id': order_id,
+            'item_id': str(item.get('id', '')) or None,
+            'name': str(item.get('name', ''))[:255],
+            'price': safe_parse_price(item.get('price')),
+            'quantity': _to_int(item.get('quantity', 1), 1),
+            'restaurant': item.get('restaurant') or None,
+        }
+        for item in items
+    ]
+
+    return order, lines
+
+
+def sheet_row_from_order(order: 'Order') -> Dict[str, Any]:
+    """Order (з рядками) → формат рядка аркуша "Замовлення" """
+    items = [
+        {
+            'id': line.item_id,
+            'name': line.name,
+            'price': float(line.price),
+            'quantity': line.quantity,
+            'restaurant': line.restaurant or ''
+        }
+        for line in order.lines
+    ]
+
+    return {
+        'ID_Замовлення': order.order_id,
+        'Telegram_User_ID': order.telegram_user_id,
+        'Час_Замовлення': order.created_at.strftime(ORDER_TIME_FORMAT),
+        'Товари_JSON': json.dumps(items, ensure_ascii=False),
+        'Загальна_Сума': float(order.total),
+        'Адреса': order.address or '',
+        'Телефон': order.phone or '',
+        'Спосіб_Оплати': order.payment_method or 'cash',
+        'Статус': order.status,
+        'Канал': order.channel or '',
+        'Вартість_доставки': float(order.delivery_cost),
+        'Тип_доставки': order.delivery_type or 'delivery',
+        'Примітки': order.note or '',
+        'Промокод': order.promo_code or '',
+        'Застосована_знижка': float(order.discount),
+    }
+
+
+def build_order_row(
+    telegram_user_id: int,
+    items: List[Dict[str, Any]],
+    total: float,
+    address: str = '',
+    phone: str = '',
+    payment_method: str = 'cash',
+    channel: str = 'Mini App',
+    delivery_cost: float = 0,
+    delivery_type: str = 'delivery',
+    note: str = '',
+    promo_code: str = '',
+) -> Dict[str, Any]:
+    """Нове замовлення (Mini App або бот) → рядок аркуша для save_order"""
+    now = datetime.now()
+    return {
+        'ID_Замовлення': f"ORD_{now.strftime('%Y%m%d_%H%M%S')}_{telegram_user_id}",
+        'Telegram_User_ID': telegram_user_id,
+        'Час_Замовлення': now.strftime(ORDER_TIME_FORMAT),
+        'Товари_JSON': json.dumps(items, ensure_ascii=False, default=str),
+        'Загальна_Сума': total,
+        'Адреса': address,
+        'Телефон': normalize_phone(phone) or phone,
+        'Спосіб_Оплати': payment_method,
+        'Статус': 'Новий',
+        'Канал': channel,
+        'Вартість_доставки': delivery_cost,
+        'Тип_доставки': delivery_type,
+        'Примітки': note,
+        'Промокод': promo_code,
+    }
+
+
+def _parse_date(value: Any) -> Optional[date]:
+    parsed = parse_order_time(value)
+    return parsed.date() if parsed else None
+
+
+# ============================================================================
+# REPOSITORY
+# ============================================================================
+
+class OrderRepository:
+    """
+    Доступ до замовлень, агрегатів користувачів, промокодів та кешу меню
+
+    - Історія замовлень: індекс (telegram_user_id, created_at)
+    - Агрегати (кількість, сума, дати) - рядок users, оновлюється в тій
+      самій транзакції, що й замовлення -> читання по первинному ключу
+    - Промокоди синхронізуються з аркуша раз на PROMO_SYNC_SECONDS,
+      використання рахується атомарним UPDATE
+    """
+
+    def __init__(self):
+        self._enabled: Optional[bool] = None
+        self._lock = threading.Lock()
+        self._promo_synced_at = 0.0
+
+    # ========================================================================
+    # ІНІЦІАЛІЗАЦІЯ
+    # ========================================================================
+
+    @property
+    def enabled(self) -> bool:
+        """Чи працює PostgreSQL (перевіряється один раз, ліниво)"""
+        if self._enabled is None:
+            with self._lock:
+                if self._enabled is None:
+                    self._enabled = self._init()
+        return self._enabled
+
+    def init(self) -> bool:
+        """
+        Ініціалізувати заздалегідь (на старті, через asyncio.to_thread):
+        init_db з connect timeout не має виконуватись в event loop
+        під час першого запиту
+        """
+        return self.enabled
+
+    def _init(self) -> bool:
+        if not DATABASE_AVAILABLE:
+            logger.info("📊 Orders stored in Google Sheets (SQLAlchemy not installed)")
+            return False
+
+        if not DATABASE_CONFIGURED:
+            logger.info("📊 Orders stored in Google Sheets (DATABASE_URL not set)")
+            return False
+
+        if not init_db():
+            logger.warning("⚠️ PostgreSQL unavailable - orders stored in Google Sheets")
+            return False
+
+        logger.info("✅ PostgreSQL is the primary order store")
+        return True
+
+    # ========================================================================
+    # ЗАМОВЛЕННЯ
+    # ========================================================================
+
+    def save_order(self, order_row: Dict[str, Any]) -> bool:
+        """
+        Зберегти замовлення (формат рядка аркуша, як у SheetsService.save_order)
+
+        З БД: запис в orders/order_lines/users однією транзакцією,
+        в Google Sheets - через дзеркало у фоні.
+        """
+        from app.services.upsell_engine import upsell_engine
+
+        if not self.enabled:
+            saved = sheets_service.save_order(order_row)
+            if saved:
+                upsell_engine.record_cart(parse_order_items(order_row.get('Товари_JSON')))
+            return saved
+
+        try:
+            inserted = self.bulk_insert_orders([order_row])
+        except Exception as e:
+            logger.error(f"❌ Error saving order {order_row.get('ID_Замовлення')}: {e}")
+            return False
+
+        from app.services.sheets_mirror import sheets_mirror
+        sheets_mirror.notify()
+        if inserted:  # Повтор того самого замовлення не рахується двічі
+            upsell_engine.record_cart(parse_order_items(order_row.get('Товари_JSON')))
+
+        logger.info(f"✅ Order {order_row.get('ID_Замовлення')} saved to PostgreSQL")
+        return True
+
+    def bulk_insert_orders(self, order_rows: Iterable[Dict[str, Any]], mirrored: bool = False) -> int:
+        """
+        Вставити пачку замовлень однією транзакцією (ідемпотентно по ID_Замовлення)
+
+        Args:
+            order_rows: Рядки у форматі аркуша "Замовлення"
+            mirrored: True якщо замовлення вже є в Sheets (бекфіл/міграція)
+
+        Returns:
+            Кількість нових замовлень (дублікати пропускаються)
+        """
+        orders: Dict[str, Dict[str, Any]] = {}
+        lines_by_order: Dict[str, List[Dict[str, Any]]] = {}
+
+        for row in order_rows:
+            order, lines = order_values_from_sheet_row(row)
+            if not order['order_id'] or order['order_id'] in orders:
+                continue
+            if mirrored:
+                order['mirrored_at'] = datetime.utcnow()
+            orders[order['order_id']] = order
+            lines_by_order[order['order_id']] = lines
+
+        if not orders:
+            return 0
+
+        with SessionLocal.begin() as db:
+            inserted = db.execute(
+                pg_insert(Order)
+                .values(list(orders.values()))
+                .on_conflict_do_nothing(index_elements=[Order.order_id])
+                .returning(Order.order_id)
+            ).scalars().all()
+
+            if not inserted:
+                return 0
+
+            lines = [line for order_id in inserted for line in lines_by_order[order_id]]
+            if lines:
+                db.execute(insert(OrderLine), lines)
+
+            self._apply_user_totals(db, [orders[order_id] for order_id in inserted])
+
+        metrics.inc('db_orders_inserted', len(inserted))
+        return len(inserted)
+
+    @staticmethod
+    def _apply_user_totals(db, orders: List[Dict[str, Any]]):
+        """Додати нові замовлення до агрегатів users (upsert)"""
+        totals: Dict[int, Dict[str, Any]] = {}
+        for order in orders:
+            user = totals.get(order['telegram_user_id'])
+            if user is None:
+                user = totals[order['telegram_user_id']] = {
+                    'telegram_user_id': order['telegram_user_id'],
+                    'order_count': 0,
+                    'total_spent': 0.0,
+                    'first_order_at': order['created_at'],
+                    'last_order_at': order['created_at'],
+                    'phone': None,
+                    'address': None,
+                }
+            user['order_count'] += 1
+            user['total_spent'] += order['total']
+            user['first_order_at'] = min(user['first_order_at'], order['created_at'])
+            if order['created_at'] >= user['last_order_at']:
+                user['last_order_at'] = order['created_at']
+                user['phone'] = order['phone'] or user['phone']
+                user['address'] = order['address'] or user['address']
+
+        stmt = pg_insert(User).values(list(totals.values()))
+        excluded = stmt.excluded
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[User.telegram_user_id],
+            set_={
+                'order_count': User.order_count + excluded.order_count,
+                'total_spent': User.total_spent + excluded.total_spent,
+                # LEAST/GREATEST в PostgreSQL ігнорують NULL
+                'first_order_at': func.least(User.first_order_at, excluded.first_order_at),
+                'last_order_at': func.greatest(User.last_order_at, excluded.last_order_at),
+                'phone': func.coalesce(excluded.phone, User.phone),
+                'address': func.coalesce(excluded.address, User.address),
+            }
+        ))
+
+    def get_user_orders(self, telegram_user_id: int, limit: int = 10) -> List[Dict]:
+        """Останні замовлення користувача (формат рядка аркуша)"""
+        if not self.enabled:
+            return sheets_service.get_user_orders(telegram_user_id, limit=limit)
+
+        try:
+            with SessionLocal() as db:
+                orders = db.execute(
+                    select(Order)
+                    .where(Order.telegram_user_id == telegram_user_id)
+                    .order_by(Order.created_at.desc())
+                    .limit(limit)
+                ).scalars().all()
+                return [sheet_row_from_order(order) for order in orders]
+
+        except Exception as e:
+            logger.error(f"❌ Error loading user orders from DB: {e}")
+            return []
+
+    def get_user_order_summary(self, telegram_user_id: int) -> Optional[Dict]:
+        """
+        Агрегати замовлень користувача (для відновлення сесії/статистики)
+
+        Returns:
+            {'order_count', 'total_spent', 'last_order_date', 'first_order_date'} або None
+        """
+        if not self.enabled:
+            return sheets_service.get_user_order_summary(telegram_user_id)
+
+        try:
+            with SessionLocal() as db:
+                user = db.get(User, telegram_user_id)
+
+            if not user or not user.order_count:
+                return None
+
+            return {
+                'order_count': user.order_count,
+                'total_spent': round(float(user.total_spent), 2),
+                'last_order_date': user.last_order_at.strftime(ORDER_TIME_FORMAT) if user.last_order_at else None,
+                'first_order_date': user.first_order_at.strftime(ORDER_TIME_FORMAT) if user.first_order_at else None
+            }
+
+        except Exception as e:
+            logger.error(f"❌ Error loading order summary from DB: {e}")
+            return None
+
+    def backfill_from_sheets(self, page_size: int = BACKFILL_PAGE_SIZE, start_row: int = 2) -> Dict[str, Any]:
+        """
+        Перенести історичні замовлення з аркуша "Замовлення" в БД
+
+        Аркуш читається сторінками, кожна сторінка - один bulk insert.
+        Ідемпотентно по ID_Замовлення: повторний запуск додає тільки нові
+        рядки, тому його можна запускати інкрементально з start_row=next_row.
+
+        Returns:
+            {'pages', 'rows', 'inserted', 'seconds', 'rows_per_second', 'next_row'}
+        """
+        if not self.enabled:
+            raise RuntimeError("PostgreSQL is not configured - nothing to backfill into")
+
+        stats = {'pages': 0, 'rows': 0, 'inserted': 0, 'next_row': start_row}
+        start = time.monotonic()
+
+        for first_row, records in sheets_service.iter_order_pages(page_size, start_row):
+            # Рядки вже є в аркуші - не віддзеркалювати повторно
+            stats['inserted'] += self.bulk_insert_orders(records, mirrored=True)
+            stats['pages'] += 1
+            stats['rows'] += len(records)
+            # Остання (можливо неповна) сторінка - звідси наступний запуск
+            stats['next_row'] = first_row
+            logger.info(
+                f"📥 Backfill page {stats['pages']} (from row {first_row}): "
+                f"{len(records)} rows, {stats['inserted']} new so far"
+            )
+
+        stats['seconds'] = round(time.monotonic() - start, 2)
+        stats['rows_per_second'] = round(stats['rows'] / max(stats['seconds'], 1e-6), 1)
+
+        logger.info(
+            f"✅ Backfill done: {stats['rows']} rows, {stats['inserted']} new orders "
+            f"in {stats['seconds']}s ({stats['rows_per_second']} rows/s)"
+        )
+        return stats
+
+    # ========================================================================
+    # ДЗЕРКАЛО В SHEETS
+    # ========================================================================
+
+    def mirror_pending(self, write: Callable[[List[Dict]], bool], limit: int = 50) -> Optional[int]:
+        """
+        Віддзеркалити пачку найстаріших замовлень, яких ще немає в Sheets
+
+        Рядки захоплюються SELECT ... FOR UPDATE SKIP LOCKED в тій самій
+        транзакції, що ставить mirrored_at: кілька воркерів (у кожного свій
+        потік дзеркала) ніколи не запишуть одне замовлення двічі.
+
+        Args:
+            write: Запис рядків формату аркуша (True - успіх)
+            limit: Розмір пачки
+
+        Returns:
+            Кількість віддзеркалених; None - write не вдався (рядки лишаються в черзі)
+        """
+        with SessionLocal.begin() as db:
+            orders = db.execute(
+                select(Order)
+                .where(Order.mirrored_at.is_(None))
+                .order_by(Order.created_at)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            ).scalars().all()
+            if not orders:
+                return 0
+
+            if not write([sheet_row_from_order(order) for order in orders]):
+                return None  # Нічого не змінено - commit просто знімає блокування
+
+            mirrored_at = datetime.utcnow()
+            for order in orders:
+                order.mirrored_at = mirrored_at
+            return len(orders)
+
+    def count_unmirrored(self) -> int:
+        with SessionLocal() as db:
+            return db.execute(
+                select(func.count()).select_from(Order).where(Order.mirrored_at.is_(None))
+            ).scalar_one()
+
+    # ========================================================================
+    # ІСТОРІЯ ДЛЯ РЕКОМЕНДАЦІЙ
+    # ========================================================================
+
+    def iter_order_item_sets(self, limit: int = 20000) -> Iterable[List[str]]:
+        """
+        id товарів кожного з останніх `limit` замовлень (для upsell_engine)
+
+        Без БД - нічого: читати весь аркуш на старті занадто дорого.
+        """
+        if not self.enabled:
+            return
+
+        with SessionLocal() as db:
+            recent = (
+                select(Order.order_id)
+                .order_by(Order.created_at.desc())
+                .limit(limit)
+                .subquery()
+            )
+            rows = db.execute(
+                select(OrderLine.order_id, OrderLine.item_id)
+                .where(OrderLine.order_id.in_(select(recent.c.order_id)))
+                .where(OrderLine.item_id.is_not(None))
+                .order_by(OrderLine.order_id)
+                .execution_options(yield_per=5000)
+            )
+
+            current_order, item_ids = None, []
+            for order_id, item_id in rows:
+                if order_id != current_order:
+                    if item_ids:
+                        yield item_ids
+                    current_order, item_ids = order_id, []
+                item_ids.append(item_id)
+            if item_ids:
+                yield item_ids
+
+    # ========================================================================
+    # ПРОМОКОДИ
+    # ========================================================================
+
+    def _sync_promo_codes(self, force: bool = False):
+        """Підтягнути промокоди з аркуша (джерело правди для операторів)"""
+        if not force and time.monotonic() - self._promo_synced_at < PROMO_SYNC_SECONDS:
+            return
+        self._promo_synced_at = time.monotonic()
+
+        rows = []
+        for promo in sheets_service.get_promo_codes():
+            code = str(promo.get('Код', '')).strip().upper()
+            if not code:
+                continue
+            rows.append({
+                'code': code,
+                'partner_id': promo.get('ID_партнера') or None,
+                'discount_pct': safe_parse_price(promo.get('Знижка_%')),
+                'usage_limit': _to_int(promo.get('Ліміт_використань'), 999),
+                'used': _to_int(promo.get('Використано')),
+                'valid_until': _parse_date(promo.get('Дійсний_до')),
+                'status': promo.get('Статус') or 'Активний',
+                'created_by': promo.get('Створив') or None,
+                'synced_at': datetime.utcnow(),
+            })
+
+        if not rows:
+            return
+
+        try:
+            with SessionLocal.begin() as db:
+                stmt = pg_insert(PromoCode).values(rows)
+                excluded = stmt.excluded
+                db.execute(stmt.on_conflict_do_update(
+                    index_elements=[PromoCode.code],
+                    set_={
+                        'partner_id': excluded.partner_id,
+                        'discount_pct': excluded.discount_pct,
+                        'usage_limit': excluded.usage_limit,
+                        # Використання рахується в БД - аркуш може відставати
+                        'used': func.greatest(PromoCode.used, excluded.used),
+                        'valid_until': excluded.valid_until,
+                        'status': excluded.status,
+                        'created_by': excluded.created_by,
+                        'synced_at': excluded.synced_at,
+                    }
+                ))
+            logger.info(f"✅ Synced {len(rows)} promo codes to DB")
+        except Exception as e:
+            logger.error(f"❌ Promo codes sync failed: {e}")
+
+    def get_promo_code(self, code: str) -> Optional[Dict]:
+        """Промокод за кодом (формат рядка аркуша "Промокоди") або None"""
+        code = code.strip().upper()
+
+        if not self.enabled:
+            for promo in sheets_service.get_promo_codes():
+                if str(promo.get('Код', '')).upper() == code:
+                    return promo
+            return None
+
+        self._sync_promo_codes()
+
+        with SessionLocal() as db:
+            promo = db.get(PromoCode, code)
+
+        if promo is None:
+            return None
+
+        return {
+            'Код': promo.code,
+            'ID_партнера': promo.partner_id or '',
+            'Знижка_%': promo.discount_pct,
+            'Ліміт_використань': promo.usage_limit,
+            'Використано': promo.used,
+            'Дійсний_до': promo.valid_until.isoformat() if promo.valid_until else '',
+            'Статус': promo.status,
+            'Створив': promo.created_by or ''
+        }
+
+    def increment_promo_usage(self, code: str) -> bool:
+        """Атомарно збільшити лічильник використання (False якщо ліміт вичерпано)"""
+        if not self.enabled:
+            return sheets_service.increment_promo_usage(code)
+
+        with SessionLocal.begin() as db:
+            used = db.execute(
+                update(PromoCode)
+                .where(PromoCode.code == code.strip().upper(), PromoCode.used < PromoCode.usage_limit)
+                .values(used=PromoCode.used + 1)
+                .returning(PromoCode.used)
+            ).scalar_one_or_none()
+
+        return used is not None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика для /api/v1/metrics"""
+        if not self.enabled:
+            return {'backend': 'sheets'}
+        try:
+            return {'backend': 'postgresql', 'unmirrored_orders': self.count_unmirrored()}
+        except Exception as e:
+            return {'backend': 'postgresql', 'error': str(e)}
+
+
+# ============================================================================
+# ГЛОБАЛЬНИЙ INSTANCE
+# ============================================================================
+
+order_repository = OrderRepository()
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python -m app.services.order_repository backfill [start_row]
+    if len(sys.argv) > 1 and sys.argv[1] == "backfill":
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+        result = order_repository.backfill_from_sheets(
+            start_row=int(sys.argv[2]) if len(sys.argv) > 2 else 2
+        )
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print("Usage: python -m app.services.order_repository backfill [start_row]")
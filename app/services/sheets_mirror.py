@@ -0,0 +1,111 @@
+"""
+🪞 SHEETS MIRROR - Одностороння синхронізація замовлень PostgreSQL → Google Sheets
+Оператори й далі працюють з аркушем "Замовлення", а бот пише тільки в БД
+
+- Черга - це самі замовлення з mirrored_at IS NULL (переживає рестарт)
+- Пачки до MIRROR_BATCH_SIZE рядків одним append_rows (економія квоти)
+- Потік є в кожному воркері: пачка захоплюється FOR UPDATE SKIP LOCKED,
+  тому одне замовлення потрапляє в аркуш один раз
+- Якщо Sheets недоступний - повтор через MIRROR_INTERVAL
+"""
+
+import os
+import threading
+import logging
+from typing import Any, Dict, Optional
+
+from app.services.sheets_service import sheets_service
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+MIRROR_INTERVAL = float(os.getenv('SHEETS_MIRROR_INTERVAL', '30'))
+MIRROR_BATCH_SIZE = int(os.getenv('SHEETS_MIRROR_BATCH_SIZE', '50'))
+
+
+class SheetsOrderMirror:
+    """Фоновий потік, що дописує нові замовлення з БД в аркуш"""
+
+    def __init__(self, interval: float = MIRROR_INTERVAL, batch_size: int = MIRROR_BATCH_SIZE):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.mirrored = 0
+        self.failures = 0
+
+    def notify(self):
+        """Нове замовлення - віддзеркалити, не чекаючи інтервалу"""
+        self._wakeup.set()
+
+    def run_once(self) -> int:
+        """
+        Віддзеркалити всі замовлення, що очікують
+
+        Returns:
+            Кількість записаних в Sheets замовлень
+        """
+        from app.services.order_repository import order_repository
+
+        written = 0
+        while True:
+            # Пачка захоплюється в транзакції (SKIP LOCKED) - безпечно з кількох воркерів
+            count = order_repository.mirror_pending(sheets_service.append_orders, self.batch_size)
+            if count is None:
+                self.failures += 1
+                metrics.inc('sheets_mirror_failures')
+                break
+
+            written += count
+            if count < self.batch_size:
+                break
+
+        if written:
+            self.mirrored += written
+            metrics.inc('sheets_mirror_orders', written)
+            logger.info(f"🪞 Mirrored {written} orders to Sheets")
+
+        return written
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"❌ Sheets mirror error: {e}")
+
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+    def start(self):
+        """Запустити фоновий потік (один на процес)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="sheets-mirror", daemon=True)
+        self._thread.start()
+        logger.info(f"🪞 Sheets order mirror started (every {self.interval:.0f}s)")
+
+    def stop(self):
+        """Зупинити потік (при зупинці додатку)"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'running': bool(self._thread and self._thread.is_alive()),
+            'mirrored': self.mirrored,
+            'failures': self.failures
+        }
+
+
+# ============================================================================
+# ГЛОБАЛЬНИЙ INSTANCE
+# ============================================================================
+
+sheets_mirror = SheetsOrderMirror()
@@ -4,10 +4,21 @@
 import os
 import json
 import logging
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional, Tuple
 import gspread
+from gspread.utils import numericise_all, rowcol_to_a1
 from oauth2client.service_account import ServiceAccountCredentials
 
+from app.utils.quota_governor import (
+    sheets_quota,
+    is_rate_limit_error,
+    QuotaExceededError,
+    PRIORITY_WRITE,
+    PRIORITY_READ,
+    PRIORITY_LOW
+)
+from app.utils.circuit_breaker import sheets_breaker, CircuitOpenError
+
 logger = logging.getLogger(__name__)
 
 # ============================================================================
@@ -29,6 +40,8 @@ class SheetsService:
     
     def __init__(self):
         self.spreadsheet = None
+        self._worksheets = {}  # Кеш worksheet handles (кожен lookup - API виклик)
+        self._snapshots: Dict[str, List[Dict]] = {}  # Останні успішні get_all_records по аркушах
         self._connect()
     
     def _connect(self):
@@ -63,17 +76,89 @@ class SheetsService:
             logger.error(f"❌ Failed to connect to Google Sheets: {e}")
             self.spreadsheet = None
     
-    def _get_worksheet(self, name: str):
+    def _execute(self, priority: int, func, *args, **kwargs):
+        """
+        Виконати виклик Sheets API через circuit breaker та quota governor
+        
+        Args:
+            priority: PRIORITY_WRITE / PRIORITY_READ / PRIORITY_LOW
+            func: Метод gspread для виклику
+        
+        Raises:
+            CircuitOpenError: якщо Sheets деградований (миттєвий fail)
+            QuotaExceededError: якщо квота вичерпана і запит відкинуто
+        """
+        def metered_call():
+            if not sheets_quota.acquire(priority):
+                raise QuotaExceededError(f"Sheets quota exhausted for {func.__name__}")
+            
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if is_rate_limit_error(e):
+                    sheets_quota.penalize()
+                raise
+        
+        return sheets_breaker.call(metered_call)
+    
+    def _load_records(self, name: str, priority: int = PRIORITY_LOW) -> Optional[List[Dict]]:
+        """
+        Завантажити всі записи аркуша з fallback на останній snapshot
+        
+        Args:
+            name: Назва аркуша
+            priority: Пріоритет виклику для quota governor
+        
+        Returns:
+            Записи, snapshot (якщо Sheets недоступний) або None
+        """
+        sheet = self._get_worksheet(name, priority)
+        
+        if sheet:
+            try:
+                data = self._execute(priority, sheet.get_all_records)
+                self._snapshots[name] = data
+                return data
+            
+            except (QuotaExceededError, CircuitOpenError) as e:
+                logger.warning(f"🚦 '{name}' refresh skipped: {e}")
+            
+            except Exception as e:
+                logger.error(f"❌ Error loading '{name}': {e}")
+        
+        if name in self._snapshots:
+            logger.warning(f"⚠️ Serving last '{name}' snapshot")
+            return self._snapshots[name]
+        
+        return None
+    
+    def _get_worksheet(self, name: str, priority: int = PRIORITY_READ):
         """Отримати worksheet по імені"""
         if not self.spreadsheet:
             return None
         
+        if name in self._worksheets:
+            return self._worksheets[name]
+        
         try:
-            return self.spreadsheet.worksheet(name)
+            worksheet = self._execute(priority, self.spreadsheet.worksheet, name)
+            self._worksheets[name] = worksheet
+            return worksheet
+        except (QuotaExceededError, CircuitOpenError) as e:
+            logger.warning(f"🚦 Worksheet '{name}' lookup skipped: {e}")
+            return None
         except Exception as e:
             logger.error(f"❌ Worksheet '{name}' not found: {e}")
             return None
     
+    def get_quota_stats(self) -> Dict:
+        """Статистика квоти Sheets API"""
+        return sheets_quota.get_stats()
+    
+    def get_breaker_stats(self) -> Dict:
+        """Статистика circuit breaker Sheets API"""
+        return sheets_breaker.get_stats()
+    
     # ========================================================================
     # МЕНЮ
     # ========================================================================
@@ -100,21 +185,15 @@ class SheetsService:
                 'Mood_Tags': 'calm,romantic,movie'
             }
         """
-        sheet = self._get_worksheet("Меню")
+        data = self._load_records("Меню")
         
-        if not sheet:
+        if data is None:
             # Mock data для розробки
             logger.warning("⚠️ Using mock menu data")
             return self._get_mock_menu()
         
-        try:
-            data = sheet.get_all_records()
-            logger.info(f"✅ Loaded {len(data)} menu items from Sheets")
-            return data
-            
-        except Exception as e:
-            logger.error(f"❌ Error loading menu: {e}")
-            return self._get_mock_menu()
+        logger.info(f"✅ Loaded {len(data)} menu items from Sheets")
+        return data
     
     def _get_mock_menu(self) -> List[Dict]:
         """Mock дані для тестування (якщо Sheets недоступний)"""
@@ -220,20 +299,14 @@ class SheetsService:
                 'Рейтинг': '4.8'
             }
         """
-        sheet = self._get_worksheet("Партнери")
+        data = self._load_records("Партнери")
         
-        if not sheet:
+        if data is None:
             logger.warning("⚠️ Using mock partners data")
             return self._get_mock_partners()
         
-        try:
-            data = sheet.get_all_records()
-            logger.info(f"✅ Loaded {len(data)} partners from Sheets")
-            return data
-            
-        except Exception as e:
-            logger.error(f"❌ Error loading partners: {e}")
-            return self._get_mock_partners()
+        logger.info(f"✅ Loaded {len(data)} partners from Sheets")
+        return data
     
     def _get_mock_partners(self) -> List[Dict]:
         """Mock дані партнерів"""
@@ -296,7 +369,7 @@ class SheetsService:
         Returns:
             True якщо успішно, False якщо помилка
         """
-        sheet = self._get_worksheet("Замовлення")
+        sheet = self._get_worksheet("Замовлення", PRIORITY_WRITE)
         
         if not sheet:
             logger.warning("⚠️ Sheets not available - order not saved (would save in production)")
@@ -304,35 +377,8 @@ class SheetsService:
             return True  # Для розробки вважаємо успішним
         
         try:
-            # Підготувати рядок для додавання
-            row = [
-                order_data.get('ID_Замовлення', ''),
-                order_data.get('Telegram_User_ID', ''),
-                order_data.get('Час_Замовлення', ''),
-                order_data.get('Товари_JSON', ''),
-                order_data.get('Загальна_Сума', 0),
-                order_data.get('Адреса', ''),
-                order_data.get('Телефон', ''),
-                order_data.get('Спосіб_Оплати', 'cash'),
-                order_data.get('Статус', 'Новий'),
-                order_data.get('Канал', 'Telegram Bot'),
-                order_data.get('Вартість_доставки', 0),
-                order_data.get('Тип_доставки', 'delivery'),
-                order_data.get('Час_доставки', ''),
-                order_data.get('Оператор', ''),
-                order_data.get('Примітки', ''),
-                order_data.get('ID_партнера', ''),
-                order_data.get('Сума_комісії', 0),
-                order_data.get('Сплачена_комісія', 'Ні'),
-                order_data.get('Статус_оплати', 'Очікується'),
-                order_data.get('Дохід_платформи', 0),
-                order_data.get('Промокод', ''),
-                order_data.get('Застосована_знижка', 0),
-                order_data.get('Статус_повернення', '')
-            ]
-            
             # Додати рядок в таблицю
-            sheet.append_row(row)
+            self._execute(PRIORITY_WRITE, sheet.append_row, self._order_to_row(order_data))
             
             logger.info(f"✅ Order {order_data['ID_Замовлення']} saved to Sheets")
             return True
@@ -341,6 +387,100 @@ class SheetsService:
             logger.error(f"❌ Error saving order: {e}")
             return False
     
+    def append_orders(self, orders: List[Dict]) -> bool:
+        """
+        Додати кілька замовлень одним викликом API (дзеркалювання з БД)
+        
+        Args:
+            orders: Замовлення у форматі save_order
+        
+        Returns:
+            True тільки якщо рядки реально записані в Sheets
+        """
+        if not orders:
+            return True
+        
+        sheet = self._get_worksheet("Замовлення", PRIORITY_WRITE)
+        if not sheet:
+            return False
+        
+        try:
+            rows = [self._order_to_row(order) for order in orders]
+            self._execute(PRIORITY_WRITE, sheet.append_rows, rows)
+            logger.info(f"✅ {len(rows)} orders appended to Sheets")
+            return True
+        
+        except Exception as e:
+            logger.error(f"❌ Error appending orders: {e}")
+            return False
+    
+    def iter_order_pages(self, page_size: int = 500, start_row: int = 2) -> Iterator[Tuple[int, List[Dict]]]:
+        """
+        Читати аркуш "Замовлення" сторінками (діапазонами рядків)
+        
+        На відміну від get_all_records, в пам'яті лише одна сторінка,
+        а кожен виклик API - дешевий і з низьким пріоритетом квоти.
+        
+        Args:
+            page_size: Рядків на сторінку
+            start_row: Перший рядок даних (1 - заголовок)
+        
+        Yields:
+            (номер першого рядка сторінки, записи {заголовок: значення})
+        """
+        sheet = self._get_worksheet("Замовлення", PRIORITY_LOW)
+        if not sheet:
+            return
+        
+        header = self._execute(PRIORITY_LOW, sheet.row_values, 1)
+        last_column = rowcol_to_a1(1, len(header)).rstrip('0123456789')
+        
+        row = max(start_row, 2)
+        while True:
+            end = row + page_size - 1
+            values = self._execute(PRIORITY_LOW, sheet.get, f"A{row}:{last_column}{end}")
+            
+            records = [
+                dict(zip(header, numericise_all(list(values_row) + [''] * (len(header) - len(values_row)))))
+                for values_row in values
+                if any(values_row)
+            ]
+            if records:
+                yield row, records
+            
+            if len(values) < page_size:
+                break
+            row = end + 1
+    
+    @staticmethod
+    def _order_to_row(order_data: Dict) -> List:
+        """Замовлення → рядок аркуша "Замовлення" (порядок колонок)"""
+        return [
+            order_data.get('ID_Замовлення', ''),
+            order_data.get('Telegram_User_ID', ''),
+            order_data.get('Час_Замовлення', ''),
+            order_data.get('Товари_JSON', ''),
+            order_data.get('Загальна_Сума', 0),
+            order_data.get('Адреса', ''),
+            order_data.get('Телефон', ''),
+            order_data.get('Спосіб_Оплати', 'cash'),
+            order_data.get('Статус', 'Новий'),
+            order_data.get('Канал', 'Telegram Bot'),
+            order_data.get('Вартість_доставки', 0),
+            order_data.get('Тип_доставки', 'delivery'),
+            order_data.get('Час_доставки', ''),
+            order_data.get('Оператор', ''),
+            order_data.get('Примітки', ''),
+            order_data.get('ID_партнера', ''),
+            order_data.get('Сума_комісії', 0),
+            order_data.get('Сплачена_комісія', 'Ні'),
+            order_data.get('Статус_оплати', 'Очікується'),
+            order_data.get('Дохід_платформи', 0),
+            order_data.get('Промокод', ''),
+            order_data.get('Застосована_знижка', 0),
+            order_data.get('Статус_повернення', '')
+        ]
+    
     def get_user_orders(self, telegram_user_id: int, limit: int = 10) -> List[Dict]:
         """
         Отримати замовлення користувача
@@ -352,14 +492,14 @@ class SheetsService:
         Returns:
             List замовлень (останні спочатку)
         """
-        sheet = self._get_worksheet("Замовлення")
+        sheet = self._get_worksheet("Замовлення", PRIORITY_READ)
         
         if not sheet:
             logger.warning("⚠️ Using mock orders data")
             return []
         
         try:
-            all_orders = sheet.get_all_records()
+            all_orders = self._execute(PRIORITY_READ, sheet.get_all_records)
             
             # Фільтр по user_id
             user_orders = [
@@ -379,6 +519,33 @@ class SheetsService:
             logger.error(f"❌ Error loading user orders: {e}")
             return []
     
+    def get_user_order_summary(self, telegram_user_id: int) -> Optional[Dict]:
+        """
+        Агрегати замовлень користувача (для відновлення сесії/статистики)
+        
+        Returns:
+            {'order_count', 'total_spent', 'last_order_date', 'first_order_date'}
+            або None, якщо замовлень немає чи Sheets недоступний
+        """
+        orders = self.get_user_orders(telegram_user_id, limit=1000)
+        
+        if not orders:
+            return None
+        
+        total_spent = 0.0
+        for order in orders:
+            try:
+                total_spent += float(order.get('Загальна_Сума', 0) or 0)
+            except (TypeError, ValueError):
+                continue
+        
+        return {
+            'order_count': len(orders),
+            'total_spent': round(total_spent, 2),
+            'last_order_date': orders[0].get('Час_Замовлення') or None,
+            'first_order_date': orders[-1].get('Час_Замовлення') or None
+        }
+    
     # ========================================================================
     # ПРОМОКОДИ
     # ========================================================================
@@ -400,20 +567,14 @@ class SheetsService:
                 'Створив': 'admin'
             }
         """
-        sheet = self._get_worksheet("Промокоди")
+        data = self._load_records("Промокоди")
         
-        if not sheet:
+        if data is None:
             logger.warning("⚠️ Using mock promo codes")
             return self._get_mock_promos()
         
-        try:
-            data = sheet.get_all_records()
-            logger.info(f"✅ Loaded {len(data)} promo codes from Sheets")
-            return data
-            
-        except Exception as e:
-            logger.error(f"❌ Error loading promo codes: {e}")
-            return self._get_mock_promos()
+        logger.info(f"✅ Loaded {len(data)} promo codes from Sheets")
+        return data
     
     def _get_mock_promos(self) -> List[Dict]:
         """Mock промокоди"""
@@ -442,7 +603,7 @@ class SheetsService:
     
     def increment_promo_usage(self, promo_code: str) -> bool:
         """Збільшити лічильник використання промокоду"""
-        sheet = self._get_worksheet("Промокоди")
+        sheet = self._get_worksheet("Промокоди", PRIORITY_WRITE)
         
         if not sheet:
             logger.warning("⚠️ Cannot increment promo usage - Sheets not available")
@@ -450,18 +611,18 @@ class SheetsService:
         
         try:
             # Знайти рядок з промокодом
-            cell = sheet.find(promo_code)
+            cell = self._execute(PRIORITY_WRITE, sheet.find, promo_code)
             
             if not cell:
                 logger.warning(f"⚠️ Promo code {promo_code} not found")
                 return False
             
             # Отримати поточне значення Використано (колонка E)
-            current_value = sheet.cell(cell.row, 5).value
+            current_value = self._execute(PRIORITY_WRITE, sheet.cell, cell.row, 5).value
             new_value = int(current_value or 0) + 1
             
             # Оновити значення
-            sheet.update_cell(cell.row, 5, new_value)
+            self._execute(PRIORITY_WRITE, sheet.update_cell, cell.row, 5, new_value)
             
             logger.info(f"✅ Promo code {promo_code} usage incremented to {new_value}")
             return True
@@ -488,15 +649,13 @@ class SheetsService:
                 'DELIVERY_COST': '50'
             }
         """
-        sheet = self._get_worksheet("Конфіг")
+        data = self._load_records("Конфіг")
         
-        if not sheet:
+        if data is None:
             logger.warning("⚠️ Using mock config")
             return self._get_mock_config()
         
         try:
-            data = sheet.get_all_records()
-            
             # Конвертувати в dict
             config = {row['Ключ']: row['Значення'] for row in data}
             
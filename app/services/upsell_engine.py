@@ -0,0 +1,323 @@
+"""
+🛍️ UPSELL ENGINE - "До замовлення часто додають" за реальними замовленнями
+Розріджена матриця спільних покупок item × item, що вчиться з кожного замовлення
+
+- record_order: +1 кожній парі товарів замовлення (інкрементально)
+- suggest: сума нормалізованих (cosine) балів сусідів товарів кошика,
+  тільки доступні товари меню, яких ще немає в кошику
+- Стан у спільному JSON файлі: кожен воркер періодично додає до нього
+  свої інкременти (під file lock) і перечитує суму - воркери сходяться,
+  ніхто не перезаписує чужі лічильники; без файлу - початкове навчання
+  з order_lines у PostgreSQL (теж під lock, один раз на всі воркери)
+"""
+
+import os
+import json
+import math
+import time
+import heapq
+import threading
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.services.menu_store import menu_store
+from app.utils.metrics import metrics
+
+# Блокування файлу між воркерами (тільки POSIX)
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+UPSELL_STATE_PATH = os.getenv('UPSELL_STATE_PATH', 'data/upsell_cooccurrence.json')
+UPSELL_SAVE_INTERVAL = float(os.getenv('UPSELL_SAVE_INTERVAL', '300'))
+# Скільки останніх замовлень з БД взяти для початкового навчання
+UPSELL_BOOTSTRAP_ORDERS = int(os.getenv('UPSELL_BOOTSTRAP_ORDERS', '20000'))
+# Пара, що траплялась рідше, не рекомендується (шум)
+UPSELL_MIN_PAIR_COUNT = int(os.getenv('UPSELL_MIN_PAIR_COUNT', '2'))
+
+
+Pairs = Dict[str, Dict[str, int]]
+State = Tuple[int, Counter, Pairs]  # (замовлень, лічильники товарів, пари)
+
+
+def _add_order(items: Counter, pairs: Pairs, ids: List[str]):
+    items.update(ids)
+    for position, first in enumerate(ids):
+        for second in ids[position + 1:]:
+            row = pairs.setdefault(first, {})
+            row[second] = row.get(second, 0) + 1
+            row = pairs.setdefault(second, {})
+            row[first] = row.get(first, 0) + 1
+
+
+def _merge(into: State, other: State) -> State:
+    """Додати лічильники other до into (into змінюється)"""
+    orders, items, pairs = into
+    items.update(other[1])
+    for first, row in other[2].items():
+        target = pairs.setdefault(first, {})
+        for second, count in row.items():
+            target[second] = target.get(second, 0) + count
+    return orders + other[0], items, pairs
+
+
+def _empty_state() -> State:
+    return 0, Counter(), {}
+
+
+class CoOccurrenceUpsell:
+    """Лічильники товарів і пар товарів + фоновий потік збереження"""
+
+    def __init__(self, path: str = UPSELL_STATE_PATH, save_interval: float = UPSELL_SAVE_INTERVAL,
+                 store=menu_store):
+        self.path = path
+        self.save_interval = save_interval
+        self.store = store
+        self._lock = threading.Lock()
+        # Сума: файл (усі воркери) + власні інкременти; item → {сусід: спільних замовлень}
+        self._item_counts: Counter = Counter()
+        self._pairs: Pairs = {}
+        self.orders_seen = 0
+        # Інкременти цього воркера, яких ще немає у файлі
+        self._delta: State = _empty_state()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._top_rated: List[str] = []
+        self._top_rated_version = -1
+
+    # ========================================================================
+    # НАВЧАННЯ
+    # ========================================================================
+
+    def record_order(self, item_ids: Iterable[Any]):
+        """Врахувати замовлення (id товарів; кількість одиниць не важлива)"""
+        ids = sorted({str(item_id) for item_id in item_ids if item_id not in (None, '')})
+        if not ids:
+            return
+
+        with self._lock:
+            self.orders_seen += 1
+            _add_order(self._item_counts, self._pairs, ids)
+            _add_order(self._delta[1], self._delta[2], ids)
+            self._delta = (self._delta[0] + 1, self._delta[1], self._delta[2])
+
+        metrics.inc('upsell_orders_recorded')
+
+    def record_cart(self, items: Iterable[Dict[str, Any]]):
+        """Врахувати замовлення у форматі кошика / Товари_JSON"""
+        self.record_order(item.get('id') for item in items)
+
+    # ========================================================================
+    # РЕКОМЕНДАЦІЇ
+    # ========================================================================
+
+    def suggest(self, cart: List[Dict[str, Any]], limit: int = 2) -> List[Dict[str, Any]]:
+        """
+        Товари, які найчастіше замовляють разом із вмістом кошика
+
+        Args:
+            cart: Товари кошика (з 'id')
+            limit: Скільки пропозицій
+
+        Returns:
+            Товари меню (доступні, не з кошика); порожній кошик або
+            брак статистики - найпопулярніші, далі найкращі за рейтингом
+        """
+        cart_ids = {str(item.get('id')) for item in cart}
+        scores: Dict[str, float] = {}
+
+        # Під lock: рядки змінюються записом замовлень і синхронізацією
+        with self._lock:
+            for item_id in cart_ids:
+                row = self._pairs.get(item_id)
+                if not row:
+                    continue
+                base = self._item_counts[item_id]
+                for neighbour, together in row.items():
+                    if together < UPSELL_MIN_PAIR_COUNT or neighbour in cart_ids:
+                        continue
+                    # Cosine: не пропонувати просто найпопулярніше
+                    score = together / math.sqrt(base * self._item_counts[neighbour])
+                    scores[neighbour] = scores.get(neighbour, 0.0) + score
+            popular_ids = [item_id for item_id, _ in self._item_counts.most_common(limit * 5)]
+
+        suggestions = self._available(heapq.nlargest(limit * 3, scores, key=scores.get), limit)
+        if len(suggestions) < limit:
+            chosen = cart_ids | {item['id'] for item in suggestions}
+            popular = (item_id for item_id in popular_ids if item_id not in chosen)
+            suggestions += self._available(popular, limit - len(suggestions))
+        if len(suggestions) < limit:
+            # Історії ще немає (новий запуск) - найкращі за рейтингом
+            chosen = cart_ids | {item['id'] for item in suggestions}
+            top = (item_id for item_id in self._top_rated_ids() if item_id not in chosen)
+            suggestions += self._available(top, limit - len(suggestions))
+
+        metrics.inc('upsell_suggestions', source='cooccurrence' if scores else 'popular')
+        return suggestions
+
+    def _top_rated_ids(self) -> List[str]:
+        if self._top_rated_version != self.store.version:
+            items = [item for item in self.store.get_items() if item['price'] > 0]
+            items.sort(key=lambda item: float(item.get('rating') or 0), reverse=True)
+            self._top_rated = [item['id'] for item in items[:20]]
+            self._top_rated_version = self.store.version
+        return self._top_rated
+
+    def _available(self, item_ids: Iterable[str], limit: int) -> List[Dict[str, Any]]:
+        found = []
+        for item_id in item_ids:
+            item = self.store.get_item(item_id)
+            if item and item['active']:
+                found.append(item)
+                if len(found) == limit:
+                    break
+        return found
+
+    # ========================================================================
+    # ЗБЕРЕЖЕННЯ
+    # ========================================================================
+
+    @contextmanager
+    def _file_lock(self):
+        """Ексклюзивний lock спільного файлу між воркерами (flock)"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if not FCNTL_AVAILABLE:
+            yield
+            return
+        with open(self.path + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read(self) -> Optional[State]:
+        """Стан з файлу (None - файлу немає або він битий)"""
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"❌ Upsell state unreadable ({self.path}): {e}")
+            return None
+        return int(state.get('orders_seen', 0)), Counter(state.get('items', {})), state.get('pairs', {})
+
+    def _write(self, state: State):
+        """Записати стан (атомарно через os.replace)"""
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'orders_seen': state[0],
+                'items': state[1],
+                'pairs': state[2],
+                'saved_at': time.time()
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def _bootstrap_state(self) -> State:
+        """Навчання з історії order_lines (якщо PostgreSQL увімкнено)"""
+        from app.services.order_repository import order_repository
+
+        state = _empty_state()
+        learned = 0
+        for item_ids in order_repository.iter_order_item_sets(UPSELL_BOOTSTRAP_ORDERS):
+            ids = sorted({str(item_id) for item_id in item_ids})
+            _add_order(state[1], state[2], ids)
+            learned += 1
+        if learned:
+            logger.info(f"🛍️ Upsell bootstrapped from {learned} orders")
+        return learned, state[1], state[2]
+
+    def sync(self, bootstrap: bool = False) -> bool:
+        """
+        Додати свої інкременти до файлу і перечитати суму всіх воркерів
+
+        Args:
+            bootstrap: Файлу ще немає - навчитись з БД (під тим самим lock,
+                тому з кількох воркерів історія рахується один раз)
+
+        Returns:
+            True якщо файл записано
+        """
+        with self._file_lock():
+            disk = self._read()
+            written = disk is None and bootstrap
+            if disk is None:
+                disk = self._bootstrap_state() if bootstrap else _empty_state()
+
+            with self._lock:
+                delta, self._delta = self._delta, _empty_state()
+
+            try:
+                merged = _merge(disk, delta)
+                if delta[0] or (written and merged[0]):
+                    self._write(merged)
+                    written = True
+            except Exception:
+                with self._lock:
+                    self._delta = _merge(self._delta, delta)  # Повторити наступного разу
+                raise
+
+        with self._lock:
+            # Замовлення, записані під час синхронізації, ще не у файлі
+            self.orders_seen, self._item_counts, self._pairs = _merge(merged, self._delta)
+
+        if written:
+            logger.debug(f"🛍️ Upsell state synced: {self.orders_seen} orders")
+        return bool(written)
+
+    def _loop(self):
+        # Перша синхронізація у потоці - старт додатку не чекає на БД
+        try:
+            self.sync(bootstrap=True)
+        except Exception as e:
+            logger.warning(f"⚠️ Upsell bootstrap skipped: {e}")
+        while not self._stop.wait(self.save_interval):
+            try:
+                self.sync()
+            except Exception as e:
+                logger.error(f"❌ Upsell sync error: {e}")
+
+    def start(self):
+        """Завантажити стан і запустити періодичну синхронізацію"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="upsell-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Зупинити потік і зберегти останні зміни"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        try:
+            self.sync()
+        except Exception as e:
+            logger.error(f"❌ Upsell sync error: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'orders_seen': self.orders_seen,
+                'items': len(self._item_counts),
+                'pairs': sum(len(row) for row in self._pairs.values()) // 2,
+                'unsynced_orders': self._delta[0]
+            }
+
+
+# ============================================================================
+# ГЛОБАЛЬНИЙ INSTANCE
+# ============================================================================
+
+upsell_engine = CoOccurrenceUpsell()
@@ -3,9 +3,14 @@
 Скорочує повторні запити до API
 """
 
+import os
+import re
 import time
 import logging
-from typing import Any, Optional, Dict
+from collections import OrderedDict
+from typing import Any, Iterable, Optional, Dict, FrozenSet, Hashable, Tuple
+
+from app.utils.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -95,15 +100,177 @@ class SimpleCache:
         }
 
 
+# ============================================================================
+# СЕМАНТИЧНИЙ КЕШ AI ВІДПОВІДЕЙ
+# ============================================================================
+
+AI_CACHE_TTL = int(os.getenv('AI_CACHE_TTL', '1800'))
+AI_CACHE_MAX_ENTRIES = int(os.getenv('AI_CACHE_MAX_ENTRIES', '2000'))
+# Мінімальна схожість множин слів (Jaccard) для near-duplicate; 1.0 - тільки точний збіг
+AI_CACHE_SIMILARITY = float(os.getenv('AI_CACHE_SIMILARITY', '0.75'))
+# Скільки останніх записів контексту перевіряти на схожість
+AI_CACHE_SCAN_LIMIT = 200
+
+_NON_WORD_RE = re.compile(r"[^\w\s]+")
+_SPACES_RE = re.compile(r"\s+")
+
+# Слова, що змінюють зміст при майже тих самих словах: заперечення
+# ("не хочу") і числа ("2 коли"); near-duplicate - тільки якщо вони збігаються
+NEGATION_WORDS = frozenset({'не', 'ні', 'без', 'нє', 'нет', 'no', 'not', 'without'})
+
+
+def normalize_message(text: str) -> str:
+    """"Хочу  ПІЦУ!!" → "хочу піцу" (регістр, пунктуація, пробіли, апострофи)"""
+    text = (text or '').lower().replace('’', "'").replace('ʼ', "'").replace("'", '')
+    text = _NON_WORD_RE.sub(' ', text)
+    return _SPACES_RE.sub(' ', text).strip()
+
+
+def _guard_tokens(normalized: str) -> Tuple[str, ...]:
+    """Числа й заперечення у порядку появи (повтори важливі: "2 ... 2")"""
+    return tuple(word for word in normalized.split() if word.isdigit() or word in NEGATION_WORDS)
+
+
+def _jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class SemanticCache:
+    """
+    Кеш відповідей моделі з ключем (нормалізований текст, контекст)
+    
+    Контекст - все, від чого залежить відповідь крім тексту (підпис кошика,
+    версія меню...). Точний збіг - O(1); якщо його немає, серед останніх
+    записів того ж контексту шукається найближчий за множиною слів
+    (fuzzy=True, тільки якщо числа й заперечення збігаються). Для відповідей,
+    що змінюють кошик, викликач передає fuzzy=False.
+    
+    Зберігається сирий текст відповіді: викликач заново валідує його
+    відносно поточного меню, тому кеш не може повернути неіснуючий товар.
+    """
+    
+    def __init__(self, ttl: int = AI_CACHE_TTL, max_entries: int = AI_CACHE_MAX_ENTRIES,
+                 similarity: float = AI_CACHE_SIMILARITY, name: str = 'ai'):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self.name = name
+        # (context, normalized) → (value, tokens, guard, timestamp); порядок - LRU
+        self._entries: "OrderedDict[Tuple[Hashable, str], Tuple[Any, FrozenSet[str], Tuple[str, ...], float]]" = OrderedDict()
+        # context → ключі в порядку додавання (для near-duplicate пошуку)
+        self._by_context: Dict[Hashable, "OrderedDict[str, None]"] = {}
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+    
+    def _evict(self, key: Tuple[Hashable, str]):
+        self._entries.pop(key, None)
+        keys = self._by_context.get(key[0])
+        if keys is not None:
+            keys.pop(key[1], None)
+            if not keys:
+                del self._by_context[key[0]]
+    
+    def get(self, text: str, context: Hashable = None, fuzzy: bool = True) -> Optional[Any]:
+        """
+        Знайти відповідь для повідомлення в контексті
+        
+        Args:
+            fuzzy: Дозволити near-duplicate збіг (False - тільки точний)
+        
+        Returns:
+            Збережене значення (точний або близький збіг) або None
+        """
+        normalized = normalize_message(text)
+        now = time.time()
+        
+        entry = self._entries.get((context, normalized))
+        if entry is not None and now - entry[3] < self.ttl:
+            self._entries.move_to_end((context, normalized))
+            self.hits += 1
+            metrics.inc('semantic_cache_hits', cache=self.name, match='exact')
+            return entry[0]
+        
+        if fuzzy and self.similarity < 1.0:
+            tokens = frozenset(normalized.split())
+            guard = _guard_tokens(normalized)
+            best_key, best_score = None, self.similarity
+            for candidate in reversed(list(self._by_context.get(context, ()))[-AI_CACHE_SCAN_LIMIT:]):
+                value, candidate_tokens, candidate_guard, stored_at = self._entries[(context, candidate)]
+                if now - stored_at >= self.ttl or candidate_guard != guard:
+                    continue
+                score = _jaccard(tokens, candidate_tokens)
+                if score >= best_score:
+                    best_key, best_score = candidate, score
+            if best_key is not None:
+                self._entries.move_to_end((context, best_key))
+                self.similar_hits += 1
+                metrics.inc('semantic_cache_hits', cache=self.name, match='similar')
+                logger.debug(f"💾 Similar cache HIT: '{normalized}' ≈ '{best_key}' ({best_score:.2f})")
+                return self._entries[(context, best_key)][0]
+        
+        self.misses += 1
+        metrics.inc('semantic_cache_misses', cache=self.name)
+        return None
+    
+    def set(self, text: str, value: Any, context: Hashable = None):
+        """Зберегти відповідь для повідомлення в контексті"""
+        normalized = normalize_message(text)
+        if not normalized:
+            return
+        
+        key = (context, normalized)
+        self._evict(key)
+        self._entries[key] = (value, frozenset(normalized.split()), _guard_tokens(normalized), time.time())
+        self._by_context.setdefault(context, OrderedDict())[normalized] = None
+        
+        while len(self._entries) > self.max_entries:
+            self._evict(next(iter(self._entries)))
+    
+    def clear(self):
+        self._entries.clear()
+        self._by_context.clear()
+    
+    def get_stats(self) -> dict:
+        total = self.hits + self.similar_hits + self.misses
+        return {
+            'hits': self.hits,
+            'similar_hits': self.similar_hits,
+            'misses': self.misses,
+            'hit_rate': f"{((self.hits + self.similar_hits) / total * 100) if total else 0:.1f}%",
+            'cached_items': len(self._entries),
+            'contexts': len(self._by_context),
+            'ttl': self.ttl
+        }
+
+
+def cart_signature(cart: Optional[Iterable[Dict[str, Any]]]) -> Tuple:
+    """Кошик → незмінний підпис (порядок рядків не важливий)"""
+    return tuple(sorted(
+        (str(item.get('id') or item.get('name', '')), int(item.get('quantity', 1) or 1))
+        for item in cart or ()
+    ))
+
+
+def menu_signature(menu_items: Iterable[Dict[str, Any]]) -> int:
+    """Підпис знімка меню, який бачить модель (id + ціна + доступність)"""
+    return hash(tuple(
+        (str(item.get('id')), str(item.get('price')), bool(item.get('active', True)))
+        for item in menu_items
+    ))
+
+
 # ============================================================================
 # ГЛОБАЛЬНІ INSTANCES
 # ============================================================================
 
-# Кеш для AI відповідей (5 хвилин)
-ai_cache = SimpleCache(ttl=300)
+# Кеш AI відповідей: текст + кошик + меню (GeminiService)
+ai_cache = SemanticCache()
 
 # Кеш для меню (30 хвилин)
 menu_cache = SimpleCache(ttl=1800)
 
 # Кеш для користувацьких дані (10 хвилин)
-user_cache = SimpleCache(ttl=600
+user_cache = SimpleCache(ttl=600)
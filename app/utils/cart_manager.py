@@ -3,73 +3,310 @@ Cart Manager - Shopping cart management with Redis/Memory support
 FerrikBot v3.2
 """
 
-import os
-import json
+import threading
 import logging
-from typing import List, Dict, Optional
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional, Tuple, Any
+
+from app.utils.user_state_store import user_state, NS_CART
+from app.utils.redis_pool import redis_pool
+from app.utils.state_models import CartLine
+from app.services.menu_store import menu_store
 
 logger = logging.getLogger(__name__)
 
-# Try to import Redis
-try:
-    import redis
-    REDIS_AVAILABLE = True
-except ImportError:
-    REDIS_AVAILABLE = False
-    logger.warning("⚠️ Redis not available, using in-memory storage")
+# ============================================================================
+# Cart hash layout (user:cart:{user_id})
+# ============================================================================
+#   q:{item_id}  -> quantity (int)
+#   p:{item_id}  -> price snapshot in kopecks (int, set on first add)
+#   _count       -> total quantity of all lines
+#   _total       -> cart total in kopecks
+# Every mutation updates a line and the cached totals atomically.
+
+QTY_PREFIX = 'q:'
+PRICE_PREFIX = 'p:'
+COUNT_FIELD = '_count'
+TOTAL_FIELD = '_total'
+
+# KEYS[1] = cart key; ARGV = item_id, qty, price_kop, ttl
+# Returns the new line quantity
+_ADD_LINE_LUA = """
+local qty = tonumber(ARGV[2])
+local new_qty = redis.call('HINCRBY', KEYS[1], 'q:' .. ARGV[1], qty)
+redis.call('HSETNX', KEYS[1], 'p:' .. ARGV[1], ARGV[3])
+local price = tonumber(redis.call('HGET', KEYS[1], 'p:' .. ARGV[1]))
+redis.call('HINCRBY', KEYS[1], '_count', qty)
+redis.call('HINCRBY', KEYS[1], '_total', price * qty)
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return new_qty
+"""
+
+# KEYS[1] = cart key; ARGV = item_id, qty, ttl
+# Returns the new line quantity (0 = removed) or -1 if the line is absent
+_SET_LINE_LUA = """
+local q_field = 'q:' .. ARGV[1]
+local p_field = 'p:' .. ARGV[1]
+local old_qty = tonumber(redis.call('HGET', KEYS[1], q_field))
+if not old_qty then
+    return -1
+end
+local price = tonumber(redis.call('HGET', KEYS[1], p_field)) or 0
+local new_qty = math.max(tonumber(ARGV[2]), 0)
+if new_qty == 0 then
+    redis.call('HDEL', KEYS[1], q_field, p_field)
+else
+    redis.call('HSET', KEYS[1], q_field, new_qty)
+end
+local count = redis.call('HINCRBY', KEYS[1], '_count', new_qty - old_qty)
+redis.call('HINCRBY', KEYS[1], '_total', price * (new_qty - old_qty))
+if count <= 0 then
+    redis.call('DEL', KEYS[1])
+else
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+end
+return new_qty
+"""
+
+
+def _to_kop(price: float) -> int:
+    return int(round(price * 100))
+
+
+def _parse_item_id(raw: str) -> Any:
+    """Hash fields are strings - restore numeric IDs used by handlers"""
+    return int(raw) if raw.isdigit() else raw
+
+
+def _lines_from_hash(data: Dict[str, Any]) -> List[CartLine]:
+    """Build cart lines from hash fields (insertion order)"""
+    lines = []
+    for key, qty in data.items():
+        if not key.startswith(QTY_PREFIX):
+            continue
+        raw_id = key[len(QTY_PREFIX):]
+        price_kop = int(data.get(PRICE_PREFIX + raw_id) or 0)
+        lines.append(CartLine(_parse_item_id(raw_id), int(qty), price_kop / 100))
+    return lines
+
+
+# ============================================================================
+# Cart view (one load per render)
+# ============================================================================
+
+FREE_DELIVERY_THRESHOLD = 300
+DELIVERY_FEE = 50
+
+# Attribute on the per-update CallbackContext that holds memoized views
+_VIEW_MEMO_ATTR = '_cart_views'
+
+
+def calculate_delivery_fee(total: float) -> int:
+    """Delivery is free from FREE_DELIVERY_THRESHOLD, otherwise DELIVERY_FEE"""
+    return 0 if total >= FREE_DELIVERY_THRESHOLD else DELIVERY_FEE
+
+
+@dataclass(slots=True)
+class CartView:
+    """
+    Read-only snapshot of a cart for one screen
+    
+    Built from a single storage read: display items, count, total,
+    per-restaurant subtotals and delivery fee are computed in one pass.
+    """
+    items: List[Dict[str, Any]] = field(default_factory=list)
+    count: int = 0
+    total: float = 0.0
+    restaurant_totals: Dict[str, float] = field(default_factory=dict)
+    delivery_fee: int = 0
+    
+    @property
+    def is_empty(self) -> bool:
+        return not self.items
+    
+    @property
+    def restaurants(self) -> List[str]:
+        """Named restaurants in the cart (insertion order)"""
+        return [name for name in self.restaurant_totals if name]
+    
+    @property
+    def grand_total(self) -> float:
+        return round(self.total + self.delivery_fee, 2)
+    
+    @classmethod
+    def from_lines(cls, lines: List[CartLine]) -> 'CartView':
+        items = []
+        count = 0
+        total_kop = 0
+        restaurant_kop: Dict[str, int] = {}
+        
+        for line in lines:
+            item = line.to_display(menu_store.get_item(line.item_id))
+            subtotal_kop = _to_kop(line.price) * line.qty
+            
+            items.append(item)
+            count += line.qty
+            total_kop += subtotal_kop
+            restaurant_kop[item['restaurant']] = restaurant_kop.get(item['restaurant'], 0) + subtotal_kop
+        
+        total = round(total_kop / 100, 2)
+        return cls(
+            items=items,
+            count=count,
+            total=total,
+            restaurant_totals={name: round(kop / 100, 2) for name, kop in restaurant_kop.items()},
+            delivery_fee=calculate_delivery_fee(total) if items else 0
+        )
+    
+    def to_summary(self) -> Dict:
+        """Legacy get_cart_summary() format"""
+        return {
+            'items': self.items,
+            'count': self.count,
+            'total': self.total,
+            'is_empty': self.is_empty
+        }
+
+
+class _MemoryCartBackend:
+    """Cart operations over the in-memory store (atomic within one process)"""
+    
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+    
+    async def get_lines(self, user_id: int) -> List[CartLine]:
+        return _lines_from_hash(self.store.get_all(NS_CART, user_id))
+    
+    async def get_totals(self, user_id: int) -> Tuple[int, int]:
+        data = self.store.get_fields(NS_CART, user_id, COUNT_FIELD, TOTAL_FIELD)
+        return int(data.get(COUNT_FIELD, 0)), int(data.get(TOTAL_FIELD, 0))
+    
+    async def add(self, user_id: int, item_id: str, qty: int, price_kop: int) -> int:
+        with self._lock:
+            data = self.store.get_all(NS_CART, user_id)
+            new_qty = int(data.get(QTY_PREFIX + item_id, 0)) + qty
+            price_kop = int(data.get(PRICE_PREFIX + item_id, price_kop))
+            self.store.set_fields(NS_CART, user_id, {
+                QTY_PREFIX + item_id: new_qty,
+                PRICE_PREFIX + item_id: price_kop,
+                COUNT_FIELD: int(data.get(COUNT_FIELD, 0)) + qty,
+                TOTAL_FIELD: int(data.get(TOTAL_FIELD, 0)) + price_kop * qty,
+            })
+            return new_qty
+    
+    async def set_qty(self, user_id: int, item_id: str, qty: int) -> int:
+        with self._lock:
+            data = self.store.get_all(NS_CART, user_id)
+            if QTY_PREFIX + item_id not in data:
+                return -1
+            
+            old_qty = int(data[QTY_PREFIX + item_id])
+            price_kop = int(data.get(PRICE_PREFIX + item_id, 0))
+            new_qty = max(qty, 0)
+            count = int(data.get(COUNT_FIELD, 0)) + new_qty - old_qty
+            
+            if count <= 0:
+                self.store.delete(NS_CART, user_id)
+                return new_qty
+            
+            if new_qty == 0:
+                self.store.delete_fields(NS_CART, user_id, QTY_PREFIX + item_id, PRICE_PREFIX + item_id)
+                updates = {}
+            else:
+                updates = {QTY_PREFIX + item_id: new_qty}
+            updates[COUNT_FIELD] = count
+            updates[TOTAL_FIELD] = int(data.get(TOTAL_FIELD, 0)) + price_kop * (new_qty - old_qty)
+            self.store.set_fields(NS_CART, user_id, updates)
+            return new_qty
+    
+    async def clear(self, user_id: int) -> bool:
+        return self.store.delete(NS_CART, user_id)
+
+
+class _RedisCartBackend:
+    """Cart operations as Lua scripts - one round-trip, atomic across workers"""
+    
+    def __init__(self, store, redis_client):
+        self.store = store
+        self.redis_client = redis_client
+        self._add_line = self.redis_client.register_script(_ADD_LINE_LUA)
+        self._set_line = self.redis_client.register_script(_SET_LINE_LUA)
+    
+    def _key(self, user_id: int) -> str:
+        return self.store.make_key(NS_CART, user_id)
+    
+    def _ttl(self) -> int:
+        return self.store.ttl_for(NS_CART)
+    
+    async def get_lines(self, user_id: int) -> List[CartLine]:
+        return _lines_from_hash(await self.redis_client.hgetall(self._key(user_id)))
+    
+    async def get_totals(self, user_id: int) -> Tuple[int, int]:
+        count, total = await self.redis_client.hmget(self._key(user_id), [COUNT_FIELD, TOTAL_FIELD])
+        return int(count or 0), int(total or 0)
+    
+    async def add(self, user_id: int, item_id: str, qty: int, price_kop: int) -> int:
+        return int(await self._add_line(keys=[self._key(user_id)], args=[item_id, qty, price_kop, self._ttl()]))
+    
+    async def set_qty(self, user_id: int, item_id: str, qty: int) -> int:
+        return int(await self._set_line(keys=[self._key(user_id)], args=[item_id, qty, self._ttl()]))
+    
+    async def clear(self, user_id: int) -> bool:
+        await self.redis_client.delete(self._key(user_id))
+        return True
 
 
 class CartManager:
     """
     Manages shopping carts for users
-    Supports both Redis and in-memory storage
+    Stored in the shared user state store (Redis or in-memory),
+    so every worker sees the same cart.
+    
+    Each line is a pair of hash fields (quantity, price snapshot) and
+    mutations are atomic per line (HINCRBY / Lua in Redis), so concurrent
+    taps do not overwrite each other. Count and total are kept in the
+    hash, so they are read without loading the lines.
+    All methods are coroutines: Redis is accessed through the shared
+    async connection pool (app.utils.redis_pool).
+    Name, category and restaurant are joined from menu_store on display.
     """
     
-    def __init__(self):
-        """Initialize cart manager with Redis or memory storage"""
-        self.redis_url = os.environ.get('REDIS_URL')
+    def __init__(self, store=None):
+        """Initialize cart manager on top of the user state store"""
+        self.store = store or user_state
+        self.storage_type = self.store.backend
         
-        if self.redis_url and REDIS_AVAILABLE:
-            try:
-                self.redis_client = redis.from_url(
-                    self.redis_url,
-                    decode_responses=True,
-                    socket_connect_timeout=5,
-                    socket_timeout=5
-                )
-                # Test connection
-                self.redis_client.ping()
-                self.storage_type = 'redis'
-                logger.info("✅ Redis connected for cart storage")
-            except Exception as e:
-                logger.warning(f"⚠️ Redis connection failed: {e}, using in-memory")
-                self.redis_client = None
-                self.storage_type = 'memory'
-                self.carts = {}
+        # Async client from the shared pool - does not block the event loop
+        if self.storage_type == 'redis' and redis_pool.enabled:
+            self.backend = _RedisCartBackend(self.store, redis_pool.get_client())
         else:
-            self.redis_client = None
-            self.storage_type = 'memory'
-            self.carts = {}
-            if not REDIS_AVAILABLE:
-                logger.info("💾 Using in-memory cart storage (Redis not installed)")
-            else:
-                logger.info("💾 Using in-memory cart storage (REDIS_URL not set)")
+            self.backend = _MemoryCartBackend(self.store)
+        
+        # Bumped on every mutation - memoized views older than this are stale
+        self._generation = 0
+        
+        logger.info(f"🛒 Cart storage: {self.storage_type}")
     
-    def _get_key(self, user_id: int) -> str:
+    async def get_lines(self, user_id: int) -> List[CartLine]:
         """
-        Generate Redis key for user cart
+        Get user's cart as compact lines (item_id, qty, price)
         
         Args:
             user_id: Telegram user ID
             
         Returns:
-            str: Redis key
+            list: CartLine objects
         """
-        return f"cart:{user_id}"
+        try:
+            return await self.backend.get_lines(user_id)
+        except Exception as e:
+            logger.error(f"❌ Error getting cart for {user_id}: {e}")
+            return []
     
-    def get_cart(self, user_id: int) -> List[Dict]:
+    async def get_cart(self, user_id: int) -> List[Dict]:
         """
-        Get user's cart items
+        Get user's cart items (joined with menu_store for display)
         
         Args:
             user_id: Telegram user ID
@@ -77,54 +314,37 @@ class CartManager:
         Returns:
             list: Cart items as list of dicts
         """
-        try:
-            if self.storage_type == 'redis':
-                data = self.redis_client.get(self._get_key(user_id))
-                return json.loads(data) if data else []
-            else:
-                return self.carts.get(user_id, [])
-        except Exception as e:
-            logger.error(f"❌ Error getting cart for {user_id}: {e}")
-            return []
+        return [
+            line.to_display(menu_store.get_item(line.item_id))
+            for line in await self.get_lines(user_id)
+        ]
     
-    def add_item(self, user_id: int, item: Dict) -> bool:
+    async def add_item(self, user_id: int, item: Dict) -> bool:
         """
         Add item to cart or increase quantity if exists
         
         Args:
             user_id: Telegram user ID
-            item: Item dict with keys: id, name, price, etc.
+            item: Item dict with keys: id, price, quantity (optional)
             
         Returns:
             bool: Success status
         """
         try:
-            cart = self.get_cart(user_id)
-            
-            # Check if item already exists
-            item_exists = False
-            for existing_item in cart:
-                if existing_item.get('id') == item.get('id'):
-                    # Increase quantity
-                    existing_item['quantity'] = existing_item.get('quantity', 1) + 1
-                    item_exists = True
-                    break
+            line = CartLine.from_item(item)
+            if line.qty <= 0:
+                return False
             
-            if not item_exists:
-                # Add new item with quantity 1
-                item['quantity'] = item.get('quantity', 1)
-                cart.append(item)
-            
-            success = self._save_cart(user_id, cart)
-            if success:
-                logger.info(f"✅ Added item {item.get('name')} to cart for user {user_id}")
-            return success
+            await self.backend.add(user_id, str(line.item_id), line.qty, _to_kop(line.price))
+            self._generation += 1
+            logger.info(f"✅ Added item {item.get('name', line.item_id)} to cart for user {user_id}")
+            return True
             
         except Exception as e:
             logger.error(f"❌ Error adding item to cart: {e}")
             return False
     
-    def remove_item(self, user_id: int, item_id: int) -> bool:
+    async def remove_item(self, user_id: int, item_id: int) -> bool:
         """
         Remove item from cart
         
@@ -136,22 +356,16 @@ class CartManager:
             bool: Success status
         """
         try:
-            cart = self.get_cart(user_id)
-            original_length = len(cart)
-            
-            # Filter out item
-            cart = [item for item in cart if item.get('id') != item_id]
-            
-            if len(cart) < original_length:
+            self._generation += 1
+            if await self.backend.set_qty(user_id, str(item_id), 0) == 0:
                 logger.info(f"✅ Removed item {item_id} from cart for user {user_id}")
-            
-            return self._save_cart(user_id, cart)
+            return True
             
         except Exception as e:
             logger.error(f"❌ Error removing item: {e}")
             return False
     
-    def update_quantity(self, user_id: int, item_id: int, quantity: int) -> bool:
+    async def update_quantity(self, user_id: int, item_id: int, quantity: int) -> bool:
         """
         Update item quantity in cart
         
@@ -164,23 +378,15 @@ class CartManager:
             bool: Success status
         """
         try:
-            if quantity <= 0:
-                return self.remove_item(user_id, item_id)
-            
-            cart = self.get_cart(user_id)
-            
-            for item in cart:
-                if item.get('id') == item_id:
-                    item['quantity'] = quantity
-                    break
-            
-            return self._save_cart(user_id, cart)
+            await self.backend.set_qty(user_id, str(item_id), quantity)
+            self._generation += 1
+            return True
             
         except Exception as e:
             logger.error(f"❌ Error updating quantity: {e}")
             return False
     
-    def clear_cart(self, user_id: int) -> bool:
+    async def clear_cart(self, user_id: int) -> bool:
         """
         Clear user's cart completely
         
@@ -191,10 +397,9 @@ class CartManager:
             bool: Success status
         """
         try:
-            if self.storage_type == 'redis':
-                self.redis_client.delete(self._get_key(user_id))
-            else:
-                self.carts[user_id] = []
+            self._generation += 1
+            if not await self.backend.clear(user_id):
+                return False
             
             logger.info(f"✅ Cleared cart for user {user_id}")
             return True
@@ -203,86 +408,89 @@ class CartManager:
             logger.error(f"❌ Error clearing cart: {e}")
             return False
     
-    def _save_cart(self, user_id: int, cart: List[Dict]) -> bool:
+    async def _get_totals(self, user_id: int) -> Tuple[int, int]:
+        """Cached (count, total in kopecks) from the cart hash"""
+        try:
+            return await self.backend.get_totals(user_id)
+        except Exception as e:
+            logger.error(f"❌ Error getting cart totals for {user_id}: {e}")
+            return 0, 0
+    
+    async def get_cart_total(self, user_id: int) -> float:
         """
-        Save cart to storage
+        Calculate total price of cart
         
         Args:
             user_id: Telegram user ID
-            cart: Cart items list
             
         Returns:
-            bool: Success status
+            float: Total price
         """
-        try:
-            if self.storage_type == 'redis':
-                key = self._get_key(user_id)
-                if cart:
-                    # Save with 24 hours TTL
-                    self.redis_client.setex(
-                        key,
-                        86400,  # 24 hours
-                        json.dumps(cart, ensure_ascii=False)
-                    )
-                else:
-                    # Delete key if cart is empty
-                    self.redis_client.delete(key)
-            else:
-                self.carts[user_id] = cart
-            
-            return True
-            
-        except Exception as e:
-            logger.error(f"❌ Error saving cart: {e}")
-            return False
+        _, total_kop = await self._get_totals(user_id)
+        return round(total_kop / 100, 2)
     
-    def get_cart_total(self, user_id: int) -> float:
+    async def get_cart_count(self, user_id: int) -> int:
         """
-        Calculate total price of cart
+        Get total number of items in cart
         
         Args:
             user_id: Telegram user ID
             
         Returns:
-            float: Total price
+            int: Total item count
         """
-        cart = self.get_cart(user_id)
-        total = sum(
-            float(item.get('price', 0)) * int(item.get('quantity', 1))
-            for item in cart
-        )
-        return round(total, 2)
+        count, _ = await self._get_totals(user_id)
+        return count
     
-    def get_cart_count(self, user_id: int) -> int:
+    async def get_view(self, user_id: int, context=None) -> CartView:
         """
-        Get total number of items in cart
+        Get a cart snapshot (single storage read)
+        
+        With a CallbackContext the view is memoized for the lifetime of
+        the update (PTB creates one context per update), so handlers
+        that render the cart in several steps read storage once.
+        Any cart mutation invalidates memoized views.
         
         Args:
             user_id: Telegram user ID
+            context: Handler context (optional)
             
         Returns:
-            int: Total item count
+            CartView: Items, count, total, per-restaurant totals, delivery fee
         """
-        cart = self.get_cart(user_id)
-        return sum(int(item.get('quantity', 1)) for item in cart)
+        memo = getattr(context, _VIEW_MEMO_ATTR, None) if context is not None else None
+        if memo is not None:
+            cached = memo.get(user_id)
+            if cached is not None and cached[0] == self._generation:
+                return cached[1]
+        
+        generation = self._generation
+        view = CartView.from_lines(await self.get_lines(user_id))
+        
+        if context is not None:
+            try:
+                if memo is None:
+                    memo = {}
+                    setattr(context, _VIEW_MEMO_ATTR, memo)
+                memo[user_id] = (generation, view)
+            except AttributeError:
+                pass
+        
+        return view
     
-    def get_cart_summary(self, user_id: int) -> Dict:
+    async def get_cart_summary(self, user_id: int, context=None) -> Dict:
         """
         Get cart summary with items, count, and total
         
         Args:
             user_id: Telegram user ID
+            context: Handler context (optional, enables per-update memoization)
             
         Returns:
             dict: Cart summary
         """
-        cart = self.get_cart(user_id)
-        return {
-            'items': cart,
-            'count': self.get_cart_count(user_id),
-            'total': self.get_cart_total(user_id),
-            'is_empty': len(cart) == 0
-        }
+        view = await self.get_view(user_id, context)
+        return view.to_summary()
 
 
 # Global cart manager instance
@@ -293,7 +501,7 @@ cart_manager = CartManager()
 # Helper functions for backwards compatibility and convenience
 # ============================================================================
 
-def get_user_cart(user_id: int) -> List[Dict]:
+async def get_user_cart(user_id: int) -> List[Dict]:
     """
     Get user cart (wrapper function)
     
@@ -303,10 +511,10 @@ def get_user_cart(user_id: int) -> List[Dict]:
     Returns:
         list: Cart items
     """
-    return cart_manager.get_cart(user_id)
+    return await cart_manager.get_cart(user_id)
 
 
-def add_to_cart(user_id: int, item: Dict) -> bool:
+async def add_to_cart(user_id: int, item: Dict) -> bool:
     """
     Add item to cart (wrapper function)
     
@@ -317,10 +525,10 @@ def add_to_cart(user_id: int, item: Dict) -> bool:
     Returns:
         bool: Success status
     """
-    return cart_manager.add_item(user_id, item)
+    return await cart_manager.add_item(user_id, item)
 
 
-def remove_from_cart(user_id: int, item_id: int) -> bool:
+async def remove_from_cart(user_id: int, item_id: int) -> bool:
     """
     Remove item from cart (wrapper function)
     
@@ -331,10 +539,10 @@ def remove_from_cart(user_id: int, item_id: int) -> bool:
     Returns:
         bool: Success status
     """
-    return cart_manager.remove_item(user_id, item_id)
+    return await cart_manager.remove_item(user_id, item_id)
 
 
-def clear_user_cart(user_id: int) -> bool:
+async def clear_user_cart(user_id: int) -> bool:
     """
     Clear user cart (wrapper function)
     
@@ -344,10 +552,10 @@ def clear_user_cart(user_id: int) -> bool:
     Returns:
         bool: Success status
     """
-    return cart_manager.clear_cart(user_id)
+    return await cart_manager.clear_cart(user_id)
 
 
-def is_cart_empty(user_id: int) -> bool:
+async def is_cart_empty(user_id: int) -> bool:
     """
     Check if cart is empty
     
@@ -357,11 +565,10 @@ def is_cart_empty(user_id: int) -> bool:
     Returns:
         bool: True if cart is empty
     """
-    cart = get_user_cart(user_id)
-    return len(cart) == 0
+    return await cart_manager.get_cart_count(user_id) == 0
 
 
-def get_cart_item_count(user_id: int) -> int:
+async def get_cart_item_count(user_id: int) -> int:
     """
     Get total item count in cart
     
@@ -371,10 +578,10 @@ def get_cart_item_count(user_id: int) -> int:
     Returns:
         int: Total items
     """
-    return cart_manager.get_cart_count(user_id)
+    return await cart_manager.get_cart_count(user_id)
 
 
-def get_cart_total(user_id: int) -> float:
+async def get_cart_total(user_id: int) -> float:
     """
     Get cart total price
     
@@ -384,23 +591,38 @@ def get_cart_total(user_id: int) -> float:
     Returns:
         float: Total price
     """
-    return cart_manager.get_cart_total(user_id)
+    return await cart_manager.get_cart_total(user_id)
 
 
-def get_cart_summary(user_id: int) -> Dict:
+async def get_cart_summary(user_id: int, context=None) -> Dict:
     """
     Get full cart summary
     
     Args:
         user_id: Telegram user ID
+        context: Handler context (optional)
         
     Returns:
         dict: Cart summary with items, count, total
     """
-    return cart_manager.get_cart_summary(user_id)
+    return await cart_manager.get_cart_summary(user_id, context)
+
+
+async def get_cart_view(user_id: int, context=None) -> CartView:
+    """
+    Get cart snapshot for rendering (wrapper function)
+    
+    Args:
+        user_id: Telegram user ID
+        context: Handler context (optional, memoizes per update)
+        
+    Returns:
+        CartView: Cart snapshot
+    """
+    return await cart_manager.get_view(user_id, context)
 
 
-def update_item_quantity(user_id: int, item_id: int, quantity: int) -> bool:
+async def update_item_quantity(user_id: int, item_id: int, quantity: int) -> bool:
     """
     Update item quantity
     
@@ -412,20 +634,21 @@ def update_item_quantity(user_id: int, item_id: int, quantity: int) -> bool:
     Returns:
         bool: Success status
     """
-    return cart_manager.update_quantity(user_id, item_id, quantity)
+    return await cart_manager.update_quantity(user_id, item_id, quantity)
 
 
-def format_cart_message(user_id: int) -> str:
+async def format_cart_message(user_id: int, context=None) -> str:
     """
     Format cart as text message
     
     Args:
         user_id: Telegram user ID
+        context: Handler context (optional)
         
     Returns:
         str: Formatted cart message
     """
-    summary = get_cart_summary(user_id)
+    summary = await get_cart_summary(user_id, context)
     
     if summary['is_empty']:
         return "🛒 Ваш кошик порожній\n\nВикористайте /menu щоб додати товари"
@@ -451,7 +674,9 @@ def format_cart_message(user_id: int) -> str:
 # Export all public functions
 __all__ = [
     'CartManager',
+    'CartView',
     'cart_manager',
+    'calculate_delivery_fee',
     'get_user_cart',
     'add_to_cart',
     'remove_from_cart',
@@ -460,6 +685,7 @@ __all__ = [
     'get_cart_item_count',
     'get_cart_total',
     'get_cart_summary',
+    'get_cart_view',
     'update_item_quantity',
     'format_cart_message'
 ]
@@ -0,0 +1,281 @@
+"""
+🔌 CIRCUIT BREAKER - Захист від деградованих upstream сервісів
+Спільний шар для Google Sheets та Gemini: closed → open → half_open
+"""
+
+import time
+import threading
+import logging
+from collections import deque
+from typing import Any, Callable, Optional, Tuple, Type
+
+from app.utils.metrics import metrics
+from app.utils.quota_governor import QuotaExceededError
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# СТАНИ
+# ============================================================================
+
+STATE_CLOSED = 'closed'        # Все працює, виклики проходять
+STATE_OPEN = 'open'            # Upstream деградований, миттєвий fail
+STATE_HALF_OPEN = 'half_open'  # Пробні виклики після паузи
+
+STATE_VALUES = {
+    STATE_CLOSED: 0,
+    STATE_HALF_OPEN: 1,
+    STATE_OPEN: 2,
+}
+
+
+class CircuitOpenError(Exception):
+    """Circuit breaker відкритий - виклик не виконувався"""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker з порогом частки помилок у ковзному вікні
+
+    Логіка:
+    - CLOSED: рахуємо результати останніх window_size викликів;
+      якщо помилок >= failure_rate_threshold (і викликів >= minimum_calls) → OPEN
+    - OPEN: усі виклики одразу падають з CircuitOpenError (без очікування
+      таймауту бібліотеки); через open_seconds → HALF_OPEN
+    - HALF_OPEN: пропускаємо до half_open_max_calls пробних викликів;
+      успіх → CLOSED, помилка → знову OPEN
+
+    Переходи експортуються як метрики:
+    - circuit_breaker_transitions{name,from_state,to_state}
+    - circuit_breaker_state{name} (0=closed, 1=half_open, 2=open)
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = 0.5,
+        minimum_calls: int = 5,
+        window_size: int = 20,
+        open_seconds: float = 30.0,
+        half_open_max_calls: int = 1,
+        ignore_exceptions: Tuple[Type[BaseException], ...] = ()
+    ):
+        """
+        Args:
+            name: Назва upstream (для логів та метрик)
+            failure_rate_threshold: Частка помилок для відкриття (0.0-1.0)
+            minimum_calls: Мінімум викликів у вікні перед оцінкою
+            window_size: Розмір ковзного вікна результатів
+            open_seconds: Скільки тримати OPEN перед пробою
+            half_open_max_calls: Кількість одночасних пробних викликів
+            ignore_exceptions: Винятки, які не рахуються як збій upstream
+        """
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.minimum_calls = minimum_calls
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.ignore_exceptions = ignore_exceptions
+
+        self._lock = threading.Lock()
+        self._results = deque(maxlen=window_size)  # True = успіх, False = збій
+        self._state = STATE_CLOSED
+        self._opened_at = 0.0
+        self._half_open_in_flight = 0
+
+        metrics.set_gauge('circuit_breaker_state', STATE_VALUES[STATE_CLOSED], name=name)
+
+    # ========================================================================
+    # СТАН
+    # ========================================================================
+
+    @property
+    def state(self) -> str:
+        """Поточний стан (з урахуванням закінчення паузи OPEN)"""
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _transition(self, new_state: str):
+        """Змінити стан та записати метрики (під lock)"""
+        old_state = self._state
+        if old_state == new_state:
+            return
+
+        self._state = new_state
+        if new_state == STATE_OPEN:
+            self._opened_at = time.monotonic()
+        if new_state != STATE_HALF_OPEN:
+            self._half_open_in_flight = 0
+        if new_state == STATE_CLOSED:
+            self._results.clear()
+
+        metrics.inc(
+            'circuit_breaker_transitions',
+            name=self.name, from_state=old_state, to_state=new_state
+        )
+        metrics.set_gauge('circuit_breaker_state', STATE_VALUES[new_state], name=self.name)
+
+        if new_state == STATE_OPEN:
+            logger.warning(f"🔌 Circuit '{self.name}': {old_state} → OPEN")
+        else:
+            logger.info(f"🔌 Circuit '{self.name}': {old_state} → {new_state}")
+
+    def _maybe_half_open(self):
+        """OPEN → HALF_OPEN після паузи (під lock)"""
+        if self._state == STATE_OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._transition(STATE_HALF_OPEN)
+
+    def _failure_rate(self) -> float:
+        if not self._results:
+            return 0.0
+        failures = sum(1 for ok in self._results if not ok)
+        return failures / len(self._results)
+
+    # ========================================================================
+    # ЗАПИС РЕЗУЛЬТАТІВ
+    # ========================================================================
+
+    def allow_request(self) -> bool:
+        """
+        Перевірити чи можна виконати виклик
+
+        У HALF_OPEN резервує слот пробного виклику - його треба
+        звільнити через record_success/record_failure/release.
+        """
+        with self._lock:
+            self._maybe_half_open()
+
+            if self._state == STATE_CLOSED:
+                return True
+
+            if self._state == STATE_HALF_OPEN and self._half_open_in_flight < self.half_open_max_calls:
+                self._half_open_in_flight += 1
+                return True
+
+            metrics.inc('circuit_breaker_rejected', name=self.name)
+            return False
+
+    def record_success(self):
+        """Записати успішний виклик"""
+        with self._lock:
+            if self._state == STATE_HALF_OPEN:
+                self._transition(STATE_CLOSED)
+                return
+            self._results.append(True)
+
+    def record_failure(self):
+        """Записати збій upstream"""
+        with self._lock:
+            if self._state == STATE_HALF_OPEN:
+                self._transition(STATE_OPEN)
+                return
+
+            self._results.append(False)
+            if (self._state == STATE_CLOSED
+                    and len(self._results) >= self.minimum_calls
+                    and self._failure_rate() >= self.failure_rate_threshold):
+                self._transition(STATE_OPEN)
+
+    def release(self):
+        """Звільнити слот без оцінки (виклик не дійшов до upstream)"""
+        with self._lock:
+            if self._state == STATE_HALF_OPEN and self._half_open_in_flight > 0:
+                self._half_open_in_flight -= 1
+
+    # ========================================================================
+    # ВИКЛИКИ
+    # ========================================================================
+
+    def _fail_fast(self, fallback: Optional[Callable[[], Any]]):
+        if fallback is not None:
+            return fallback()
+        raise CircuitOpenError(f"Circuit '{self.name}' is open")
+
+    def call(self, func: Callable, *args, fallback: Optional[Callable[[], Any]] = None, **kwargs):
+        """
+        Виконати синхронний виклик через breaker
+
+        Args:
+            func: Функція upstream
+            fallback: Викликається замість CircuitOpenError, якщо breaker відкритий
+
+        Raises:
+            CircuitOpenError: breaker відкритий і fallback не заданий
+        """
+        if not self.allow_request():
+            return self._fail_fast(fallback)
+
+        try:
+            result = func(*args, **kwargs)
+        except self.ignore_exceptions:
+            self.release()
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+        except BaseException:
+            # Скасування (CancelledError, KeyboardInterrupt) - не збій upstream
+            self.release()
+            raise
+
+        self.record_success()
+        return result
+
+    async def call_async(self, func: Callable, *args, fallback: Optional[Callable[[], Any]] = None, **kwargs):
+        """Виконати async виклик через breaker (та сама логіка, що й call)"""
+        if not self.allow_request():
+            return self._fail_fast(fallback)
+
+        try:
+            result = await func(*args, **kwargs)
+        except self.ignore_exceptions:
+            self.release()
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+        except BaseException:
+            # Скасування (CancelledError, KeyboardInterrupt) - не збій upstream
+            self.release()
+            raise
+
+        self.record_success()
+        return result
+
+    def get_stats(self) -> dict:
+        """Отримати статистику breaker"""
+        with self._lock:
+            self._maybe_half_open()
+            return {
+                'name': self.name,
+                'state': self._state,
+                'failure_rate': round(self._failure_rate(), 3),
+                'window_calls': len(self._results),
+                'open_for_seconds': (
+                    round(time.monotonic() - self._opened_at, 1)
+                    if self._state == STATE_OPEN else 0
+                )
+            }
+
+
+# ============================================================================
+# ГЛОБАЛЬНІ INSTANCES
+# ============================================================================
+
+# Google Sheets: відкидання власним quota governor - не збій Google
+sheets_breaker = CircuitBreaker(
+    name='sheets',
+    failure_rate_threshold=0.5,
+    minimum_calls=5,
+    open_seconds=30.0,
+    ignore_exceptions=(QuotaExceededError,)
+)
+
+# Gemini: LLM-виклики довгі, тому відкриваємось швидше і чекаємо довше
+gemini_breaker = CircuitBreaker(
+    name='gemini',
+    failure_rate_threshold=0.5,
+    minimum_calls=3,
+    open_seconds=60.0
+)
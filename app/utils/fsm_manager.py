@@ -6,6 +6,9 @@
 import logging
 from typing import Optional, Dict, Any
 
+from app.utils.user_state_store import user_state, NS_FSM
+from app.utils.state_models import FsmEntry
+
 logger = logging.getLogger(__name__)
 
 # ============================================================================
@@ -49,7 +52,20 @@ STATES = {
 # STATE MANAGER
 # ============================================================================
 
-_user_states: Dict[int, Dict[str, Any]] = {}
+# Стан зберігається в user state store (hash user:fsm:{user_id}) як FsmEntry:
+#   state - назва стану, data - додаткові дані стану.
+# Стан idle без даних не зберігається взагалі.
+
+
+def _load_entry(user_id: int) -> FsmEntry:
+    return FsmEntry.from_storage(user_state.get_fields(NS_FSM, user_id, 'state', 'data'))
+
+
+def _save_entry(user_id: int, entry: FsmEntry):
+    if entry.is_default:
+        user_state.delete(NS_FSM, user_id)
+    else:
+        user_state.replace(NS_FSM, user_id, entry.to_storage())
 
 
 def get_user_state(user_id: int) -> str:
@@ -62,10 +78,7 @@ def get_user_state(user_id: int) -> str:
     Returns:
         Поточний стан (за замовчуванням 'idle')
     """
-    if user_id not in _user_states:
-        _user_states[user_id] = {'state': 'idle', 'data': {}}
-    
-    return _user_states[user_id]['state']
+    return _load_entry(user_id).state
 
 
 def set_user_state(user_id: int, state: str, data: Dict[str, Any] = None):
@@ -81,38 +94,32 @@ def set_user_state(user_id: int, state: str, data: Dict[str, Any] = None):
         logger.warning(f"⚠️ Unknown state: {state}")
         return
     
-    if user_id not in _user_states:
-        _user_states[user_id] = {}
-    
-    old_state = _user_states[user_id].get('state', 'idle')
-    _user_states[user_id]['state'] = state
+    entry = _load_entry(user_id)
+    old_state = entry.state
     
+    entry.state = state
     if data:
-        _user_states[user_id]['data'] = data
+        entry.data = data
+    _save_entry(user_id, entry)
     
     logger.info(f"🔄 User {user_id}: {old_state} → {state}")
 
 
 def get_user_state_data(user_id: int) -> Dict[str, Any]:
     """Отримати додаткові дані стану"""
-    if user_id not in _user_states:
-        return {}
-    
-    return _user_states[user_id].get('data', {})
+    return _load_entry(user_id).data
 
 
 def update_state_data(user_id: int, key: str, value: Any):
     """Оновити значення в даних стану"""
-    if user_id not in _user_states:
-        _user_states[user_id] = {'state': 'idle', 'data': {}}
-    
-    _user_states[user_id]['data'][key] = value
+    entry = _load_entry(user_id)
+    entry.data[key] = value
+    _save_entry(user_id, entry)
 
 
 def reset_user_state(user_id: int):
     """Скинути стан користувача до idle"""
-    if user_id in _user_states:
-        _user_states[user_id] = {'state': 'idle', 'data': {}}
+    if user_state.delete(NS_FSM, user_id):
         logger.info(f"🔄 User {user_id} state reset to idle")
 
 
@@ -0,0 +1,232 @@
+"""
+🩺 HEALTH - Фонові перевірки залежностей для /healthz та /readyz
+Проби виконуються раз на HEALTH_CHECK_INTERVAL у фоновому task, а endpoints
+віддають закешований результат миттєво (без звернень до backends на кожен probe)
+
+- postgres, redis: активна проба (SELECT 1 / PING) через спільні пули
+- sheets, gemini: пасивна проба за станом circuit breaker (без витрати квоти)
+- required залежності впливають на readiness, решта - лише "degraded"
+"""
+
+import os
+import time
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.utils.metrics import metrics
+from app.utils.redis_pool import redis_pool
+from app.utils.circuit_breaker import sheets_breaker, gemini_breaker, STATE_OPEN
+
+# PostgreSQL (optional)
+try:
+    from sqlalchemy import text
+    from app.database import DATABASE_CONFIGURED, ASYNC_DB_AVAILABLE, async_engine, engine
+    DATABASE_AVAILABLE = True
+except ImportError:
+    DATABASE_AVAILABLE = False
+    DATABASE_CONFIGURED = False
+
+logger = logging.getLogger(__name__)
+
+HEALTH_CHECK_INTERVAL = float(os.getenv('HEALTH_CHECK_INTERVAL', '15'))
+HEALTH_PROBE_TIMEOUT = float(os.getenv('HEALTH_PROBE_TIMEOUT', '3'))
+
+STATUS_OK = 'ok'
+STATUS_FAIL = 'fail'
+STATUS_DISABLED = 'disabled'  # Залежність не налаштована - не перевіряється
+
+
+@dataclass(slots=True)
+class ProbeResult:
+    """Останній результат проби однієї залежності"""
+    status: str = STATUS_FAIL
+    latency_ms: Optional[float] = None
+    checked_at: Optional[float] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'status': self.status,
+            'latency_ms': self.latency_ms,
+            'age_seconds': round(time.time() - self.checked_at, 1) if self.checked_at else None,
+            'error': self.error
+        }
+
+
+@dataclass(slots=True)
+class _Probe:
+    check: Callable[[], Awaitable[str]]
+    required: bool
+    result: ProbeResult = field(default_factory=ProbeResult)
+
+
+class HealthMonitor:
+    """
+    Реєстр проб + фоновий цикл
+
+    Проба - async функція, що повертає STATUS_OK / STATUS_DISABLED
+    або кидає виняток (STATUS_FAIL).
+    """
+
+    def __init__(self, interval: float = HEALTH_CHECK_INTERVAL, timeout: float = HEALTH_PROBE_TIMEOUT):
+        self.interval = interval
+        self.timeout = timeout
+        self._probes: Dict[str, _Probe] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._last_run: Optional[float] = None
+
+    def register(self, name: str, check: Callable[[], Awaitable[str]], required: bool = False):
+        """Додати пробу (required - без неї сервіс не ready)"""
+        self._probes[name] = _Probe(check, required)
+
+    async def _run_probe(self, name: str, probe: _Probe):
+        start = time.perf_counter()
+        try:
+            status = await asyncio.wait_for(probe.check(), self.timeout)
+            error = None
+        except asyncio.TimeoutError:
+            status, error = STATUS_FAIL, f"timeout after {self.timeout:.0f}s"
+        except Exception as e:
+            status, error = STATUS_FAIL, str(e)[:200]
+
+        latency = time.perf_counter() - start
+        if status != STATUS_DISABLED:
+            metrics.observe('health_probe_seconds', latency, dependency=name)
+
+        if status == STATUS_FAIL and probe.result.status != STATUS_FAIL:
+            logger.warning(f"🩺 {name} health probe failed: {error}")
+        elif status == STATUS_OK and probe.result.status == STATUS_FAIL and probe.result.checked_at:
+            logger.info(f"🩺 {name} recovered")
+
+        probe.result = ProbeResult(
+            status=status,
+            latency_ms=round(latency * 1000, 1) if status != STATUS_DISABLED else None,
+            checked_at=time.time(),
+            error=error
+        )
+        metrics.set_gauge('health_dependency_up', int(status != STATUS_FAIL), dependency=name)
+
+    async def run_once(self):
+        """Виконати всі проби паралельно"""
+        await asyncio.gather(*(self._run_probe(name, probe) for name, probe in self._probes.items()))
+        self._last_run = time.monotonic()
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"❌ Health loop error: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Запустити фоновий цикл (в event loop додатку)"""
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.get_running_loop().create_task(self._loop(), name="health-monitor")
+        logger.info(f"🩺 Health monitor started (every {self.interval:.0f}s)")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # ========================================================================
+    # СТАН
+    # ========================================================================
+
+    def liveness(self) -> Dict[str, Any]:
+        """
+        Процес живий, якщо фоновий цикл не завис
+
+        Стан залежностей сюди не входить: рестарт не лікує недоступний Redis.
+        """
+        stale_after = self.interval * 3 + self.timeout
+        alive = self._last_run is None or time.monotonic() - self._last_run < stale_after
+        return {
+            'ok': alive,
+            'status': 'alive' if alive else 'stalled',
+            'last_check_seconds_ago': (
+                round(time.monotonic() - self._last_run, 1) if self._last_run is not None else None
+            )
+        }
+
+    def readiness(self) -> Dict[str, Any]:
+        """Готовий приймати трафік, якщо всі required залежності ok"""
+        checks = {name: probe.result.to_dict() for name, probe in self._probes.items()}
+
+        if self._last_run is None:
+            return {'ok': False, 'status': 'starting', 'checks': checks}
+
+        ready = all(
+            probe.result.status != STATUS_FAIL
+            for probe in self._probes.values() if probe.required
+        )
+        degraded = any(probe.result.status == STATUS_FAIL for probe in self._probes.values())
+
+        return {
+            'ok': ready,
+            'status': 'unready' if not ready else ('degraded' if degraded else 'ready'),
+            'checks': checks
+        }
+
+
+# ============================================================================
+# ПРОБИ
+# ============================================================================
+
+async def probe_postgres() -> str:
+    if not DATABASE_AVAILABLE or not DATABASE_CONFIGURED:
+        return STATUS_DISABLED
+
+    if ASYNC_DB_AVAILABLE and async_engine is not None:
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        return STATUS_OK
+
+    def ping():
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+    await asyncio.to_thread(ping)
+    return STATUS_OK
+
+
+async def probe_redis() -> str:
+    if not redis_pool.enabled:
+        return STATUS_DISABLED
+    if not await redis_pool.ping():
+        raise ConnectionError("PING failed")
+    return STATUS_OK
+
+
+def _breaker_probe(breaker, configured: Callable[[], bool]):
+    async def probe() -> str:
+        if not configured():
+            return STATUS_DISABLED
+        if breaker.get_stats()['state'] == STATE_OPEN:
+            raise ConnectionError(f"circuit '{breaker.name}' is open")
+        return STATUS_OK
+    return probe
+
+
+def _sheets_configured() -> bool:
+    from app.services.sheets_service import sheets_service
+    return sheets_service.spreadsheet is not None
+
+
+# ============================================================================
+# ГЛОБАЛЬНИЙ INSTANCE
+# ============================================================================
+
+health_monitor = HealthMonitor()
+health_monitor.register('postgres', probe_postgres, required=True)
+health_monitor.register('redis', probe_redis, required=True)
+health_monitor.register('sheets', _breaker_probe(sheets_breaker, _sheets_configured))
+health_monitor.register('gemini', _breaker_probe(gemini_breaker, lambda: bool(os.getenv('GEMINI_API_KEY'))))
@@ -0,0 +1,128 @@
+"""
+✍️ MESSAGE STREAM - Прогресивне редагування повідомлення Telegram
+Частковий текст AI відповіді показується одразу, а не після повної генерації
+
+- Редагування не частіше за STREAM_EDIT_INTERVAL (ліміти Telegram на edit)
+- Проміжні версії пропускаються, якщо текст майже не змінився
+- Фінальне редагування виконується завжди (з клавіатурою)
+- Помилки редагування не обривають генерацію: "not modified" ігнорується,
+  RetryAfter відсуває наступне редагування
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Optional
+
+from telegram.error import BadRequest, RetryAfter
+
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Мінімальний інтервал між редагуваннями одного повідомлення (секунди)
+STREAM_EDIT_INTERVAL = float(os.getenv('AI_STREAM_EDIT_INTERVAL', '1.0'))
+# Мінімальний приріст тексту для проміжного редагування (символи)
+STREAM_MIN_DELTA = int(os.getenv('AI_STREAM_MIN_DELTA', '20'))
+
+# Курсор у проміжних версіях - видно, що відповідь ще друкується
+STREAM_CURSOR = ' ▌'
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+
+class MessageStreamer:
+    """
+    Throttled edit_message_text для стрімінгу відповіді
+
+    Приклад:
+        streamer = MessageStreamer(query.edit_message_text)
+        text = await service.generate_response(prompt, user_id, on_partial=streamer.update)
+        await streamer.finish(text, reply_markup=keyboard)
+    """
+
+    def __init__(self, edit: Callable[..., Awaitable[Any]],
+                 interval: float = STREAM_EDIT_INTERVAL, min_delta: int = STREAM_MIN_DELTA):
+        self._edit = edit
+        self.interval = interval
+        self.min_delta = min_delta
+        self._shown = ''
+        self._next_edit_at = 0.0
+        self._started_at = time.perf_counter()
+        self._first_partial = True
+        self.edits = 0
+
+    @staticmethod
+    def _fit(text: str, suffix: str = '') -> str:
+        limit = TELEGRAM_MESSAGE_LIMIT - len(suffix)
+        if len(text) > limit:
+            text = text[:limit - 1] + '…'
+        return text + suffix
+
+    async def _apply(self, text: str, **kwargs) -> bool:
+        try:
+            await self._edit(text, **kwargs)
+        except RetryAfter as e:
+            retry_after = e.retry_after
+            if hasattr(retry_after, 'total_seconds'):
+                retry_after = retry_after.total_seconds()
+            self._next_edit_at = time.monotonic() + float(retry_after)
+            metrics.inc('stream_edit_throttled')
+            return False
+        except BadRequest as e:
+            if 'message is not modified' not in str(e).lower():
+                logger.warning(f"⚠️ Stream edit failed: {e}")
+                return False
+        self.edits += 1
+        return True
+
+    async def update(self, text: str):
+        """Частковий текст (callback on_partial) - редагує, якщо настав час"""
+        text = text.strip()
+        if not text:
+            return
+
+        if self._first_partial:
+            self._first_partial = False
+            metrics.observe('ai_first_token_seconds', time.perf_counter() - self._started_at)
+
+        if time.monotonic() < self._next_edit_at:
+            return
+        if self._shown and len(text) - len(self._shown) < self.min_delta:
+            return
+
+        self._next_edit_at = time.monotonic() + self.interval
+        if await self._apply(self._fit(text, STREAM_CURSOR)):
+            self._shown = text
+
+    async def _wait_turn(self):
+        delay = self._next_edit_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def finish(self, text: str, reply_markup=None, parse_mode: Optional[str] = None) -> bool:
+        """
+        Фінальна версія (без курсора, з клавіатурою)
+
+        Чекає кінця інтервалу, щоб не впертись в ліміт, і повторює
+        без parse_mode, якщо розмітка моделі невалідна для Telegram.
+        """
+        await self._wait_turn()
+
+        text = self._fit(text.strip() or '🤔')
+        kwargs = {'reply_markup': reply_markup}
+        if parse_mode:
+            try:
+                await self._edit(text, parse_mode=parse_mode, **kwargs)
+                self.edits += 1
+                return True
+            except BadRequest as e:
+                if 'message is not modified' in str(e).lower():
+                    return True
+                logger.debug(f"Stream final markup rejected, sending plain: {e}")
+
+        if await self._apply(text, **kwargs):
+            return True
+        # Фінал не можна пропустити: після RetryAfter - ще одна спроба
+        await self._wait_turn()
+        return await self._apply(text, **kwargs)
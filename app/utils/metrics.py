@@ -0,0 +1,97 @@
+"""
+📈 METRICS - Легкі in-process метрики
+Лічильники, gauges та таймінги для моніторингу (/api/v1/metrics)
+"""
+
+import threading
+import logging
+from typing import Dict, Any
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsRegistry:
+    """
+    Простий потокобезпечний реєстр метрик
+
+    Підтримує:
+    - counters: монотонні лічильники (inc)
+    - gauges: поточні значення (set_gauge)
+    - timings: count/sum/max для тривалостей (observe)
+
+    Labels передаються як kwargs і стають частиною ключа:
+        metrics.inc('sheets_calls', priority='write')
+        -> 'sheets_calls{priority=write}'
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, float] = {}
+        self.timings: Dict[str, Dict[str, float]] = {}
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, Any]) -> str:
+        """Сформувати ключ метрики з labels"""
+        if not labels:
+            return name
+        label_str = ','.join(f"{k}={v}" for k, v in sorted(labels.items()))
+        return f"{name}{{{label_str}}}"
+
+    def inc(self, name: str, value: float = 1, /, **labels):
+        """Збільшити лічильник"""
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, /, **labels):
+        """Встановити значення gauge"""
+        key = self._key(name, labels)
+        with self._lock:
+            self.gauges[key] = value
+
+    def observe(self, name: str, value: float, /, **labels):
+        """Записати тривалість/розмір (count, sum, max)"""
+        key = self._key(name, labels)
+        with self._lock:
+            timing = self.timings.get(key)
+            if timing is None:
+                timing = {'count': 0, 'sum': 0.0, 'max': 0.0}
+                self.timings[key] = timing
+            timing['count'] += 1
+            timing['sum'] += value
+            if value > timing['max']:
+                timing['max'] = value
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Отримати копію всіх метрик"""
+        with self._lock:
+            timings = {}
+            for key, timing in self.timings.items():
+                avg = timing['sum'] / timing['count'] if timing['count'] else 0.0
+                timings[key] = {
+                    'count': timing['count'],
+                    'sum': round(timing['sum'], 6),
+                    'avg': round(avg, 6),
+                    'max': round(timing['max'], 6)
+                }
+
+            return {
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+                'timings': timings
+            }
+
+    def reset(self):
+        """Скинути всі метрики (для тестів)"""
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.timings.clear()
+
+
+# ============================================================================
+# ГЛОБАЛЬНИЙ INSTANCE
+# ============================================================================
+
+metrics = MetricsRegistry()
@@ -0,0 +1,286 @@
+"""
+🚦 QUOTA GOVERNOR - Глобальний ліміт запитів до upstream API
+Рахує всі виклики Google Sheets у межах квоти requests-per-minute
+"""
+
+import os
+import time
+import threading
+import logging
+from typing import Optional
+
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Try to import Redis
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+# ============================================================================
+# ПРІОРИТЕТИ
+# ============================================================================
+
+PRIORITY_WRITE = 0   # Замовлення, промокоди - ніколи не відкидаються першими
+PRIORITY_READ = 1    # Інтерактивні читання без fallback (історія замовлень)
+PRIORITY_LOW = 2     # Оновлення меню/конфігу - є snapshot або mock
+
+PRIORITY_NAMES = {
+    PRIORITY_WRITE: 'write',
+    PRIORITY_READ: 'read',
+    PRIORITY_LOW: 'low',
+}
+
+# Частка квоти, яку пріоритет НЕ може використати
+# (резерв для важливіших запитів)
+DEFAULT_RESERVES = {
+    PRIORITY_WRITE: 0.0,
+    PRIORITY_READ: 0.1,
+    PRIORITY_LOW: 0.3,
+}
+
+WINDOW_SECONDS = 60
+
+
+class QuotaExceededError(Exception):
+    """Квота вичерпана - запит відкинуто або не дочекався черги"""
+
+
+class QuotaGovernor:
+    """
+    Обмежувач квоти з фіксованим вікном (1 хвилина)
+
+    Особливості:
+    - Один лічильник на процес або на весь Redis (кілька воркерів)
+    - Пріоритети: LOW-читання відкидаються, коли залишок менший
+      за резерв, а записи чекають наступного вікна (до max_wait)
+    - penalize() після 429 - блокує решту вікна
+    - Залишок квоти експортується як gauge '<name>_quota_remaining'
+    """
+
+    def __init__(
+        self,
+        name: str,
+        limit_per_minute: int,
+        max_wait: float = 10.0,
+        redis_url: Optional[str] = None
+    ):
+        """
+        Args:
+            name: Назва upstream (для метрик та ключів Redis)
+            limit_per_minute: Квота запитів на хвилину
+            max_wait: Максимальний час очікування в черзі (секунди)
+            redis_url: URL Redis для спільного лічильника (опціонально)
+        """
+        self.name = name
+        self.limit = max(1, limit_per_minute)
+        self.max_wait = max_wait
+        self.reserves = dict(DEFAULT_RESERVES)
+
+        self._lock = threading.Condition()
+        self._window_start = self._current_window()
+        self._used = 0
+        self._blocked_until = 0.0
+
+        self.redis_client = None
+        if redis_url and REDIS_AVAILABLE:
+            try:
+                self.redis_client = redis.from_url(
+                    redis_url,
+                    decode_responses=True,
+                    socket_connect_timeout=2,
+                    socket_timeout=2
+                )
+                self.redis_client.ping()
+                logger.info(f"🚦 Quota governor '{name}': {self.limit}/min (Redis-wide)")
+            except Exception as e:
+                logger.warning(f"⚠️ Quota governor Redis unavailable: {e}, using local counter")
+                self.redis_client = None
+
+        if not self.redis_client:
+            logger.info(f"🚦 Quota governor '{name}': {self.limit}/min (process-local)")
+
+        self._publish_remaining(self.limit)
+
+    # ========================================================================
+    # ВІКНО
+    # ========================================================================
+
+    @staticmethod
+    def _current_window() -> int:
+        """Початок поточного хвилинного вікна (unix seconds)"""
+        return int(time.time()) // WINDOW_SECONDS * WINDOW_SECONDS
+
+    def _allowed_for(self, priority: int) -> int:
+        """Скільки запитів у вікні доступно для пріоритету"""
+        reserve = self.reserves.get(priority, 0.0)
+        return int(self.limit * (1 - reserve))
+
+    def _redis_key(self, window: int) -> str:
+        return f"quota:{self.name}:{window}"
+
+    def _publish_remaining(self, remaining: int):
+        metrics.set_gauge(f"{self.name}_quota_remaining", max(0, remaining))
+
+    # ========================================================================
+    # РЕЗЕРВУВАННЯ
+    # ========================================================================
+
+    def _try_take_local(self, priority: int, cost: int) -> bool:
+        """Спробувати взяти квоту з локального лічильника (під lock)"""
+        window = self._current_window()
+        if window != self._window_start:
+            self._window_start = window
+            self._used = 0
+
+        if self._used + cost > self._allowed_for(priority):
+            return False
+
+        self._used += cost
+        self._publish_remaining(self.limit - self._used)
+        return True
+
+    def _try_take_redis(self, priority: int, cost: int) -> bool:
+        """Спробувати взяти квоту зі спільного лічильника Redis"""
+        key = self._redis_key(self._current_window())
+
+        pipe = self.redis_client.pipeline()
+        pipe.incrby(key, cost)
+        pipe.expire(key, WINDOW_SECONDS * 2)
+        used, _ = pipe.execute()
+
+        if used > self._allowed_for(priority):
+            # Повертаємо взяте - запит не пройшов
+            self.redis_client.decrby(key, cost)
+            self._publish_remaining(self.limit - used + cost)
+            return False
+
+        self._publish_remaining(self.limit - used)
+        return True
+
+    def _try_take(self, priority: int, cost: int) -> bool:
+        if time.time() < self._blocked_until:
+            return False
+
+        if self.redis_client:
+            try:
+                return self._try_take_redis(priority, cost)
+            except Exception as e:
+                logger.warning(f"⚠️ Quota Redis error: {e}, falling back to local counter")
+                self.redis_client = None
+
+        return self._try_take_local(priority, cost)
+
+    def acquire(
+        self,
+        priority: int = PRIORITY_READ,
+        cost: int = 1,
+        wait: Optional[bool] = None
+    ) -> bool:
+        """
+        Отримати дозвіл на виклик upstream
+
+        Args:
+            priority: PRIORITY_WRITE / PRIORITY_READ / PRIORITY_LOW
+            cost: Кількість API викликів
+            wait: Чекати наступного вікна (за замовчуванням - тільки для записів)
+
+        Returns:
+            True якщо виклик дозволено, False якщо відкинуто
+        """
+        if wait is None:
+            wait = priority == PRIORITY_WRITE
+
+        label = PRIORITY_NAMES.get(priority, str(priority))
+        started = time.monotonic()
+        deadline = started + self.max_wait
+
+        with self._lock:
+            while True:
+                if self._try_take(priority, cost):
+                    waited = time.monotonic() - started
+                    metrics.inc(f"{self.name}_quota_granted", priority=label)
+                    if waited > 0.001:
+                        metrics.observe(f"{self.name}_quota_wait_seconds", waited, priority=label)
+                    return True
+
+                now = time.monotonic()
+                if not wait or now >= deadline:
+                    metrics.inc(f"{self.name}_quota_shed", priority=label)
+                    logger.warning(f"🚦 {self.name} quota: shed {label} request")
+                    return False
+
+                # Чекаємо до початку наступного вікна (або розблокування)
+                next_window = self._current_window() + WINDOW_SECONDS
+                sleep_for = max(next_window, self._blocked_until) - time.time()
+                self._lock.wait(timeout=max(0.05, min(sleep_for, deadline - now)))
+
+    def penalize(self, seconds: Optional[float] = None):
+        """
+        Заблокувати виклики після 429 від upstream
+
+        Args:
+            seconds: Тривалість блокування (за замовчуванням - до кінця вікна)
+        """
+        with self._lock:
+            if seconds is None:
+                seconds = self._current_window() + WINDOW_SECONDS - time.time()
+            self._blocked_until = time.time() + max(1.0, seconds)
+            self._publish_remaining(0)
+            metrics.inc(f"{self.name}_quota_throttled")
+            logger.warning(f"🚦 {self.name} quota: upstream 429, blocked for {seconds:.0f}s")
+
+    def get_remaining(self) -> int:
+        """Залишок квоти в поточному вікні"""
+        if time.time() < self._blocked_until:
+            return 0
+
+        if self.redis_client:
+            try:
+                used = int(self.redis_client.get(self._redis_key(self._current_window())) or 0)
+                return max(0, self.limit - used)
+            except Exception:
+                pass
+
+        with self._lock:
+            if self._current_window() != self._window_start:
+                return self.limit
+            return max(0, self.limit - self._used)
+
+    def get_stats(self) -> dict:
+        """Отримати статистику квоти"""
+        remaining = self.get_remaining()
+        self._publish_remaining(remaining)
+        return {
+            'name': self.name,
+            'limit_per_minute': self.limit,
+            'remaining': remaining,
+            'scope': 'redis' if self.redis_client else 'process',
+            'blocked': time.time() < self._blocked_until
+        }
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Перевірити чи помилка - це 429 / RESOURCE_EXHAUSTED від Google API"""
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None)
+    if status == 429:
+        return True
+
+    text = str(error)
+    return '429' in text or 'RESOURCE_EXHAUSTED' in text or 'Quota exceeded' in text
+
+
+# ============================================================================
+# ГЛОБАЛЬНИЙ INSTANCE
+# ============================================================================
+
+sheets_quota = QuotaGovernor(
+    name='sheets',
+    limit_per_minute=int(os.getenv('SHEETS_QUOTA_PER_MINUTE', '60')),
+    max_wait=float(os.getenv('SHEETS_QUOTA_MAX_WAIT', '10')),
+    redis_url=os.getenv('REDIS_URL') if os.getenv('SHEETS_QUOTA_SCOPE', 'process') == 'redis' else None
+)
@@ -0,0 +1,164 @@
+"""
+🔌 REDIS POOL - Спільний async Redis клієнт з пулом з'єднань
+Для кошика та інших Redis-сховищ, які викликаються з async handlers
+
+- BlockingConnectionPool: обмежений розмір, очікування вільного з'єднання
+  замість необмеженого відкриття нових
+- health_check_interval: PING перед використанням "застарілого" з'єднання
+- Retry з експоненційним backoff на обриві з'єднання / таймауті
+- Метрики насиченості пулу (/api/v1/metrics)
+"""
+
+import os
+import time
+import logging
+from typing import Any, Dict, Optional
+
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Try to import async Redis
+try:
+    import redis.asyncio as aioredis
+    from redis.backoff import ExponentialBackoff
+    from redis.asyncio.retry import Retry
+    from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+    REDIS_ASYNC_AVAILABLE = True
+except ImportError:
+    REDIS_ASYNC_AVAILABLE = False
+
+# ============================================================================
+# КОНФІГУРАЦІЯ
+# ============================================================================
+
+REDIS_POOL_SIZE = int(os.getenv('REDIS_POOL_SIZE', '20'))
+REDIS_POOL_TIMEOUT = float(os.getenv('REDIS_POOL_TIMEOUT', '5'))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv('REDIS_HEALTH_CHECK_INTERVAL', '30'))
+REDIS_SOCKET_TIMEOUT = float(os.getenv('REDIS_SOCKET_TIMEOUT', '5'))
+REDIS_RETRIES = int(os.getenv('REDIS_RETRIES', '3'))
+
+
+if REDIS_ASYNC_AVAILABLE:
+
+    class _MeteredBlockingPool(aioredis.BlockingConnectionPool):
+        """BlockingConnectionPool, що рахує зайняті з'єднання та час очікування"""
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.in_use = 0
+
+        async def get_connection(self, *args, **kwargs):
+            start = time.perf_counter()
+            connection = await super().get_connection(*args, **kwargs)
+            metrics.observe('redis_pool_wait_seconds', time.perf_counter() - start)
+            self.in_use += 1
+            self._publish()
+            return connection
+
+        async def release(self, connection):
+            await super().release(connection)
+            self.in_use = max(self.in_use - 1, 0)
+            self._publish()
+
+        def _publish(self):
+            metrics.set_gauge('redis_pool_in_use', self.in_use)
+            metrics.set_gauge('redis_pool_saturation', round(self.in_use / self.max_connections, 3))
+
+
+class RedisPool:
+    """
+    Лінивий async Redis клієнт поверх одного пулу на процес
+
+    Використання:
+        client = redis_pool.get_client()
+        await client.hgetall(key)
+    """
+
+    def __init__(self, url: Optional[str] = None, max_connections: int = REDIS_POOL_SIZE):
+        """
+        Args:
+            url: URL Redis (за замовчуванням REDIS_URL)
+            max_connections: Максимальний розмір пулу
+        """
+        self.url = url or os.getenv('REDIS_URL')
+        self.max_connections = max_connections
+        self._pool = None
+        self._client = None
+
+    @property
+    def enabled(self) -> bool:
+        """Чи можна використовувати async Redis"""
+        return bool(self.url) and REDIS_ASYNC_AVAILABLE
+
+    def get_client(self):
+        """
+        Отримати клієнт (пул створюється при першому виклику)
+
+        Returns:
+            redis.asyncio.Redis або None якщо Redis недоступний
+        """
+        if not self.enabled:
+            return None
+
+        if self._client is None:
+            self._pool = _MeteredBlockingPool.from_url(
+                self.url,
+                max_connections=self.max_connections,
+                timeout=REDIS_POOL_TIMEOUT,
+                decode_responses=True,
+                socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+                socket_timeout=REDIS_SOCKET_TIMEOUT,
+                health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+                retry_on_error=[RedisConnectionError, RedisTimeoutError],
+                retry=Retry(ExponentialBackoff(cap=2.0, base=0.05), REDIS_RETRIES)
+            )
+            self._client = aioredis.Redis(connection_pool=self._pool)
+            logger.info(f"🔌 Async Redis pool created (max {self.max_connections} connections)")
+
+        return self._client
+
+    async def ping(self) -> bool:
+        """Перевірка з'єднання"""
+        client = self.get_client()
+        if client is None:
+            return False
+        try:
+            return bool(await client.ping())
+        except Exception as e:
+            logger.warning(f"⚠️ Redis ping failed: {e}")
+            return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика пулу"""
+        if self._pool is None:
+            return {'enabled': self.enabled, 'connected': False}
+
+        return {
+            'enabled': True,
+            'connected': True,
+            'max_connections': self.max_connections,
+            'in_use': self._pool.in_use,
+            'saturation': round(self._pool.in_use / self.max_connections, 3)
+        }
+
+    async def close(self):
+        """Закрити всі з'єднання пулу (при зупинці)"""
+        if self._client is None:
+            return
+        try:
+            await self._client.close()
+            await self._pool.disconnect()
+            logger.info("✅ Redis pool closed")
+        except Exception as e:
+            logger.error(f"❌ Redis pool close error: {e}")
+        finally:
+            self._client = None
+            self._pool = None
+
+
+# ============================================================================
+# ГЛОБАЛЬНИЙ INSTANCE
+# ============================================================================
+
+redis_pool = RedisPool()
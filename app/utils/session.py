@@ -7,6 +7,10 @@ from typing import Dict, Any, Optional, List
 from datetime import datetime, timedelta
 from dataclasses import dataclass, asdict
 
+from app.utils.user_state_store import user_state, NS_SESSION, NS_CART
+from app.utils.cart_manager import cart_manager
+from app.utils.state_models import UserSession
+
 logger = logging.getLogger(__name__)
 
 # ============================================================================
@@ -31,129 +35,117 @@ ACHIEVEMENTS = {
 }
 
 # ============================================================================
-# Інкрементальне зберігання (для демо)
+# Зберігання
 # ============================================================================
 
-_USERS_DATA = {}  # user_id -> session_data
-_CARTS = {}  # user_id -> [items]
-_SESSIONS_EXPIRY = {}  # user_id -> expiry_time
+# Сесії - у спільному user state store (hash user:session:{user_id}, TTL 30 днів),
+# кошик - у CartManager, тому всі воркери бачать однаковий стан.
+# Витіснена сесія відновлюється з таблиці users (PostgreSQL) при наступному
+# зверненні - тільки якщо БД увімкнено (без неї - нова сесія, без скану аркуша).
 
 
 # ============================================================================
 # Session Manager Functions
 # ============================================================================
 
+def _load_session_from_orders(user_id: int) -> Optional[Dict[str, Any]]:
+    """Відновити витіснену сесію з агрегатів замовлень у PostgreSQL"""
+    from app.services.order_repository import order_repository
+    
+    summary = order_repository.get_user_order_summary(user_id)
+    if not summary:
+        return None
+    
+    session = UserSession(
+        user_id,
+        order_count=summary['order_count'],
+        total_spent=summary['total_spent'],
+        last_order_date=summary['last_order_date'],
+    )
+    if summary['first_order_date']:
+        session.created_at = summary['first_order_date']
+    return session.to_storage()
+
+
+def register_session_loader():
+    """Відновлювати сесії з БД (викликається при старті, якщо PostgreSQL увімкнено)"""
+    user_state.register_loader(NS_SESSION, _load_session_from_orders)
+
+
 def get_user_session(user_id: int, create_if_missing: bool = True) -> Dict[str, Any]:
-    """Отримати сесію користувача"""
-    
-    if user_id not in _USERS_DATA:
-        if create_if_missing:
-            _USERS_DATA[user_id] = {
-                'user_id': user_id,
-                'state': 'idle',
-                'order_count': 0,
-                'total_spent': 0.0,
-                'favorite_items': [],
-                'last_order_date': None,
-                'created_at': datetime.now().isoformat(),
-                'bonus_points': 0,
-                'promocodes_used': [],
-                'achievements': [],
-                'preferences': {},
-                'phone': None,
-                'address': None,
-            }
-        else:
-            return {}
+    """
+    Отримати сесію користувача
     
-    return _USERS_DATA[user_id]
+    Повертає копію - зміни зберігаються через update_user_session()
+    """
+    session = load_user_session(user_id, create_if_missing)
+    return session.to_dict() if session else {}
+
+
+def load_user_session(user_id: int, create_if_missing: bool = True) -> Optional[UserSession]:
+    """
+    Отримати сесію як UserSession
+    
+    У сховищі лежать тільки поля, що відрізняються від значень
+    за замовчуванням (UserSession.to_storage)
+    """
+    stored = user_state.get_all(NS_SESSION, user_id)
+    
+    if stored:
+        return UserSession.from_dict(stored, user_id=user_id)
+    
+    if not create_if_missing:
+        return None
+    
+    session = UserSession(user_id)
+    user_state.set_fields(NS_SESSION, user_id, session.to_storage())
+    return session
 
 
 def update_user_session(user_id: int, updates: Dict[str, Any]):
-    """Оновити сесію користувача"""
-    session = get_user_session(user_id)
-    session.update(updates)
-    _USERS_DATA[user_id] = session
+    """Оновити сесію користувача (записуються тільки змінені поля)"""
+    load_user_session(user_id)
+    user_state.set_fields(NS_SESSION, user_id, updates)
     
     logger.info(f"✅ Session updated for user {user_id}: {list(updates.keys())}")
 
 
-def get_user_cart(user_id: int) -> List[Dict[str, Any]]:
+async def get_user_cart(user_id: int) -> List[Dict[str, Any]]:
     """Отримати кошик користувача"""
-    if user_id not in _CARTS:
-        _CARTS[user_id] = []
-    
-    return _CARTS[user_id]
+    return await cart_manager.get_cart(user_id)
 
 
-def add_to_cart(user_id: int, item: Dict[str, Any]) -> bool:
-    """Додати товар до кошика"""
-    try:
-        cart = get_user_cart(user_id)
-        
-        # Перевіряємо чи товар уже в кошику
-        for cart_item in cart:
-            if cart_item.get('id') == item.get('id'):
-                # Збільшуємо кількість
-                cart_item['quantity'] = cart_item.get('quantity', 1) + item.get('quantity', 1)
-                logger.info(f"📦 Item {item.get('name')} quantity updated to {cart_item['quantity']}")
-                return True
-        
-        # Додаємо новий товар
-        cart.append(item)
-        _CARTS[user_id] = cart
-        
-        logger.info(f"✅ Item {item.get('name')} added to cart for user {user_id}")
-        return True
-    
-    except Exception as e:
-        logger.error(f"❌ Error adding to cart: {e}")
-        return False
+async def add_to_cart(user_id: int, item: Dict[str, Any]) -> bool:
+    """Додати товар до кошика (або збільшити кількість)"""
+    return await cart_manager.add_item(user_id, item)
 
 
-def remove_from_cart(user_id: int, item_id: str) -> bool:
+async def remove_from_cart(user_id: int, item_id: str) -> bool:
     """Видалити товар з кошика"""
-    try:
-        cart = get_user_cart(user_id)
-        cart = [item for item in cart if item.get('id') != item_id]
-        _CARTS[user_id] = cart
-        
-        logger.info(f"🗑️ Item {item_id} removed from cart")
-        return True
-    except Exception as e:
-        logger.error(f"❌ Error removing from cart: {e}")
+    if not await cart_manager.remove_item(user_id, item_id):
         return False
+    
+    logger.info(f"🗑️ Item {item_id} removed from cart")
+    return True
 
 
-def update_cart_item(user_id: int, item_id: str, quantity: int) -> bool:
+async def update_cart_item(user_id: int, item_id: str, quantity: int) -> bool:
     """Оновити кількість товару в кошику"""
-    try:
-        cart = get_user_cart(user_id)
-        
-        for item in cart:
-            if item.get('id') == item_id:
-                if quantity <= 0:
-                    remove_from_cart(user_id, item_id)
-                else:
-                    item['quantity'] = quantity
-                logger.info(f"📝 Item {item_id} quantity updated to {quantity}")
-                return True
-        
+    lines = await cart_manager.get_lines(user_id)
+    
+    if not any(str(line.item_id) == str(item_id) for line in lines):
         return False
-    except Exception as e:
-        logger.error(f"❌ Error updating cart: {e}")
+    
+    if not await cart_manager.update_quantity(user_id, item_id, quantity):
         return False
+    
+    logger.info(f"📝 Item {item_id} quantity updated to {quantity}")
+    return True
 
 
-def clear_user_cart(user_id: int) -> bool:
+async def clear_user_cart(user_id: int) -> bool:
     """Очистити кошик"""
-    try:
-        _CARTS[user_id] = []
-        logger.info(f"🗑️ Cart cleared for user {user_id}")
-        return True
-    except Exception as e:
-        logger.error(f"❌ Error clearing cart: {e}")
-        return False
+    return await cart_manager.clear_cart(user_id)
 
 
 # ============================================================================
@@ -404,20 +396,25 @@ def apply_referral(referrer_id: int, new_user_id: int) -> Dict[str, Any]:
 # ============================================================================
 
 def cleanup_expired_sessions(max_age_hours: int = 24 * 30):  # 30 днів
-    """Очистити застарілі сесії"""
+    """
+    Очистити застарілі сесії
+    
+    Неактивні сесії і так видаляються через TTL сховища;
+    тут прибираємо користувачів без замовлень раніше терміну.
+    """
     try:
         cutoff_date = (datetime.now() - timedelta(hours=max_age_hours)).isoformat()
         
-        expired = [
-            uid for uid, session in _USERS_DATA.items()
-            if session.get('last_order_date', '') < cutoff_date and 
-            session.get('order_count', 0) == 0
-        ]
+        expired = []
+        for uid in user_state.user_ids(NS_SESSION):
+            session = user_state.get_fields(NS_SESSION, uid, 'created_at', 'order_count')
+            if (session.get('created_at') or '') < cutoff_date and \
+                    session.get('order_count', 0) == 0:
+                expired.append(uid)
         
         for uid in expired:
-            del _USERS_DATA[uid]
-            if uid in _CARTS:
-                del _CARTS[uid]
+            user_state.delete(NS_SESSION, uid)
+            user_state.delete(NS_CART, uid)
         
         logger.info(f"🧹 Cleaned up {len(expired)} expired sessions")
         return len(expired)
@@ -433,9 +430,14 @@ def cleanup_expired_sessions(max_age_hours: int = 24 * 30):  # 30 днів
 
 def get_platform_stats() -> Dict[str, Any]:
     """Отримати глобальну статистику"""
-    active_users = len(_USERS_DATA)
-    total_orders = sum(u.get('order_count', 0) for u in _USERS_DATA.values())
-    total_revenue = sum(u.get('total_spent', 0) for u in _USERS_DATA.values())
+    sessions = [
+        user_state.get_fields(NS_SESSION, uid, 'order_count', 'total_spent')
+        for uid in user_state.user_ids(NS_SESSION)
+    ]
+    
+    active_users = len(sessions)
+    total_orders = sum(u.get('order_count', 0) for u in sessions)
+    total_revenue = sum(u.get('total_spent', 0) for u in sessions)
     
     return {
         'active_users': active_users,
@@ -451,6 +453,8 @@ def get_platform_stats() -> Dict[str, Any]:
 # ============================================================================
 
 if __name__ == "__main__":
+    import asyncio
+    
     print("=" * 60)
     print("🧪 TESTING SESSION MANAGER")
     print("=" * 60)
@@ -462,9 +466,9 @@ if __name__ == "__main__":
     
     # Тест 2: Додавання в кошик
     print("\n2️⃣ Додавання в кошик:")
-    add_to_cart(123, {'id': '1', 'name': 'Піца', 'price': 120, 'quantity': 2})
-    add_to_cart(123, {'id': '2', 'name': 'Cola', 'price': 30, 'quantity': 1})
-    cart = get_user_cart(123)
+    asyncio.run(add_to_cart(123, {'id': '1', 'name': 'Піца', 'price': 120, 'quantity': 2}))
+    asyncio.run(add_to_cart(123, {'id': '2', 'name': 'Cola', 'price': 30, 'quantity': 1}))
+    cart = asyncio.run(get_user_cart(123))
     print(f"✅ Cart items: {len(cart)}")
     
     # Тест 3: Реєстрація замовлення
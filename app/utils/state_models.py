@@ -0,0 +1,203 @@
+"""
+🧱 STATE MODELS - Компактні представлення стану користувача
+UserSession, CartLine та FsmEntry на __slots__ dataclasses
+
+Зберігаються тільки поля, що відрізняються від значень за замовчуванням,
+а рядок кошика - тільки (item_id, qty, price). Назва, категорія, фото
+підтягуються з menu_store під час відображення.
+
+Benchmark пам'яті: python -m app.utils.state_models
+"""
+from dataclasses import dataclass, field, fields
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+
+@dataclass(slots=True)
+class CartLine:
+    """Рядок кошика: ID товару, кількість та ціна на момент додавання"""
+    item_id: Any
+    qty: int = 1
+    price: float = 0.0
+
+    @property
+    def subtotal(self) -> float:
+        return self.price * self.qty
+
+    def to_row(self) -> list:
+        """Компактний формат для сховища: [item_id, qty, price]"""
+        return [self.item_id, self.qty, self.price]
+
+    @classmethod
+    def from_row(cls, row) -> 'CartLine':
+        """З [item_id, qty, price] або зі старого формату (повний dict товару)"""
+        if isinstance(row, dict):
+            return cls.from_item(row)
+        item_id, qty, price = row
+        return cls(item_id, int(qty), float(price))
+
+    @classmethod
+    def from_item(cls, item: Dict[str, Any]) -> 'CartLine':
+        """З dict товару (як його передають handlers)"""
+        try:
+            price = float(item.get('price', 0) or 0)
+        except (TypeError, ValueError):
+            price = 0.0
+        return cls(item.get('id'), int(item.get('quantity', 1)), price)
+
+    def to_display(self, menu_item: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Dict для відображення (lazy join з menu_store)
+
+        Args:
+            menu_item: Нормалізований товар з menu_store (або None)
+        """
+        menu_item = menu_item or {}
+        return {
+            'id': self.item_id,
+            'name': menu_item.get('name') or f"Товар #{self.item_id}",
+            'price': self.price,
+            'quantity': self.qty,
+            'category': menu_item.get('category', ''),
+            'restaurant': menu_item.get('restaurant', ''),
+        }
+
+
+@dataclass(slots=True)
+class UserSession:
+    """Сесія користувача (профіль, бонуси, досягнення)"""
+    user_id: int
+    state: str = 'idle'
+    order_count: int = 0
+    total_spent: float = 0.0
+    favorite_items: List[str] = field(default_factory=list)
+    last_order_date: Optional[str] = None
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    bonus_points: int = 0
+    promocodes_used: List[str] = field(default_factory=list)
+    achievements: List[str] = field(default_factory=list)
+    preferences: Dict[str, Any] = field(default_factory=dict)
+    phone: Optional[str] = None
+    address: Optional[str] = None
+    # Поля, яких немає в схемі (referred_users, challenge_progress, ...)
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], user_id: Optional[int] = None) -> 'UserSession':
+        known = {f.name for f in fields(cls)} - {'extra'}
+        kwargs = {k: v for k, v in data.items() if k in known}
+        if user_id is not None:
+            kwargs['user_id'] = user_id
+        session = cls(**kwargs)
+        session.extra = {k: v for k, v in data.items() if k not in known}
+        return session
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Повний dict (формат, який повертає get_user_session)"""
+        data = {f.name: getattr(self, f.name) for f in fields(self) if f.name != 'extra'}
+        data.update(self.extra)
+        return data
+
+    def to_storage(self) -> Dict[str, Any]:
+        """Тільки поля, що відрізняються від значень за замовчуванням"""
+        stored = {'user_id': self.user_id, 'created_at': self.created_at}
+        for f in fields(self):
+            if f.name in stored or f.name == 'extra':
+                continue
+            value = getattr(self, f.name)
+            default = f.default_factory() if callable(f.default_factory) else f.default
+            if value != default:
+                stored[f.name] = value
+        stored.update(self.extra)
+        return stored
+
+
+@dataclass(slots=True)
+class FsmEntry:
+    """Стан FSM користувача"""
+    state: str = 'idle'
+    data: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def is_default(self) -> bool:
+        return self.state == 'idle' and not self.data
+
+    def to_storage(self) -> Dict[str, Any]:
+        stored = {'state': self.state}
+        if self.data:
+            stored['data'] = self.data
+        return stored
+
+    @classmethod
+    def from_storage(cls, data: Dict[str, Any]) -> 'FsmEntry':
+        return cls(data.get('state') or 'idle', data.get('data') or {})
+
+
+# ============================================================================
+# BENCHMARK
+# ============================================================================
+
+if __name__ == "__main__":
+    import tracemalloc
+
+    USERS = 10_000
+
+    menu_item = {
+        'id': '1', 'name': 'Маргарита', 'price': 180.0, 'category': 'Піца',
+        'restaurant': 'FerrikPizza',
+        'description': 'Класична піца з томатами та моцарелою',
+        'photo_url': 'https://via.placeholder.com/300x200?text=Margherita',
+        'allergens': 'milk', 'rating': 4.8, 'mood_tags': ['calm', 'romantic', 'movie'],
+    }
+
+    def measure(build) -> float:
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        holder = [build(uid) for uid in range(USERS)]
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        total = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+        del holder
+        return total / USERS
+
+    def legacy_user(uid):
+        session = {
+            'user_id': uid, 'state': 'idle', 'order_count': 0, 'total_spent': 0.0,
+            'favorite_items': [], 'last_order_date': None,
+            'created_at': datetime.now().isoformat(), 'bonus_points': 0,
+            'promocodes_used': [], 'achievements': [], 'preferences': {},
+            'phone': None, 'address': None,
+        }
+        cart = [dict(menu_item, quantity=2), dict(menu_item, id='2', quantity=1)]
+        fsm = {'state': 'idle', 'data': {}}
+        return session, cart, fsm
+
+    def compact_user(uid):
+        session = UserSession(uid)
+        cart = [CartLine('1', 2, 180.0), CartLine('2', 1, 180.0)]
+        fsm = FsmEntry()
+        return session, cart, fsm
+
+    print("=" * 60)
+    print(f"🧪 MEMORY PER USER ({USERS} users, 2 cart lines)")
+    print("=" * 60)
+
+    legacy = measure(legacy_user)
+    compact = measure(compact_user)
+
+    print(f"dict session + full item copies: {legacy:8.0f} bytes/user")
+    print(f"slotted dataclasses:             {compact:8.0f} bytes/user")
+    print(f"saved:                           {100 * (1 - compact / legacy):7.1f}%")
+
+    # Розмір значень у сховищі (JSON-поля hash-у user state store)
+    import json
+
+    def stored_bytes(session: Dict, cart: list, fsm: Dict) -> int:
+        values = list(session.values()) + [cart] + list(fsm.values())
+        return sum(len(json.dumps(v, ensure_ascii=False).encode()) for v in values)
+
+    legacy_session, legacy_cart, legacy_fsm = legacy_user(1)
+    session, cart, fsm = compact_user(1)
+    print(f"stored values, legacy:           {stored_bytes(legacy_session, legacy_cart, legacy_fsm):8d} bytes/user")
+    print(f"stored values, compact:          "
+          f"{stored_bytes(session.to_storage(), [line.to_row() for line in cart], fsm.to_storage()):8d} bytes/user")
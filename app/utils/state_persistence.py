@@ -0,0 +1,117 @@
+"""
+💾 STATE PERSISTENCE - context.user_data у спільному user state store
+Telegram persistence, щоб кілька воркерів бачили однакові user_data
+"""
+
+import os
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from app.utils.user_state_store import UserStateStore, user_state, NS_USER_DATA
+
+logger = logging.getLogger(__name__)
+
+
+class StatePersistence(BasePersistence):
+    """
+    Persistence для python-telegram-bot поверх UserStateStore
+
+    - Зберігається тільки user_data (chat/bot/callback data не використовуються)
+    - get_user_data() нічого не завантажує наперед: дані конкретного
+      користувача підтягуються в refresh_user_data() перед кожним апдейтом
+    - Після кожного webhook-апдейту main.py викликає
+      application.update_persistence(), тож зміни одразу видно іншим воркерам,
+      і прибирає user_data користувача з пам'яті Application (PTB тримає
+      запис для кожного, хто колись писав боту) - пам'ять не росте
+      з кількістю користувачів
+    - Сховище синхронне (Redis-клієнт / in-memory), тому виклики йдуть
+      через asyncio.to_thread і не блокують event loop
+    """
+
+    def __init__(
+        self,
+        store: Optional[UserStateStore] = None,
+        update_interval: float = 60
+    ):
+        super().__init__(
+            store_data=PersistenceInput(
+                bot_data=False,
+                chat_data=False,
+                user_data=True,
+                callback_data=False
+            ),
+            update_interval=update_interval
+        )
+        self.store = store or user_state
+        logger.info(f"💾 user_data persistence: {self.store.backend}")
+
+    # ========================================================================
+    # USER DATA
+    # ========================================================================
+
+    async def get_user_data(self) -> Dict[int, Dict[Any, Any]]:
+        # Ліниве завантаження - див. refresh_user_data
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict[Any, Any]) -> None:
+        stored = await asyncio.to_thread(self.store.get_all, NS_USER_DATA, user_id)
+        user_data.clear()
+        user_data.update(stored)
+
+    async def update_user_data(self, user_id: int, data: Dict[Any, Any]) -> None:
+        mapping = {str(k): v for k, v in data.items()}
+        await asyncio.to_thread(self.store.replace, NS_USER_DATA, user_id, mapping)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        await asyncio.to_thread(self.store.delete, NS_USER_DATA, user_id)
+
+    # ========================================================================
+    # НЕ ВИКОРИСТОВУЮТЬСЯ (store_data вимикає їх)
+    # ========================================================================
+
+    async def get_chat_data(self) -> Dict[int, Dict[Any, Any]]:
+        return {}
+
+    async def get_bot_data(self) -> Dict[Any, Any]:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> Dict:
+        return {}
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        return None
+
+    async def update_chat_data(self, chat_id: int, data: Dict[Any, Any]) -> None:
+        return None
+
+    async def update_bot_data(self, data: Dict[Any, Any]) -> None:
+        return None
+
+    async def update_callback_data(self, data) -> None:
+        return None
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        return None
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict[Any, Any]) -> None:
+        return None
+
+    async def refresh_bot_data(self, bot_data: Dict[Any, Any]) -> None:
+        return None
+
+    async def flush(self) -> None:
+        # Кожен update_user_data пише одразу - буферу немає
+        return None
+
+
+def create_state_persistence() -> StatePersistence:
+    """Створити persistence для Application.builder()"""
+    return StatePersistence(
+        update_interval=float(os.getenv('PERSISTENCE_UPDATE_INTERVAL', '60'))
+    )
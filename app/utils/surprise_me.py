@@ -2,9 +2,194 @@
 🎁 SURPRISE ME - AI-КЕРОВАНИЙ СЮРПРИЗ З КОМБО ТА ЗНИЖКАМИ
 """
 
+import os
 import random
-from typing import List, Dict, Any
+import logging
+from typing import List, Dict, Any, Iterable, Optional, Tuple
 from app.utils.validators import calculate_total_price
+from app.services.menu_store import menu_store
+from app.utils.cache import menu_signature
+
+logger = logging.getLogger(__name__)
+
+# Множник ваги улюблених товарів користувача (1 + boost)
+SURPRISE_FAVORITE_BOOST = float(os.getenv('SURPRISE_FAVORITE_BOOST', '3'))
+
+
+# ============================================================================
+# ALIAS TABLE (Vose) - зважений вибір за O(1)
+# ============================================================================
+
+class AliasTable:
+    """Таблиця аліасів для ваг; будується за O(n) один раз"""
+    
+    __slots__ = ('prob', 'alias', 'total')
+    
+    def __init__(self, weights: List[float]):
+        n = len(weights)
+        self.total = float(sum(weights))
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+        if not n or self.total <= 0:
+            return
+        
+        scaled = [w * n / self.total for w in weights]
+        small = [i for i, w in enumerate(scaled) if w < 1.0]
+        large = [i for i, w in enumerate(scaled) if w >= 1.0]
+        
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.prob[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+        # Залишки (похибка float) - ймовірність 1
+    
+    def sample(self, rng: random.Random) -> int:
+        column = rng.randrange(len(self.prob))
+        return column if rng.random() < self.prob[column] else self.alias[column]
+
+
+# ============================================================================
+# ПУЛИ КАТЕГОРІЙ (один раз на знімок меню)
+# ============================================================================
+
+class SurprisePools:
+    """
+    Товари, розкладені по кошиках комбо, з alias-таблицями ваг
+    
+    Вага товару: (1 + рейтинг); недоступні (неактивні, без ціни)
+    не потрапляють у пули зовсім.
+    """
+    
+    # Порядок важливий: перший збіг визначає кошик
+    CATEGORY_KEYWORDS = (
+        ('main', ('піца', 'бургер', 'main', 'основне')),
+        ('salad', ('салат', 'salad')),
+        ('dessert', ('десерт', 'dessert', 'торт', 'кейк')),
+        ('drink', ('напій', 'drink', 'coffee', 'сік')),
+        ('appetizer', ('закуска', 'appetizer', 'starter')),
+    )
+    
+    def __init__(self, menu_items: List[Dict[str, Any]]):
+        self.items = [
+            item for item in menu_items
+            if item.get('active', True) and float(item.get('price') or 0) > 0
+        ]
+        self.buckets: Dict[str, List[Dict[str, Any]]] = {bucket: [] for bucket, _ in self.CATEGORY_KEYWORDS}
+        self.weights: Dict[str, List[float]] = {bucket: [] for bucket in self.buckets}
+        self.positions: Dict[str, Tuple[str, int]] = {}  # id/назва → (кошик, позиція)
+        
+        bucket_of_category: Dict[str, Optional[str]] = {}
+        for item in self.items:
+            category = str(item.get('category', '')).lower()
+            if category not in bucket_of_category:
+                bucket_of_category[category] = next(
+                    (bucket for bucket, keywords in self.CATEGORY_KEYWORDS
+                     if any(keyword in category for keyword in keywords)),
+                    None
+                )
+            bucket = bucket_of_category[category]
+            if bucket is None:
+                continue
+            
+            position = len(self.buckets[bucket])
+            self.buckets[bucket].append(item)
+            self.weights[bucket].append(1.0 + float(item.get('rating') or 0))
+            self.positions[str(item.get('id'))] = (bucket, position)
+            self.positions.setdefault(str(item.get('name', '')).lower(), (bucket, position))
+        
+        self.tables = {bucket: AliasTable(weights) for bucket, weights in self.weights.items()}
+        self.all_table = AliasTable([1.0 + float(item.get('rating') or 0) for item in self.items])
+    
+    def favorite_positions(self, user_favorites: Optional[Iterable[str]]) -> Dict[str, List[int]]:
+        """Улюблені (id або назви) → позиції в кошиках"""
+        found: Dict[str, List[int]] = {}
+        for favorite in user_favorites or ():
+            key = str(favorite)
+            located = self.positions.get(key) or self.positions.get(key.lower())
+            if located and located[1] not in found.get(located[0], ()):
+                found.setdefault(located[0], []).append(located[1])
+        return found
+    
+    def _draw(self, bucket: str, favorites: List[int], rng: random.Random) -> int:
+        """
+        Одна позиція з ваг w * (1 + boost для улюблених)
+        
+        Суміш: базова alias-таблиця (вага W) або улюблені пропорційно
+        w (вага boost * F) - точно той самий розподіл без перебудови таблиці.
+        """
+        table = self.tables[bucket]
+        if favorites:
+            weights = self.weights[bucket]
+            favorite_total = SURPRISE_FAVORITE_BOOST * sum(weights[position] for position in favorites)
+            if rng.random() * (table.total + favorite_total) >= table.total:
+                point = rng.random() * favorite_total / SURPRISE_FAVORITE_BOOST
+                for position in favorites:
+                    point -= weights[position]
+                    if point < 0:
+                        return position
+                return favorites[-1]
+        return table.sample(rng)
+    
+    def sample(self, bucket: str, count: int, favorites: List[int], rng: random.Random) -> List[Dict[str, Any]]:
+        """count різних товарів кошика (зважено)"""
+        items = self.buckets[bucket]
+        if len(items) <= count:
+            return rng.sample(items, len(items))
+        
+        chosen: List[int] = []
+        for _ in range(count * 8):  # Повтори відкидаються; кошики невеликі
+            position = self._draw(bucket, favorites, rng)
+            if position not in chosen:
+                chosen.append(position)
+                if len(chosen) == count:
+                    break
+        return [items[position] for position in chosen]
+    
+    def sample_any(self, count: int, exclude: List[Dict[str, Any]], rng: random.Random) -> List[Dict[str, Any]]:
+        """Добір з усього меню (якщо кошиків комбо не вистачило)"""
+        taken = {id(item) for item in exclude}
+        found = []
+        for _ in range(count * 8):
+            if len(found) == count or not self.items:
+                break
+            item = self.items[self.all_table.sample(rng)]
+            if id(item) not in taken:
+                taken.add(id(item))
+                found.append(item)
+        return found
+
+
+_store_pools: Optional[SurprisePools] = None
+_adhoc_pools: Tuple[Any, Optional[SurprisePools]] = (None, None)
+
+
+def _on_menu_change(store):
+    global _store_pools
+    _store_pools = SurprisePools(store.get_items())
+
+
+menu_store.add_listener(_on_menu_change)
+
+
+def get_surprise_pools(menu_items: Optional[List[Dict[str, Any]]] = None) -> SurprisePools:
+    """
+    Пули для меню: без аргументу - поточний знімок menu_store
+    (перебудова тільки при зміні версії), інакше - кеш по сигнатурі списку
+    """
+    global _store_pools, _adhoc_pools
+    if menu_items is None:
+        menu_store.ensure_fresh()  # Нова версія → listener у фоновому потоці
+        if _store_pools is None:
+            _store_pools = SurprisePools(menu_store.get_items())
+        return _store_pools
+    
+    signature = menu_signature(menu_items)
+    if _adhoc_pools[0] != signature:
+        _adhoc_pools = (signature, SurprisePools(menu_items))
+    return _adhoc_pools[1]
+
 
 class SurpriseMe:
     """AI-сюрприз для користувачів"""
@@ -36,17 +221,19 @@ class SurpriseMe:
     
     @staticmethod
     def generate_surprise(
-        menu_items: List[Dict[str, Any]],
+        menu_items: Optional[List[Dict[str, Any]]],
         user_order_count: int,
-        user_favorites: List[str] = None
+        user_favorites: List[str] = None,
+        rng: Optional[random.Random] = None
     ) -> Dict[str, Any]:
         """
         Генерація сюрпризу
         
         Args:
-            menu_items: Список товарів з меню
+            menu_items: Список товарів з меню (None - поточне меню menu_store)
             user_order_count: Кількість замовлень користувача
-            user_favorites: Улюблені товари користувача
+            user_favorites: Улюблені товари користувача (id або назви) - частіше у виборі
+            rng: Генератор випадкових чисел (для батчів/відтворюваності)
         
         Returns:
             Dict з сюрпризом:
@@ -61,7 +248,53 @@ class SurpriseMe:
             }
         """
         
-        if not menu_items or len(menu_items) < 3:
+        pools = get_surprise_pools(menu_items)
+        return SurpriseMe._surprise_from_pools(
+            pools, user_order_count, pools.favorite_positions(user_favorites), rng or random
+        )
+    
+    @staticmethod
+    def generate_batch(
+        users: Iterable[Tuple[int, int, Optional[List[str]]]],
+        menu_items: Optional[List[Dict[str, Any]]] = None,
+        seed: Optional[int] = None
+    ) -> Dict[int, Dict[str, Any]]:
+        """
+        Сюрпризи для багатьох користувачів (push-кампанія)
+        
+        Пули та alias-таблиці беруться один раз на весь батч,
+        на користувача - лише пошук улюблених і O(1) вибірки.
+        
+        Args:
+            users: (user_id, user_order_count, user_favorites)
+            menu_items: Меню (None - поточне меню menu_store)
+            seed: Зерно генератора (відтворюваний батч)
+        
+        Returns:
+            {user_id: сюрприз}; користувачі без сюрпризу пропускаються
+        """
+        pools = get_surprise_pools(menu_items)
+        rng = random.Random(seed)
+        
+        surprises = {}
+        for user_id, order_count, favorites in users:
+            surprise = SurpriseMe._surprise_from_pools(
+                pools, order_count, pools.favorite_positions(favorites), rng
+            )
+            if surprise:
+                surprises[user_id] = surprise
+        
+        logger.info(f"🎁 Surprise batch: {len(surprises)} surprises")
+        return surprises
+    
+    @staticmethod
+    def _surprise_from_pools(
+        pools: SurprisePools,
+        user_order_count: int,
+        favorites: Dict[str, List[int]],
+        rng
+    ) -> Optional[Dict[str, Any]]:
+        if len(pools.items) < 3:
             return None
         
         # Визначаємо рівень знижки
@@ -72,49 +305,22 @@ class SurpriseMe:
         else:
             discount_range = SurpriseMe.DISCOUNT_RANGES['standard']
         
-        discount = random.randint(*discount_range)
-        
-        # Категоризуємо товари
-        categories = {
-            'main': [],
-            'salad': [],
-            'dessert': [],
-            'drink': [],
-            'appetizer': [],
-        }
-        
-        for item in menu_items:
-            cat = item.get('category', '').lower()
-            
-            if any(x in cat for x in ['піца', 'бургер', 'main', 'основне']):
-                categories['main'].append(item)
-            elif any(x in cat for x in ['салат', 'salad']):
-                categories['salad'].append(item)
-            elif any(x in cat for x in ['десерт', 'dessert', 'торт', 'кейк']):
-                categories['dessert'].append(item)
-            elif any(x in cat for x in ['напій', 'drink', 'coffee', 'сік']):
-                categories['drink'].append(item)
-            elif any(x in cat for x in ['закуска', 'appetizer', 'starter']):
-                categories['appetizer'].append(item)
+        discount = rng.randint(*discount_range)
         
         # Вибираємо структуру комбо
-        combo_structure = random.choice(SurpriseMe.COMBO_STRUCTURES)
+        combo_structure = rng.choice(SurpriseMe.COMBO_STRUCTURES)
         
-        # Формуємо комбо
+        # Формуємо комбо (зважено, з готових пулів)
         surprise_items = []
         for category, count in combo_structure.items():
             if category != 'desc':
-                if category in categories and len(categories[category]) > 0:
-                    items = random.sample(
-                        categories[category],
-                        min(count, len(categories[category]))
-                    )
-                    surprise_items.extend(items)
+                surprise_items.extend(pools.sample(category, count, favorites.get(category, []), rng))
         
         # Якщо не вистачає - додаємо з усіх
         if len(surprise_items) < 2:
-            remaining = random.sample(menu_items, min(2, len(menu_items)))
-            surprise_items.extend(remaining)
+            surprise_items.extend(pools.sample_any(2, surprise_items, rng))
+        
+        surprise_items = surprise_items[:3]  # Максимум 3 товари
         
         # Розраховуємо вартість
         total_original = calculate_total_price([{'price': item['price'], 'quantity': 1} for item in surprise_items])
@@ -122,12 +328,12 @@ class SurpriseMe:
         saved = total_original - total_discounted
         
         return {
-            'items': surprise_items[:3],  # Максимум 3 товари
+            'items': surprise_items,
             'discount': discount,
             'total_original': round(total_original, 2),
             'total_discounted': round(total_discounted, 2),
             'saved': round(saved, 2),
-            'message': random.choice(SurpriseMe.SURPRISE_MESSAGES),
+            'message': rng.choice(SurpriseMe.SURPRISE_MESSAGES),
             'combo_name': combo_structure['desc']
         }
     
@@ -0,0 +1,620 @@
+"""
+🗄️ USER STATE STORE - Єдине сховище стану користувачів
+Сесії, FSM, кошик, статистика та context.user_data в одному місці
+(Redis hash-per-user або in-memory для розробки)
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from app.config import AppConfig
+from app.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Try to import Redis
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+# ============================================================================
+# NAMESPACES
+# ============================================================================
+
+NS_SESSION = 'session'      # app.utils.session - профіль, бонуси, досягнення
+NS_FSM = 'fsm'              # app.utils.fsm_manager - стан та дані стану
+NS_CART = 'cart'            # app.utils.cart_manager - товари кошика
+NS_STATS = 'stats'          # app.utils.warm_greetings - статистика замовлень
+NS_USER_DATA = 'user_data'  # context.user_data (через StatePersistence)
+
+DAY = 86400
+
+# Ковзний TTL: оновлюється при кожному записі
+NAMESPACE_TTLS = {
+    NS_SESSION: 30 * DAY,
+    NS_FSM: int(os.getenv('FSM_STATE_TTL', '3600')),
+    NS_CART: DAY,
+    NS_STATS: 180 * DAY,
+    NS_USER_DATA: 30 * DAY,
+}
+
+KEY_PREFIX = 'user'
+
+# In-memory: бюджет пам'яті (idle timeout = SESSION_TIMEOUT з AppConfig)
+IDLE_TIMEOUT = int(os.getenv('SESSION_TIMEOUT', str(AppConfig.session_timeout)))
+# Idle timeout тільки для стану, який не шкода втратити (діалог починається
+# заново); сесія, статистика і кошик живуть свій TTL і витісняються лише LRU
+IDLE_NAMESPACES = frozenset({NS_FSM, NS_USER_DATA})
+MAX_ENTRIES = int(os.getenv('USER_STATE_MAX_ENTRIES', '50000'))
+SWEEP_INTERVAL = float(os.getenv('USER_STATE_SWEEP_INTERVAL', '60'))
+# Скільки пам'ятати, що loader нічого не знайшов (новий користувач без замовлень)
+REHYDRATE_MISS_TTL = int(os.getenv('USER_STATE_MISS_TTL', '3600'))
+REHYDRATE_MISS_MAX = int(os.getenv('USER_STATE_MISS_MAX', '50000'))
+
+# Loader відновлює стан з постійного сховища: user_id -> dict або None
+StateLoader = Callable[[int], Optional[Dict[str, Any]]]
+
+
+def _encode(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def _decode(raw: Optional[str]) -> Any:
+    if raw is None:
+        return None
+    try:
+        return json.loads(raw)
+    except (TypeError, ValueError):
+        return raw
+
+
+class UserStateStore:
+    """
+    Базове сховище стану: один hash на користувача в кожному namespace
+
+    Ключ: user:{namespace}:{user_id}
+    Поля: JSON-серіалізовані значення (кожне поле окремо), тому
+    часткові оновлення не перезаписують весь стан.
+
+    Всі значення повертаються як копії - зміни треба зберігати
+    через set_fields(), як і з Redis.
+
+    Якщо для namespace зареєстрований loader, стан, який протермінувався
+    або був витіснений, ліниво відновлюється з постійного сховища.
+    Порожній результат loader запам'ятовується на REHYDRATE_MISS_TTL
+    (до першого запису), тому новий користувач не викликає loader
+    на кожне звернення.
+    """
+
+    backend = 'base'
+
+    def __init__(self, ttls: Optional[Dict[str, int]] = None):
+        self.ttls = dict(NAMESPACE_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self._loaders: Dict[str, StateLoader] = {}
+        # (namespace, user_id) -> час, до якого loader не викликається
+        self._misses: "OrderedDict[tuple, float]" = OrderedDict()
+        self._misses_lock = threading.Lock()
+
+    def register_loader(self, namespace: str, loader: StateLoader):
+        """Зареєструвати відновлення стану namespace з постійного сховища"""
+        self._loaders[namespace] = loader
+
+    def _rehydrate(self, namespace: str, user_id: int) -> Dict[str, Any]:
+        """Відновити витіснений стан через loader (порожній dict якщо нічого)"""
+        loader = self._loaders.get(namespace)
+        if loader is None:
+            return {}
+
+        miss_key = (namespace, user_id)
+        with self._misses_lock:
+            expires_at = self._misses.get(miss_key)
+            if expires_at is not None:
+                if expires_at > time.time():
+                    return {}
+                del self._misses[miss_key]
+
+        try:
+            restored = loader(user_id)
+        except Exception as e:
+            logger.error(f"❌ State rehydrate error ({namespace}:{user_id}): {e}")
+            return {}
+
+        if not restored:
+            self._remember_miss(miss_key)
+            return {}
+
+        self.set_fields(namespace, user_id, restored)
+        metrics.inc('user_state_rehydrated', namespace=namespace)
+        logger.info(f"♻️ Rehydrated {namespace} state for user {user_id}")
+        return restored
+
+    def _remember_miss(self, miss_key: tuple):
+        with self._misses_lock:
+            self._misses[miss_key] = time.time() + REHYDRATE_MISS_TTL
+            self._misses.move_to_end(miss_key)
+            while len(self._misses) > REHYDRATE_MISS_MAX:
+                self._misses.popitem(last=False)
+
+    def _forget_miss(self, namespace: str, user_id: int):
+        if self._misses:
+            with self._misses_lock:
+                self._misses.pop((namespace, user_id), None)
+
+    @staticmethod
+    def make_key(namespace: str, user_id: int) -> str:
+        return f"{KEY_PREFIX}:{namespace}:{user_id}"
+
+    def ttl_for(self, namespace: str) -> Optional[int]:
+        return self.ttls.get(namespace)
+
+    # ========================================================================
+    # ПРИМІТИВИ (реалізуються в підкласах, працюють з сирими рядками)
+    # ========================================================================
+
+    def _hgetall(self, key: str) -> Dict[str, str]:
+        raise NotImplementedError
+
+    def _hmget(self, key: str, fields: List[str]) -> List[Optional[str]]:
+        raise NotImplementedError
+
+    def _exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def _hset(self, key: str, mapping: Dict[str, str], ttl: Optional[int]):
+        raise NotImplementedError
+
+    def _hreplace(self, key: str, mapping: Dict[str, str], ttl: Optional[int]):
+        raise NotImplementedError
+
+    def _hdel(self, key: str, fields: List[str]):
+        raise NotImplementedError
+
+    def _delete(self, key: str):
+        raise NotImplementedError
+
+    def _scan_keys(self, prefix: str) -> Iterable[str]:
+        raise NotImplementedError
+
+    # ========================================================================
+    # ПУБЛІЧНИЙ API
+    # ========================================================================
+
+    def get_all(self, namespace: str, user_id: int) -> Dict[str, Any]:
+        """Отримати всі поля стану користувача ({} якщо стану немає)"""
+        try:
+            raw = self._hgetall(self.make_key(namespace, user_id))
+        except Exception as e:
+            logger.error(f"❌ State read error ({namespace}:{user_id}): {e}")
+            return {}
+
+        if not raw:
+            return self._rehydrate(namespace, user_id)
+
+        return {field: _decode(value) for field, value in raw.items()}
+
+    def get_fields(self, namespace: str, user_id: int, *fields: str) -> Dict[str, Any]:
+        """Отримати кілька полів одним викликом (відсутні поля пропускаються)"""
+        if not fields:
+            return {}
+        try:
+            values = self._hmget(self.make_key(namespace, user_id), list(fields))
+        except Exception as e:
+            logger.error(f"❌ State read error ({namespace}:{user_id}): {e}")
+            return {}
+
+        if (all(value is None for value in values)
+                and namespace in self._loaders
+                and not self._exists(self.make_key(namespace, user_id))):
+            restored = self._rehydrate(namespace, user_id)
+            return {field: restored[field] for field in fields if field in restored}
+
+        return {
+            field: _decode(value)
+            for field, value in zip(fields, values)
+            if value is not None
+        }
+
+    def get_field(self, namespace: str, user_id: int, field: str, default: Any = None) -> Any:
+        """Отримати одне поле"""
+        return self.get_fields(namespace, user_id, field).get(field, default)
+
+    def set_fields(self, namespace: str, user_id: int, mapping: Dict[str, Any]) -> bool:
+        """Записати кілька полів і оновити TTL одним викликом"""
+        if not mapping:
+            return True
+        try:
+            encoded = {field: _encode(value) for field, value in mapping.items()}
+            self._hset(self.make_key(namespace, user_id), encoded, self.ttl_for(namespace))
+            self._forget_miss(namespace, user_id)
+            return True
+        except Exception as e:
+            logger.error(f"❌ State write error ({namespace}:{user_id}): {e}")
+            return False
+
+    def set_field(self, namespace: str, user_id: int, field: str, value: Any) -> bool:
+        """Записати одне поле"""
+        return self.set_fields(namespace, user_id, {field: value})
+
+    def replace(self, namespace: str, user_id: int, mapping: Dict[str, Any]) -> bool:
+        """Повністю замінити стан (поля, яких немає в mapping, видаляються)"""
+        try:
+            key = self.make_key(namespace, user_id)
+            if not mapping:
+                self._delete(key)
+                return True
+            encoded = {field: _encode(value) for field, value in mapping.items()}
+            self._hreplace(key, encoded, self.ttl_for(namespace))
+            self._forget_miss(namespace, user_id)
+            return True
+        except Exception as e:
+            logger.error(f"❌ State write error ({namespace}:{user_id}): {e}")
+            return False
+
+    def delete_fields(self, namespace: str, user_id: int, *fields: str) -> bool:
+        """Видалити окремі поля"""
+        if not fields:
+            return True
+        try:
+            self._hdel(self.make_key(namespace, user_id), list(fields))
+            return True
+        except Exception as e:
+            logger.error(f"❌ State delete error ({namespace}:{user_id}): {e}")
+            return False
+
+    def delete(self, namespace: str, user_id: int) -> bool:
+        """Видалити весь стан користувача в namespace"""
+        try:
+            self._delete(self.make_key(namespace, user_id))
+            return True
+        except Exception as e:
+            logger.error(f"❌ State delete error ({namespace}:{user_id}): {e}")
+            return False
+
+    def user_ids(self, namespace: str) -> List[int]:
+        """ID користувачів, які мають стан у namespace (для адмін-статистики)"""
+        prefix = f"{KEY_PREFIX}:{namespace}:"
+        ids = []
+        try:
+            for key in self._scan_keys(prefix):
+                try:
+                    ids.append(int(key[len(prefix):]))
+                except ValueError:
+                    continue
+        except Exception as e:
+            logger.error(f"❌ State scan error ({namespace}): {e}")
+        return ids
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика сховища"""
+        return {'backend': self.backend}
+
+
+# ============================================================================
+# IN-MEMORY
+# ============================================================================
+
+class InMemoryUserStateStore(UserStateStore):
+    """
+    In-memory реалізація (один процес, для розробки та fallback)
+
+    Зберігає ті самі JSON-рядки, що й Redis, щоб поведінка
+    (копії значень, TTL) була однаковою.
+
+    Бюджет пам'яті:
+    - idle_timeout: запис FSM / user_data без запису довше за таймаут
+      видаляється (ефективний TTL = min(TTL namespace, idle_timeout));
+      інші namespace живуть свій TTL, як у Redis
+    - TTL і LRU-позиція оновлюються тільки записом (читання, зокрема
+      адмін-скани всіх користувачів, їх не продовжують - як у Redis)
+    - max_entries: жорсткий ліміт записів, понад нього - LRU витіснення
+    - фоновий sweeper прибирає протерміновані записи
+    - gauges user_state_entries / user_state_bytes (оцінка)
+    """
+
+    backend = 'memory'
+
+    # Приблизний overhead запису: hash dict + вузол OrderedDict + expiry
+    ENTRY_OVERHEAD = 400
+
+    def __init__(
+        self,
+        ttls: Optional[Dict[str, int]] = None,
+        idle_timeout: Optional[int] = IDLE_TIMEOUT,
+        max_entries: int = MAX_ENTRIES
+    ):
+        super().__init__(ttls)
+        self.idle_timeout = idle_timeout
+        self.max_entries = max_entries
+
+        self._lock = threading.RLock()
+        self._data: "OrderedDict[str, Dict[str, str]]" = OrderedDict()  # LRU: старі спочатку
+        self._expires: Dict[str, float] = {}
+        self._sizes: Dict[str, int] = {}
+        self._bytes = 0
+
+        self._sweeper: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    # ========================================================================
+    # БЮДЖЕТ ПАМ'ЯТІ
+    # ========================================================================
+
+    def _namespace_of(self, key: str) -> str:
+        return key.split(':', 2)[1]
+
+    def _effective_ttl(self, key: str) -> Optional[float]:
+        namespace = self._namespace_of(key)
+        ttl = self.ttl_for(namespace)
+        idle = self.idle_timeout if namespace in IDLE_NAMESPACES else None
+        limits = [value for value in (ttl, idle) if value]
+        return min(limits) if limits else None
+
+    def _estimate_size(self, key: str, data: Dict[str, str]) -> int:
+        size = self.ENTRY_OVERHEAD + sys.getsizeof(key)
+        for field, value in data.items():
+            size += sys.getsizeof(field) + sys.getsizeof(value)
+        return size
+
+    def _account(self, key: str):
+        """Перерахувати розмір запису після зміни (під lock)"""
+        size = self._estimate_size(key, self._data[key])
+        self._bytes += size - self._sizes.get(key, 0)
+        self._sizes[key] = size
+
+    def _remove(self, key: str, reason: Optional[str] = None):
+        """Видалити запис і оновити облік (під lock)"""
+        if self._data.pop(key, None) is None:
+            return
+        self._expires.pop(key, None)
+        self._bytes -= self._sizes.pop(key, 0)
+        if reason:
+            metrics.inc('user_state_evicted', reason=reason)
+
+    def _touch(self, key: str):
+        """Оновити LRU-позицію та ковзний TTL при записі (під lock)"""
+        self._data.move_to_end(key)
+        ttl = self._effective_ttl(key)
+        if ttl:
+            self._expires[key] = time.time() + ttl
+        else:
+            self._expires.pop(key, None)
+
+    def _alive(self, key: str) -> Optional[Dict[str, str]]:
+        """Отримати hash, якщо він не протермінований (під lock; без _touch)"""
+        data = self._data.get(key)
+        if data is None:
+            return None
+
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at <= time.time():
+            self._remove(key, reason='idle')
+            return None
+
+        return data
+
+    def _enforce_cap(self):
+        """LRU витіснення понад max_entries (під lock)"""
+        while self.max_entries and len(self._data) > self.max_entries:
+            oldest = next(iter(self._data))
+            self._remove(oldest, reason='lru')
+
+    def _publish_gauges(self):
+        metrics.set_gauge('user_state_entries', len(self._data))
+        metrics.set_gauge('user_state_bytes', self._bytes)
+
+    def sweep(self) -> int:
+        """Видалити всі протерміновані записи; повертає кількість видалених"""
+        now = time.time()
+        with self._lock:
+            expired = [key for key, expires_at in self._expires.items() if expires_at <= now]
+            for key in expired:
+                self._remove(key, reason='idle')
+            self._publish_gauges()
+
+        if expired:
+            logger.info(f"🧹 User state sweep: evicted {len(expired)} idle entries")
+        return len(expired)
+
+    def start_sweeper(self, interval: float = SWEEP_INTERVAL):
+        """Запустити фоновий sweeper (daemon thread)"""
+        if self._sweeper and self._sweeper.is_alive():
+            return
+
+        def run():
+            while not self._stop_event.wait(interval):
+                try:
+                    self.sweep()
+                except Exception as e:
+                    logger.error(f"❌ User state sweep error: {e}")
+
+        self._stop_event.clear()
+        self._sweeper = threading.Thread(target=run, name='user-state-sweeper', daemon=True)
+        self._sweeper.start()
+        logger.info(f"🧹 User state sweeper started (every {interval:.0f}s)")
+
+    def stop_sweeper(self):
+        """Зупинити фоновий sweeper"""
+        self._stop_event.set()
+
+    # ========================================================================
+    # ПРИМІТИВИ
+    # ========================================================================
+
+    def _hgetall(self, key: str) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._alive(key) or {})
+
+    def _hmget(self, key: str, fields: List[str]) -> List[Optional[str]]:
+        with self._lock:
+            data = self._alive(key) or {}
+            return [data.get(field) for field in fields]
+
+    def _exists(self, key: str) -> bool:
+        with self._lock:
+            return self._alive(key) is not None
+
+    def _hset(self, key: str, mapping: Dict[str, str], ttl: Optional[int]):
+        with self._lock:
+            data = self._alive(key)
+            if data is None:
+                data = self._data[key] = {}
+            data.update(mapping)
+            self._touch(key)
+            self._account(key)
+            self._enforce_cap()
+
+    def _hreplace(self, key: str, mapping: Dict[str, str], ttl: Optional[int]):
+        with self._lock:
+            self._data[key] = dict(mapping)
+            self._touch(key)
+            self._account(key)
+            self._enforce_cap()
+
+    def _hdel(self, key: str, fields: List[str]):
+        with self._lock:
+            data = self._alive(key)
+            if data is None:
+                return
+            for field in fields:
+                data.pop(field, None)
+            if data:
+                self._account(key)
+            else:
+                self._remove(key)
+
+    def _delete(self, key: str):
+        with self._lock:
+            self._remove(key)
+
+    def _scan_keys(self, prefix: str) -> Iterable[str]:
+        now = time.time()
+        with self._lock:
+            return [
+                key for key in self._data
+                if key.startswith(prefix) and self._expires.get(key, now + 1) > now
+            ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._publish_gauges()
+            return {
+                'backend': self.backend,
+                'entries': len(self._data),
+                'estimated_bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'idle_timeout': self.idle_timeout
+            }
+
+
+# ============================================================================
+# REDIS
+# ============================================================================
+
+class RedisUserStateStore(UserStateStore):
+    """
+    Redis реалізація - спільний стан для всіх воркерів
+
+    Записи йдуть одним pipeline (HSET + EXPIRE), читання -
+    HGETALL / HMGET, тому кожна операція - один round-trip.
+    """
+
+    backend = 'redis'
+
+    def __init__(self, client, ttls: Optional[Dict[str, int]] = None):
+        super().__init__(ttls)
+        self.redis_client = client
+
+    def _hgetall(self, key: str) -> Dict[str, str]:
+        return self.redis_client.hgetall(key)
+
+    def _hmget(self, key: str, fields: List[str]) -> List[Optional[str]]:
+        return self.redis_client.hmget(key, fields)
+
+    def _exists(self, key: str) -> bool:
+        return bool(self.redis_client.exists(key))
+
+    def _hset(self, key: str, mapping: Dict[str, str], ttl: Optional[int]):
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.hset(key, mapping=mapping)
+        if ttl:
+            pipe.expire(key, ttl)
+        pipe.execute()
+
+    def _hreplace(self, key: str, mapping: Dict[str, str], ttl: Optional[int]):
+        # MULTI/EXEC - інші воркери не побачать проміжний порожній hash
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.delete(key)
+        pipe.hset(key, mapping=mapping)
+        if ttl:
+            pipe.expire(key, ttl)
+        pipe.execute()
+
+    def _hdel(self, key: str, fields: List[str]):
+        self.redis_client.hdel(key, *fields)
+
+    def _delete(self, key: str):
+        self.redis_client.delete(key)
+
+    def _scan_keys(self, prefix: str) -> Iterable[str]:
+        return self.redis_client.scan_iter(match=f"{prefix}*", count=500)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {'backend': self.backend}
+        try:
+            stats['redis_keys'] = self.redis_client.dbsize()
+        except Exception as e:
+            stats['error'] = str(e)
+        return stats
+
+
+# ============================================================================
+# FACTORY
+# ============================================================================
+
+def create_user_state_store(redis_url: Optional[str] = None) -> UserStateStore:
+    """
+    Створити сховище: Redis якщо доступний, інакше in-memory
+
+    Args:
+        redis_url: URL Redis (за замовчуванням REDIS_URL)
+    """
+    redis_url = redis_url or os.getenv('REDIS_URL')
+
+    if redis_url and REDIS_AVAILABLE:
+        try:
+            client = redis.from_url(
+                redis_url,
+                decode_responses=True,
+                socket_connect_timeout=5,
+                socket_timeout=5
+            )
+            client.ping()
+            logger.info("✅ Redis connected for user state")
+            return RedisUserStateStore(client)
+        except Exception as e:
+            logger.warning(f"⚠️ Redis connection failed: {e}, using in-memory user state")
+    elif not REDIS_AVAILABLE:
+        logger.info("💾 Using in-memory user state (Redis not installed)")
+    else:
+        logger.info("💾 Using in-memory user state (REDIS_URL not set)")
+
+    store = InMemoryUserStateStore()
+    store.start_sweeper()
+    return store
+
+
+# ============================================================================
+# ГЛОБАЛЬНИЙ INSTANCE
+# ============================================================================
+
+user_state = create_user_state_store()
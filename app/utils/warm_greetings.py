@@ -7,11 +7,46 @@ import logging
 from datetime import datetime, timedelta
 from typing import Dict, Optional, List
 
+from app.utils.user_state_store import user_state, NS_STATS
+
 logger = logging.getLogger(__name__)
 
-# Temporary in-memory storage
-# TODO: Replace with Google Sheets integration
-_user_stats_cache = {}
+# Stats live in the shared user state store (hash user:stats:{user_id});
+# evicted/expired stats are rebuilt from the PostgreSQL users table on next
+# access (only when the DB is enabled - no Sheets scan per user)
+
+
+def _load_stats_from_orders(user_id: int) -> Optional[Dict]:
+    """
+    Rebuild user statistics from order aggregates in PostgreSQL
+    
+    Args:
+        user_id: Telegram user ID
+        
+    Returns:
+        dict: Restored stats or None if user has no orders
+    """
+    from app.services.order_repository import order_repository
+    
+    summary = order_repository.get_user_order_summary(user_id)
+    if not summary:
+        return None
+    
+    now = datetime.now().isoformat()
+    return {
+        'order_count': summary['order_count'],
+        'total_spent': summary['total_spent'],
+        'last_order_date': summary['last_order_date'],
+        'favorite_category': None,
+        'is_vip': summary['order_count'] >= 5 or summary['total_spent'] >= 1000,
+        'registration_date': summary['first_order_date'] or now,
+        'last_login': now
+    }
+
+
+def register_stats_loader():
+    """Rebuild stats from the DB (called on startup when PostgreSQL is enabled)"""
+    user_state.register_loader(NS_STATS, _load_stats_from_orders)
 
 
 def get_user_stats(user_id: int) -> Dict:
@@ -31,14 +66,16 @@ def get_user_stats(user_id: int) -> Dict:
             - registration_date: First interaction date
             - last_login: Last bot interaction
     """
-    if user_id in _user_stats_cache:
-        stats = _user_stats_cache[user_id]
+    now = datetime.now().isoformat()
+    stats = user_state.get_all(NS_STATS, user_id)
+    
+    if stats:
         # Update last login
-        stats['last_login'] = datetime.now().isoformat()
+        stats['last_login'] = now
+        user_state.set_field(NS_STATS, user_id, 'last_login', now)
         return stats
     
     # Default stats for new user
-    now = datetime.now().isoformat()
     stats = {
         'order_count': 0,
         'total_spent': 0.0,
@@ -49,7 +86,7 @@ def get_user_stats(user_id: int) -> Dict:
         'last_login': now
     }
     
-    _user_stats_cache[user_id] = stats
+    user_state.set_fields(NS_STATS, user_id, stats)
     logger.info(f"📊 Created new user stats for {user_id}")
     return stats
 
@@ -87,7 +124,7 @@ def update_user_stats(
             logger.info(f"🌟 User {user_id} achieved VIP status!")
         stats['is_vip'] = True
     
-    _user_stats_cache[user_id] = stats
+    user_state.set_fields(NS_STATS, user_id, stats)
     logger.info(
         f"📊 Updated stats for {user_id}: "
         f"{stats['order_count']} orders, "
@@ -340,8 +377,8 @@ def reset_user_stats(user_id: int) -> bool:
         bool: Success status
     """
     try:
-        if user_id in _user_stats_cache:
-            del _user_stats_cache[user_id]
+        if not user_state.delete(NS_STATS, user_id):
+            return False
         logger.info(f"🗑️ Reset stats for user {user_id}")
         return True
     except Exception as e:
@@ -356,10 +393,12 @@ def get_all_users_stats() -> List[Dict]:
     Returns:
         list: List of user stats dicts
     """
-    return [
-        {'user_id': user_id, **stats}
-        for user_id, stats in _user_stats_cache.items()
-    ]
+    result = []
+    for user_id in user_state.user_ids(NS_STATS):
+        stats = user_state.get_all(NS_STATS, user_id)
+        if stats:
+            result.append({'user_id': user_id, **stats})
+    return result
 
 
 def get_user_count() -> int:
@@ -369,7 +408,7 @@ def get_user_count() -> int:
     Returns:
         int: User count
     """
-    return len(_user_stats_cache)
+    return len(user_state.user_ids(NS_STATS))
 
 
 def get_vip_count() -> int:
@@ -379,7 +418,7 @@ def get_vip_count() -> int:
     Returns:
         int: VIP user count
     """
-    return sum(1 for stats in _user_stats_cache.values() if stats.get('is_vip'))
+    return sum(1 for stats in get_all_users_stats() if stats.get('is_vip'))
 
 
 # TODO: Google Sheets integration functions
@@ -59,6 +59,10 @@ def when_ready(server):
 
 
 def post_fork(server, worker):
+    # З'єднання пулу БД не можна ділити між процесами
+    import sys
+    if 'app.database' in sys.modules:
+        sys.modules['app.database'].dispose_engines()
     print(f"✅ Worker spawned (pid: {worker.pid})")
 
 
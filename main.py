@@ -4,7 +4,9 @@ Pure ASGI + FastAPI + Telegram Bot + Mini App API
 """
 import os
 import json
+import asyncio
 import logging
+from collections import Counter
 from telegram import Update
 from telegram.ext import (
     Application,
@@ -36,7 +38,34 @@ if not TELEGRAM_BOT_TOKEN:
 # ============================================================================
 # TELEGRAM BOT SETUP
 # ============================================================================
-application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+# context.user_data зберігається в спільному user state store (Redis),
+# щоб стан користувача був однаковим на всіх воркерах
+from app.utils.state_persistence import create_state_persistence
+from app.utils.redis_pool import redis_pool
+from app.utils.health import health_monitor
+
+application = (
+    Application.builder()
+    .token(TELEGRAM_BOT_TOKEN)
+    .persistence(create_state_persistence())
+    .build()
+)
+
+# Апдейти в обробці по користувачах: user_data прибирається з пам'яті
+# Application тільки після збереження останнього з них
+_updates_in_flight: Counter = Counter()
+
+
+def release_user_data(user_id: int):
+    """
+    Прибрати збережені user_data з пам'яті Application
+
+    PTB тримає запис для кожного користувача назавжди; дані вже в
+    user state store, наступний апдейт підтягне їх через refresh_user_data.
+    application.user_data - read-only proxy, а drop_user_data() видалив би
+    і збережену копію, тому напряму з _user_data.
+    """
+    application._user_data.pop(user_id, None)
 
 # V1 Handlers
 from app.handlers.commands import start, menu, cart, order, profile, help_command
@@ -98,6 +127,27 @@ fastapi_app.add_middleware(
 from app.api.miniapp_api import router as miniapp_router
 fastapi_app.include_router(miniapp_router)
 
+# Замовлення: PostgreSQL (якщо налаштовано) + дзеркало в Google Sheets
+from app.services.order_repository import order_repository
+from app.services.sheets_mirror import sheets_mirror
+from app.utils.session import register_session_loader
+from app.utils.warm_greetings import register_stats_loader
+
+# Знімок меню (спільний для кошика, API, пошуку)
+from app.services.menu_store import menu_store
+
+# Добірки страв під настрій (перебудова при зміні меню)
+from app.services.mood_catalog import mood_catalog
+
+# "До замовлення часто додають" (вчиться з замовлень)
+from app.services.upsell_engine import upsell_engine
+
+try:
+    from app.database import close_async_engine
+except ImportError:
+    async def close_async_engine():
+        pass
+
 # FastAPI root
 @fastapi_app.get("/")
 async def root():
@@ -108,9 +158,14 @@ async def root():
         "endpoints": {
             "menu": "/api/v1/menu",
             "mood": "/api/v1/menu/mood/{tag}",
+            "search": "/api/v1/search?q=",
+            "suggest": "/api/v1/search/suggest?prefix=",
             "restaurants": "/api/v1/restaurants",
             "order": "/api/v1/order (POST)",
-            "health": "/api/v1/health"
+            "health": "/api/v1/health",
+            "liveness": "/healthz",
+            "readiness": "/readyz",
+            "metrics": "/api/v1/metrics"
         }
     }
 
@@ -129,6 +184,26 @@ async def startup():
         await application.bot.set_webhook(webhook_url)
         logger.info(f"✅ Webhook set to: {webhook_url}")
         
+        # PostgreSQL - основне сховище замовлень, Sheets - дзеркало
+        # (init_db у потоці: connect timeout не блокує event loop)
+        if await asyncio.to_thread(order_repository.init):
+            sheets_mirror.start()
+            # Витіснені сесія/статистика - з users за ключем (без БД не відновлюються)
+            register_session_loader()
+            register_stats_loader()
+        
+        # Перше завантаження меню у потоці; далі snapshot оновлюється у фоні
+        await asyncio.to_thread(menu_store.refresh)
+        
+        # Фонові проби залежностей для /healthz та /readyz
+        health_monitor.start()
+        
+        # Добірки настроїв (+ фоновий LLM прохід при зміні меню)
+        mood_catalog.start()
+        
+        # Матриця спільних покупок: файл стану або історія з БД
+        upsell_engine.start()
+        
     except Exception as e:
         logger.error(f"❌ Startup failed: {e}")
         raise
@@ -138,6 +213,11 @@ async def shutdown():
     try:
         await application.stop()
         await application.shutdown()
+        await health_monitor.stop()
+        await redis_pool.close()
+        sheets_mirror.stop()
+        upsell_engine.stop()
+        await close_async_engine()
         logger.info("✅ Application stopped")
     except Exception as e:
         logger.error(f"❌ Shutdown error: {e}")
@@ -152,6 +232,7 @@ async def app(scope, receive, send):
     - /api/* → FastAPI
     - /webhook → Telegram webhook
     - / → Health check
+    - /healthz, /readyz → Liveness / readiness (закешовані проби)
     """
     
     # Startup on first request
@@ -191,9 +272,25 @@ async def app(scope, receive, send):
             # Парсити JSON
             update_data = json.loads(body.decode('utf-8'))
             update = Update.de_json(update_data, application.bot)
+            user_id = update.effective_user.id if update.effective_user else None
             
-            # Обробити update
-            await application.process_update(update)
+            if user_id is not None:
+                _updates_in_flight[user_id] += 1
+            persisted = False
+            try:
+                # Обробити update
+                await application.process_update(update)
+                
+                # Зберегти user_data одразу (наступний апдейт може прийти на інший воркер)
+                await application.update_persistence()
+                persisted = True
+            finally:
+                if user_id is not None:
+                    _updates_in_flight[user_id] -= 1
+                    if _updates_in_flight[user_id] <= 0:
+                        del _updates_in_flight[user_id]
+                        if persisted:
+                            release_user_data(user_id)
             
             # Відповідь
             response_body = json.dumps({"ok": True}).encode()
@@ -257,6 +354,23 @@ async def app(scope, receive, send):
         
         return
     
+    # Liveness / readiness: тільки закешовані результати, без звернень до backends
+    if path in ('/healthz', '/readyz') and method in ['GET', 'HEAD']:
+        result = health_monitor.liveness() if path == '/healthz' else health_monitor.readiness()
+        
+        await send({
+            'type': 'http.response.start',
+            'status': 200 if result['ok'] else 503,
+            'headers': [[b'content-type', b'application/json'], [b'cache-control', b'no-store']],
+        })
+        
+        await send({
+            'type': 'http.response.body',
+            'body': json.dumps(result).encode() if method == 'GET' else b'',
+        })
+        
+        return
+    
     if path == '/webhook_info' and method == 'GET':
         try:
             webhook_info = await application.bot.get_webhook_info()
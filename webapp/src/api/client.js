@@ -5,6 +5,8 @@ const API_BASE = import.meta.env.VITE_API_URL || 'https://ferrik-bot-zvev.onrend
 export const api = {
   getMenu: (params) => axios.get(`${API_BASE}/menu`, { params }),
   getMoodMenu: (tag) => axios.get(`${API_BASE}/menu/mood/${tag}`),
+  searchMenu: (q, limit) => axios.get(`${API_BASE}/search`, { params: { q, limit } }),
+  suggest: (prefix, limit) => axios.get(`${API_BASE}/search/suggest`, { params: { prefix, limit } }),
   getRestaurants: () => axios.get(`${API_BASE}/restaurants`),
   createOrder: (data) => axios.post(`${API_BASE}/order`, data),
   validatePromo: (code) => axios.post(`${API_BASE}/promo/validate`, { code }),